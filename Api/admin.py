@@ -1,7 +1,217 @@
+from django.conf import settings
 from django.contrib import admin
-from .models import User, Idea, FollowRequest
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.html import format_html
+from .entitycache import entity_cache
+from .models import User, Idea, IdeaTombstone, FollowRequest, RequestProfile, hide_ideas_of, show_ideas_of
+from .outbox import IDEA_EDITED, FOLLOW_REQUEST_ANSWERED, emit_many
+from .profiling import read_report
+from .sharding import idea_shards, sharding_enabled
 # Register your models here.
 
-admin.site.register(User)
-admin.site.register(Idea)
-admin.site.register(FollowRequest)
\ No newline at end of file
+
+# Counting a large table is a sequential scan, so on PostgreSQL the changelists
+# use the planner's estimate instead: pg_class.reltuples for the whole table,
+# the EXPLAIN row estimate for a filtered one. Below ADMIN_ESTIMATED_COUNT_MIN
+# rows the exact count is cheap and used as before.
+
+def estimated_count(queryset):
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                           [connection.ops.quote_name(queryset.model._meta.db_table)])
+            row = cursor.fetchone()
+            return row[0] if row and row[0] >= 0 else None
+        sql, params = queryset.query.sql_with_params()
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        return cursor.fetchone()[0][0]['Plan']['Plan Rows']
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is not None and estimate >= settings.ADMIN_ESTIMATED_COUNT_MIN:
+            return estimate
+        return super().count
+
+
+class DeletedFilter(admin.SimpleListFilter):
+    title = 'deleted'
+    parameter_name = 'deleted'
+
+    def lookups(self, request, model_admin):
+        return (('no', 'Active accounts'), ('yes', 'Deleted accounts'))
+
+    def queryset(self, request, queryset):
+        if self.value() in ('no', 'yes'):
+            return queryset.filter(deleted_at__isnull=self.value() == 'no')
+        return queryset
+
+
+# With more than one shard the idea changelist shows one shard at a time,
+# picked with this filter. Users live on the default database only, so the
+# authors of the ideas of another shard are prefetched instead of joined.
+
+class ShardFilter(admin.SimpleListFilter):
+    title = 'shard'
+    parameter_name = 'shard'
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in idea_shards()] if sharding_enabled() else []
+
+    def value(self):
+        return super().value() or idea_shards()[0]
+
+    def choices(self, changelist):
+        for lookup, title in self.lookup_choices:
+            yield {
+                'selected': self.value() == lookup,
+                'query_string': changelist.get_query_string({self.parameter_name: lookup}),
+                'display': title,
+            }
+
+    def queryset(self, request, queryset):
+        if not sharding_enabled() or self.value() not in idea_shards():
+            return queryset
+        if self.value() == DEFAULT_DB_ALIAS:
+            return queryset.using(DEFAULT_DB_ALIAS)
+        return queryset.using(self.value()).prefetch_related('pub_user')
+
+
+# Bulk actions run one UPDATE for the whole selection; any domain events are
+# recorded in the same transaction with a single INSERT.
+
+@admin.register(User)
+class UserAdmin(admin.ModelAdmin):
+    list_display = ('username', 'email', 'is_staff', 'date_joined', 'deleted_at')
+    list_filter = (DeletedFilter, 'is_staff')
+    search_fields = ('^username', '=email')
+    ordering = ('-pk',)
+    raw_id_fields = ('following',)
+    readonly_fields = ('password', 'last_login', 'date_joined')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ('soft_delete_users', 'restore_users')
+
+    @admin.action(description='Soft delete selected users')
+    def soft_delete_users(self, request, queryset):
+        ids = list(queryset.filter(deleted_at__isnull=True).values_list('pk', flat=True))
+        with transaction.atomic():
+            User.objects.filter(pk__in=ids).update(deleted_at=timezone.now(), is_active=False)
+            hide_ideas_of(ids)
+        entity_cache.invalidate(User, ids)
+        self.message_user(request, f'{len(ids)} users deleted.')
+
+    @admin.action(description='Restore selected users')
+    def restore_users(self, request, queryset):
+        ids = list(queryset.filter(deleted_at__isnull=False).values_list('pk', flat=True))
+        with transaction.atomic():
+            User.objects.filter(pk__in=ids).update(deleted_at=None, is_active=True)
+            show_ideas_of(ids)
+        entity_cache.invalidate(User, ids)
+        self.message_user(request, f'{len(ids)} users restored.')
+
+
+@admin.register(Idea)
+class IdeaAdmin(admin.ModelAdmin):
+    list_display = ('id', 'content', 'pub_user', 'visibility', 'pub_date')
+    list_select_related = ('pub_user',)
+    list_filter = (ShardFilter, ('pub_date', admin.DateFieldListFilter), 'visibility')
+    ordering = ('-pub_date',)
+    raw_id_fields = ('pub_user',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ('make_private',)
+
+    def get_list_select_related(self, request):
+        if sharding_enabled() and request.GET.get(ShardFilter.parameter_name, idea_shards()[0]) != DEFAULT_DB_ALIAS:
+            return ()
+        return self.list_select_related
+
+    # The change and delete pages look the idea up on every shard.
+    def get_object(self, request, object_id, from_field=None):
+        if not sharding_enabled():
+            return super().get_object(request, object_id, from_field)
+        queryset = self.get_queryset(request)
+        field = Idea._meta.pk if from_field is None else Idea._meta.get_field(from_field)
+        try:
+            object_id = field.to_python(object_id)
+        except (ValidationError, ValueError):
+            return None
+        for alias in idea_shards():
+            obj = queryset.using(alias).filter(**{field.name: object_id}).first()
+            if obj is not None:
+                return obj
+        return None
+
+    @admin.action(description='Make selected ideas private')
+    def make_private(self, request, queryset):
+        queryset = queryset.exclude(visibility=Idea.PRIVATE)
+        with transaction.atomic(), transaction.atomic(using=queryset.db):
+            ideas = list(queryset.prefetch_related(None).select_for_update().values_list('pk', 'pub_user_id', 'visibility'))
+            Idea.objects.using(queryset.db).filter(pk__in=[pk for pk, _, _ in ideas]).update(
+                visibility=Idea.PRIVATE, updated_at=timezone.now()
+            )
+            IdeaTombstone.objects.bulk_create([
+                IdeaTombstone(idea_id=pk, pub_user_id=pub_user_id, visibility=visibility)
+                for pk, pub_user_id, visibility in ideas
+            ])
+            emit_many(IDEA_EDITED, [
+                {'idea_id': pk, 'pub_user_id': pub_user_id, 'visibility': Idea.PRIVATE} for pk, pub_user_id, _ in ideas
+            ])
+            entity_cache.invalidate(Idea, [pk for pk, _, _ in ideas])
+        self.message_user(request, f'{len(ideas)} ideas made private.')
+
+
+@admin.register(FollowRequest)
+class FollowRequestAdmin(admin.ModelAdmin):
+    list_display = ('id', 'requester', 'to_follow', 'status', 'created_at')
+    list_select_related = ('requester', 'to_follow')
+    list_filter = ('status',)
+    ordering = ('-pk',)
+    raw_id_fields = ('requester', 'to_follow')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ('deny_requests',)
+
+    @admin.action(description='Deny selected pending requests')
+    def deny_requests(self, request, queryset):
+        queryset = queryset.filter(status=FollowRequest.PENDING)
+        with transaction.atomic():
+            requests = list(queryset.select_for_update().values_list('pk', 'requester_id', 'to_follow_id'))
+            FollowRequest.objects.filter(pk__in=[pk for pk, _, _ in requests]).update(
+                status=FollowRequest.DENIED, updated_at=timezone.now()
+            )
+            emit_many(FOLLOW_REQUEST_ANSWERED, [
+                {'follow_request_id': pk, 'requester_id': requester_id, 'to_follow_id': to_follow_id,
+                 'status': FollowRequest.DENIED}
+                for pk, requester_id, to_follow_id in requests
+            ])
+        self.message_user(request, f'{len(requests)} follow requests denied.')
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'operation_name', 'path', 'duration_ms', 'query_count', 'kind')
+    list_filter = ('kind',)
+    search_fields = ('operation_name', 'variables_hash')
+    ordering = ('-created_at',)
+    readonly_fields = ('report',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description='Report')
+    def report(self, obj):
+        return format_html('<pre style="white-space: pre; overflow: auto;">{}</pre>', read_report(obj))
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import threading
+import time
+import uuid
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from graphql import FieldNode, InlineFragmentNode, OperationType, get_operation_ast, parse, print_ast
+
+
+# Single-flight execution of identical queries. Requests with the same
+# normalized document, variables, operation name and visibility scope (see
+# Api.permissions.VisibilityScope.key) that arrive while
+# one of them (the leader) is executing wait for the leader's response instead
+# of executing again. Within a process the followers wait on an event; with
+# GRAPHENE['COALESCE_CACHE'] set, the leaders of every process also coordinate
+# through a lock in that cache and share the response for
+# COALESCE_RESULT_TTL seconds. A follower that waits longer than
+# COALESCE_TIMEOUT, or whose leader fails, executes the query itself.
+
+POLL_SECONDS = 0.01
+
+# Root fields that answer the same to every logged in viewer. A query that only
+# selects these, and none of VIEWER_FIELDS at any depth, is keyed on one shared
+# public scope, so the requests of different users coalesce.
+PUBLIC_FIELDS = frozenset(('trendingIdeas',))
+VIEWER_FIELDS = frozenset(('relationship', 'ideaUser'))
+PUBLIC_SCOPE = 'public'
+
+
+def coalesce_setting(name, default):
+    return settings.GRAPHENE.get(name, default)
+
+
+def field_names(document):
+    names = set()
+
+    def collect(selection_set):
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                names.add(selection.name.value)
+            if isinstance(selection, (FieldNode, InlineFragmentNode)) and selection.selection_set:
+                collect(selection.selection_set)
+
+    for definition in document.definitions:
+        if getattr(definition, 'selection_set', None):
+            collect(definition.selection_set)
+    return frozenset(names)
+
+
+@lru_cache(maxsize=256)
+def normalize(query, operation_name):
+    # (normalized document, root field names, every field name), or None for
+    # anything but a query operation selecting its root fields directly.
+    document = parse(query)
+    operation = get_operation_ast(document, operation_name)
+    if operation is None or operation.operation != OperationType.QUERY:
+        return None
+    selections = operation.selection_set.selections
+    if not all(isinstance(selection, FieldNode) for selection in selections):
+        return None
+    return print_ast(document), frozenset(selection.name.value for selection in selections), field_names(document)
+
+
+def request_key(query, variables, operation_name, scope):
+    try:
+        normalized = normalize(query, operation_name)
+    except Exception:
+        return None
+    if normalized is None:
+        return None
+    document, root_fields, names = normalized
+    # Rate limited fields count every call, and some of them send mail.
+    if root_fields & set(coalesce_setting('RATE_LIMITS', {})):
+        return None
+    if scope.user.is_authenticated and root_fields <= PUBLIC_FIELDS and not names & VIEWER_FIELDS:
+        viewer = PUBLIC_SCOPE
+    else:
+        viewer = scope.key()
+    payload = json.dumps([document, variables or {}, operation_name, viewer], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.failed = False
+        self.result = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def do(self, key, function):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+        if not leader:
+            if flight.done.wait(coalesce_setting('COALESCE_TIMEOUT', 5)) and not flight.failed:
+                return flight.result
+            return function()
+        try:
+            flight.result = shared_flight(key, function)
+        except BaseException:
+            flight.failed = True
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
+
+
+def shared_flight(key, function):
+    alias = coalesce_setting('COALESCE_CACHE', None)
+    if alias is None:
+        return function()
+    cache = caches[alias]
+    lock_key = f'coalesce:{key}'
+    token = uuid.uuid4().hex
+    ttl = coalesce_setting('COALESCE_RESULT_TTL', 1)
+    if cache.add(lock_key, token, coalesce_setting('COALESCE_TIMEOUT', 5)):
+        try:
+            result = function()
+            cache.set(f'{lock_key}:{token}', result, ttl)
+            return result
+        finally:
+            cache.delete(lock_key)
+
+    deadline = time.monotonic() + coalesce_setting('COALESCE_TIMEOUT', 5)
+    leader = cache.get(lock_key)
+    while leader is not None and time.monotonic() < deadline:
+        time.sleep(POLL_SECONDS)
+        current = cache.get(lock_key)
+        result = cache.get(f'{lock_key}:{leader}')
+        if result is not None:
+            return result
+        if current != leader:
+            break
+    return function()
+
+
+single_flight = SingleFlight()
@@ -0,0 +1,29 @@
+import binascii
+import json
+from datetime import datetime
+
+from django.utils.dateparse import parse_datetime
+from graphql import GraphQLError
+
+
+def encode_cursor(*values):
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return binascii.b2a_base64(raw, newline=False).decode()
+
+
+def decode_cursor(cursor, size):
+    try:
+        values = json.loads(binascii.a2b_base64(cursor.encode()))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        raise GraphQLError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise GraphQLError('Invalid cursor')
+    return values
+
+
+def decode_datetime(value):
+    date = parse_datetime(value) if isinstance(value, str) else None
+    if date is None:
+        raise GraphQLError('Invalid cursor')
+    return date
@@ -0,0 +1,178 @@
+import time
+import zlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, models, transaction
+from django.db.models.fields.related_descriptors import ForwardManyToOneDescriptor
+from django.http import Http404
+
+from .sharding import idea_shards, is_idea
+
+
+# Per-object cache of users and ideas by primary key. An entry holds the
+# database alias and the concrete field values of the row, and its key carries
+# a hash of the field names, so a deploy that changes a model's fields starts
+# from fresh keys. Saves and deletes write through on commit (after dropping
+# the entry at once, so the writing transaction never reads a stale copy);
+# readers fill misses with add(), which never overwrites a written entry, and a
+# per-key lock lets only one reader load a missing row while the others wait
+# briefly for it. Deleted and unknown ids are cached as DELETED.
+#
+# Changes that bypass the model signals (queryset.update(), bulk_create()) must
+# call invalidate() with the ids they touched, on the default database.
+#
+# ENTITY_CACHE must be shared by every process (memcached, redis...), since a
+# write only reaches the cache it is made through; with ENTITY_CACHE = None the
+# cache is off and every read goes to the database. Instances come from the
+# cache as they were when cached: never save() one, load the row to write it.
+
+DELETED = 'deleted'
+MISSING_TIMEOUT = 30
+LOCK_TIMEOUT = 5
+WAIT_SECONDS = 0.2
+POLL_SECONDS = 0.01
+
+
+# Password hashes are left out; they are loaded from the database on access.
+def field_names(model):
+    return [field.attname for field in model._meta.concrete_fields if field.attname != 'password']
+
+
+class EntityCache:
+    def __init__(self):
+        self._versions = {}
+
+    @property
+    def enabled(self):
+        return settings.ENTITY_CACHE is not None
+
+    @property
+    def cache(self):
+        cache = caches[settings.ENTITY_CACHE]
+        if isinstance(cache, LocMemCache):
+            raise ImproperlyConfigured('ENTITY_CACHE must name a cache shared by all processes, not a local memory cache.')
+        return cache
+
+    def key(self, model, pk):
+        version = self._versions.get(model)
+        if version is None:
+            version = self._versions[model] = zlib.crc32(','.join(field_names(model)).encode())
+        return f'entity:{model._meta.label_lower}:{version:x}:{pk}'
+
+    def lock_key(self, model, pk):
+        return f'{self.key(model, pk)}:lock'
+
+    def pack(self, instance):
+        return instance._state.db, [getattr(instance, name) for name in field_names(type(instance))]
+
+    def unpack(self, model, entry):
+        db, values = entry
+        return model.from_db(db, field_names(model), values)
+
+    # Reads
+
+    def get(self, model, pk):
+        return self.get_many(model, [pk]).get(model._meta.pk.to_python(pk))
+
+    def get_many(self, model, ids):
+        ids = {model._meta.pk.to_python(pk) for pk in ids}
+        if not self.enabled:
+            return {pk: self.unpack(model, entry) for pk, entry in self.load(model, list(ids)).items()}
+        keys = {self.key(model, pk): pk for pk in ids}
+        entries = {keys[key]: entry for key, entry in self.cache.get_many(list(keys)).items()}
+        missing = [pk for pk in ids if pk not in entries]
+        if missing:
+            entries.update(self.fill(model, missing))
+        return {pk: self.unpack(model, entry) for pk, entry in entries.items() if entry != DELETED}
+
+    def fill(self, model, ids):
+        locked, waiting = [], []
+        for pk in ids:
+            (locked if self.cache.add(self.lock_key(model, pk), 1, LOCK_TIMEOUT) else waiting).append(pk)
+        entries = self.wait(model, waiting) if waiting else {}
+        load = locked + [pk for pk in waiting if pk not in entries]
+        try:
+            loaded = self.load(model, load)
+            for pk in load:
+                entry = loaded.get(pk, DELETED)
+                timeout = MISSING_TIMEOUT if entry == DELETED else settings.ENTITY_CACHE_TIMEOUT
+                self.cache.add(self.key(model, pk), entry, timeout)
+                entries[pk] = entry
+        finally:
+            self.cache.delete_many([self.lock_key(model, pk) for pk in locked])
+        return entries
+
+    def wait(self, model, ids):
+        keys = {self.key(model, pk): pk for pk in ids}
+        entries = {}
+        deadline = time.monotonic() + WAIT_SECONDS
+        while keys and time.monotonic() < deadline:
+            time.sleep(POLL_SECONDS)
+            for key, entry in self.cache.get_many(list(keys)).items():
+                entries[keys.pop(key)] = entry
+        return entries
+
+    def load(self, model, ids):
+        if not ids:
+            return {}
+        entries = {}
+        for alias in idea_shards() if is_idea(model) else [DEFAULT_DB_ALIAS]:
+            for instance in model._base_manager.using(alias).filter(pk__in=ids):
+                entries[instance.pk] = self.pack(instance)
+        return entries
+
+    # Writes
+
+    def saved(self, instance, using):
+        if not self.enabled:
+            return
+        key = self.key(type(instance), instance.pk)
+        self.cache.delete(key)
+        if instance.get_deferred_fields() - {'password'}:
+            transaction.on_commit(lambda: self.cache.delete(key), using=using)
+        else:
+            entry = self.pack(instance)
+            transaction.on_commit(lambda: self.cache.set(key, entry, settings.ENTITY_CACHE_TIMEOUT), using=using)
+
+    def deleted(self, instance, using):
+        if not self.enabled:
+            return
+        key = self.key(type(instance), instance.pk)
+        self.cache.delete(key)
+        transaction.on_commit(lambda: self.cache.set(key, DELETED, MISSING_TIMEOUT), using=using)
+
+    def invalidate(self, model, ids):
+        if not self.enabled:
+            return
+        keys = [self.key(model, pk) for pk in ids]
+        self.cache.delete_many(keys)
+        transaction.on_commit(lambda: self.cache.delete_many(keys))
+
+
+entity_cache = EntityCache()
+
+
+def get_cached_object_or_404(model, pk):
+    instance = entity_cache.get(model, pk)
+    if instance is None:
+        raise Http404(f'No {model._meta.object_name} matches the given query.')
+    return instance
+
+
+# A foreign key whose forward accessor (idea.pub_user) reads through the cache.
+
+class CachedForwardManyToOneDescriptor(ForwardManyToOneDescriptor):
+    def get_object(self, instance):
+        if not entity_cache.enabled:
+            return super().get_object(instance)
+        related = entity_cache.get(self.field.related_model, getattr(instance, self.field.attname))
+        if related is None:
+            return super().get_object(instance)
+        return related
+
+
+class CachedForeignKey(models.ForeignKey):
+    forward_related_accessor_class = CachedForwardManyToOneDescriptor
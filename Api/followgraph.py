@@ -0,0 +1,231 @@
+import threading
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+
+from .models import User
+
+
+Follow = User.following.through
+
+VERSION_KEY = 'follow-graph:version'
+
+
+# Compressed sparse row graph of the follow table. Row u holds the sorted ids
+# followed by user u in targets[offsets[u]:offsets[u + 1]], so membership is a
+# binary search and adjacency a slice. Follows changed since the arrays were
+# built live in small added/removed overlays until the next compaction.
+
+class FollowGraph:
+    def __init__(self, offsets, targets):
+        self.offsets = offsets
+        self.targets = targets
+        self.added = defaultdict(set)
+        self.removed = defaultdict(set)
+        self.pending = 0
+
+    @classmethod
+    def from_edges(cls, edges):
+        # edges must be sorted by (follower, followed)
+        counts = array('q')
+        targets = array('l')
+        for follower, followed in edges:
+            if follower >= len(counts):
+                counts.extend([0] * (follower + 1 - len(counts)))
+            counts[follower] += 1
+            targets.append(followed)
+        offsets = array('q', [0]) * (len(counts) + 1)
+        for user_id, count in enumerate(counts):
+            offsets[user_id + 1] = offsets[user_id] + count
+        return cls(offsets, targets)
+
+    @classmethod
+    def load(cls, chunk_size=10000):
+        edges = (
+            Follow.objects.order_by('from_user_id', 'to_user_id')
+            .values_list('from_user_id', 'to_user_id')
+            .iterator(chunk_size=chunk_size)
+        )
+        return cls.from_edges(edges)
+
+    def bounds(self, user_id):
+        if user_id + 1 >= len(self.offsets):
+            return 0, 0
+        return self.offsets[user_id], self.offsets[user_id + 1]
+
+    def in_arrays(self, follower, followed):
+        lo, hi = self.bounds(follower)
+        index = bisect_left(self.targets, followed, lo, hi)
+        return index < hi and self.targets[index] == followed
+
+    def follows(self, follower, followed):
+        if followed in self.added.get(follower, ()):
+            return True
+        if followed in self.removed.get(follower, ()):
+            return False
+        return self.in_arrays(follower, followed)
+
+    def following(self, user_id):
+        lo, hi = self.bounds(user_id)
+        removed = self.removed.get(user_id)
+        if removed:
+            ids = [followed for followed in self.targets[lo:hi] if followed not in removed]
+        else:
+            ids = self.targets[lo:hi].tolist()
+        ids.extend(sorted(self.added.get(user_id, ())))
+        return ids
+
+    def add(self, follower, followed):
+        self.removed[follower].discard(followed)
+        if not self.in_arrays(follower, followed):
+            self.added[follower].add(followed)
+        self.pending += 1
+
+    def remove(self, follower, followed):
+        self.added[follower].discard(followed)
+        if self.in_arrays(follower, followed):
+            self.removed[follower].add(followed)
+        self.pending += 1
+
+    def snapshot(self):
+        # The arrays are never modified in place, only the overlays.
+        copy = FollowGraph(self.offsets, self.targets)
+        copy.added.update((user_id, set(ids)) for user_id, ids in self.added.items())
+        copy.removed.update((user_id, set(ids)) for user_id, ids in self.removed.items())
+        return copy
+
+    def compact(self):
+        users = range(max(len(self.offsets) - 1, max(self.added, default=-1) + 1))
+        return FollowGraph.from_edges(
+            (user_id, followed) for user_id in users for followed in sorted(self.following(user_id))
+        )
+
+    def memory_bytes(self):
+        return (
+            self.offsets.itemsize * len(self.offsets) + self.targets.itemsize * len(self.targets)
+            + 8 * sum(len(ids) for ids in self.added.values()) + 8 * sum(len(ids) for ids in self.removed.values())
+        )
+
+
+# Process-local index. Every committed follow change bumps a version in the
+# shared cache; the process applies its own changes in place, and when it sees
+# a version it did not apply (another worker wrote) it answers None, so callers
+# fall back to SQL, while a fresh copy is loaded in a background thread. The
+# version only reaches the other workers through a shared cache, so
+# FOLLOW_GRAPH_CACHE must name one (memcached, redis...). Once the overlays
+# hold FOLLOW_GRAPH_COMPACT_AT changes, a snapshot is compacted in a background
+# thread and the changes made meanwhile are replayed onto the result.
+
+class FollowGraphIndex:
+    def __init__(self):
+        self.graph = None
+        self.version = None
+        self._lock = threading.Lock()
+        self._loading = False
+        self._compacting = None
+
+    @property
+    def cache(self):
+        alias = settings.FOLLOW_GRAPH_CACHE
+        if alias is None or isinstance(caches[alias], LocMemCache):
+            raise ImproperlyConfigured(
+                'FOLLOW_GRAPH_CACHE must name a cache shared by all processes to enable FOLLOW_GRAPH_INDEX.'
+            )
+        return caches[alias]
+
+    def shared_version(self):
+        return self.cache.get(VERSION_KEY, 0)
+
+    def get(self):
+        if not settings.FOLLOW_GRAPH_INDEX:
+            return None
+        version = self.shared_version()
+        graph = self.graph
+        if graph is not None and self.version == version:
+            return graph
+        self.reload_in_background()
+        return None
+
+    def reload(self):
+        version = self.shared_version()
+        graph = FollowGraph.load()
+        with self._lock:
+            self.graph, self.version = graph, version
+        return graph
+
+    def reload_in_background(self):
+        with self._lock:
+            if self._loading:
+                return
+            self._loading = True
+
+        def run():
+            try:
+                self.reload()
+            finally:
+                connection.close()
+                self._loading = False
+
+        threading.Thread(target=run, name='follow-graph-loader', daemon=True).start()
+
+    def bump_version(self):
+        self.cache.add(VERSION_KEY, 0, timeout=None)
+        return self.cache.incr(VERSION_KEY)
+
+    def changed(self, pairs, added):
+        version = self.bump_version()
+        with self._lock:
+            if self.graph is None or version != self.version + 1:
+                return
+            self.apply(self.graph, pairs, added)
+            if self._compacting is not None:
+                self._compacting.append((pairs, added))
+            elif self.graph.pending >= settings.FOLLOW_GRAPH_COMPACT_AT:
+                self._compacting = []
+                self.compact_in_background(self.graph, self.graph.snapshot())
+            self.version = version
+
+    def apply(self, graph, pairs, added):
+        for follower, followed in pairs:
+            if added:
+                graph.add(follower, followed)
+            else:
+                graph.remove(follower, followed)
+
+    def compact_in_background(self, graph, snapshot):
+        def run():
+            compacted = None
+            try:
+                compacted = snapshot.compact()
+            finally:
+                with self._lock:
+                    changes, self._compacting = self._compacting, None
+                    # A reload replaced the graph meanwhile; its copy is newer.
+                    if compacted is not None and self.graph is graph:
+                        for pairs, added in changes:
+                            self.apply(compacted, pairs, added)
+                        self.graph = compacted
+
+        threading.Thread(target=run, name='follow-graph-compaction', daemon=True).start()
+
+    def on_commit(self, pairs, added):
+        if settings.FOLLOW_GRAPH_INDEX:
+            transaction.on_commit(lambda: self.changed(pairs, added))
+
+    # A clear does not list the removed follows; only mark every copy stale.
+    def invalidate_on_commit(self):
+        if settings.FOLLOW_GRAPH_INDEX:
+            transaction.on_commit(self.bump_version)
+
+
+follow_graph_index = FollowGraphIndex()
+
+
+def get_follow_graph():
+    return follow_graph_index.get()
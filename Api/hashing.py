@@ -0,0 +1,103 @@
+import base64
+import hashlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, check_password, make_password
+from django.utils.encoding import force_bytes
+
+
+# Password hashing in a process pool. A PBKDF2 hash costs a few hundred
+# milliseconds of CPU; running it in PASSWORD_HASHING_WORKERS processes caps
+# the cores a burst of logins or signups can take from the rest of the site,
+# while the request thread only waits on a future. At most
+# PASSWORD_HASHING_MAX_PENDING hashes are queued or running per process, later
+# callers block until one finishes. The pool is started on first use, after
+# the server has forked its workers, with the spawn method so the children
+# share no sockets or locks with the parent. If a child dies (OOM killer,
+# signal) the pool is broken for good, so it is replaced and the hash retried
+# once. PASSWORD_HASHING_WORKERS = 0 hashes inline.
+
+def pbkdf2_base64(digest, password, salt, iterations):
+    hash = hashlib.pbkdf2_hmac(digest, force_bytes(password), force_bytes(salt), iterations)
+    return base64.b64encode(hash).decode('ascii').strip()
+
+
+class HashingPool:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = None
+        self._pid = None
+
+    def workers(self):
+        workers = settings.PASSWORD_HASHING_WORKERS
+        return (os.cpu_count() or 1) if workers is None else workers
+
+    def executor(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers(), mp_context=multiprocessing.get_context('spawn')
+                )
+                self._pending = threading.BoundedSemaphore(settings.PASSWORD_HASHING_MAX_PENDING)
+                self._pid = os.getpid()
+            return self._executor
+
+    def run(self, function, *args):
+        if not self.workers():
+            return function(*args)
+        executor = self.executor()
+        try:
+            return self.submit(executor, function, *args)
+        except BrokenProcessPool:
+            self.discard(executor)
+            return self.submit(self.executor(), function, *args)
+
+    def submit(self, executor, function, *args):
+        pending = self._pending
+        pending.acquire()
+        try:
+            future = executor.submit(function, *args)
+        except BaseException:
+            pending.release()
+            raise
+        future.add_done_callback(lambda _: pending.release())
+        return future.result()
+
+    def discard(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+            self._executor = None
+
+
+hashing_pool = HashingPool()
+
+
+# Same algorithm name and format as Django's PBKDF2PasswordHasher, so existing
+# hashes keep verifying; it replaces that hasher in PASSWORD_HASHERS.
+class PooledPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    def encode(self, password, salt, iterations=None):
+        assert password is not None
+        assert salt and '$' not in salt
+        iterations = iterations or self.iterations
+        hash = hashing_pool.run(pbkdf2_base64, self.digest().name, password, salt, iterations)
+        return '%s$%d$%s$%s' % (self.algorithm, iterations, salt, hash)
+
+
+# For async views: the calling thread only waits on the pool, so any thread
+# will do.
+amake_password = sync_to_async(make_password, thread_sensitive=False)
+acheck_password = sync_to_async(check_password, thread_sensitive=False)
@@ -0,0 +1,267 @@
+from collections import deque
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import QuerySet
+from graphql import (
+    BREAK, DirectiveLocation, FieldNode, FragmentSpreadNode, GraphQLArgument, GraphQLBoolean, GraphQLDirective,
+    GraphQLError, GraphQLInt, GraphQLNonNull, GraphQLString, OperationType, Visitor, located_error, visit,
+)
+from graphql.execution.collect_fields import does_fragment_condition_match, get_field_entry_key, should_include_node
+from graphql.execution.execute import ExecutionContext, assume_not_awaitable
+from graphql.execution.values import get_directive_values
+from graphql.pyutils import is_iterable
+
+
+# Incremental delivery (@defer and @stream) on top of the graphql-core 3.2
+# executor, which knows neither directive. The initial result is computed with
+# deferred fragments held back and streamed lists cut after initialCount items;
+# the held back work is queued and completed afterwards, one payload at a time,
+# in the format of the incremental delivery proposal (deferSpec=20220824).
+
+defer_directive = GraphQLDirective(
+    name='defer',
+    locations=[DirectiveLocation.FRAGMENT_SPREAD, DirectiveLocation.INLINE_FRAGMENT],
+    args={
+        'if': GraphQLArgument(GraphQLNonNull(GraphQLBoolean), default_value=True),
+        'label': GraphQLArgument(GraphQLString),
+    },
+    description='Delivers the fragment after the rest of the result when incremental delivery is supported.',
+)
+
+stream_directive = GraphQLDirective(
+    name='stream',
+    locations=[DirectiveLocation.FIELD],
+    args={
+        'if': GraphQLArgument(GraphQLNonNull(GraphQLBoolean), default_value=True),
+        'label': GraphQLArgument(GraphQLString),
+        'initialCount': GraphQLArgument(GraphQLNonNull(GraphQLInt), default_value=0),
+    },
+    description='Delivers the list items after the first initialCount when incremental delivery is supported.',
+)
+
+
+class IncrementalDirectiveFinder(Visitor):
+    found = False
+
+    def enter_directive(self, node, *args):
+        if node.name.value in (defer_directive.name, stream_directive.name):
+            self.found = True
+            return BREAK
+
+
+def uses_incremental_delivery(document):
+    finder = IncrementalDirectiveFinder()
+    visit(document, finder)
+    return finder.found
+
+
+def stream_batch_size():
+    return settings.GRAPHENE.get('STREAM_BATCH_SIZE', 50)
+
+
+def iterate(result):
+    # Stream a queryset from a server-side cursor unless its rows are already
+    # loaded or it has prefetches, which iterator() would skip.
+    if isinstance(result, QuerySet) and result._result_cache is None and not result._prefetch_related_lookups:
+        return result.iterator(chunk_size=stream_batch_size())
+    return iter(result)
+
+
+# Work held back from the initial result
+
+class FieldMap(dict):
+    def __init__(self):
+        super().__init__()
+        self.deferred = []
+
+
+class DeferredFragment:
+    key = 'data'
+
+    def __init__(self, label, parent_type, source, path, selection_set):
+        self.label = label
+        self.parent_type = parent_type
+        self.source = source
+        self.path = path
+        self.selection_set = selection_set
+
+    def entry_path(self):
+        return self.path.as_list() if self.path else []
+
+    def execute(self, context, entry):
+        fields = context.collect(self.parent_type, [self.selection_set])
+        entry['data'] = context.execute_fields(self.parent_type, self.source, self.path, fields)
+        return False
+
+
+class StreamedList:
+    key = 'items'
+
+    def __init__(self, label, item_type, field_nodes, info, path, items, index):
+        self.label = label
+        self.item_type = item_type
+        self.field_nodes = field_nodes
+        self.info = info
+        self.path = path
+        self.items = items
+        self.index = index
+        self.buffer = list(islice(items, 1))
+
+    def entry_path(self):
+        return self.path.as_list() + [self.index]
+
+    def take(self, count):
+        chunk = self.buffer + list(islice(self.items, count + 1 - len(self.buffer)))
+        self.buffer = chunk[count:]
+        return chunk[:count]
+
+    def execute(self, context, entry):
+        start = self.index
+        chunk = self.take(stream_batch_size())
+        self.index += len(chunk)
+        items = []
+        for offset, item in enumerate(chunk):
+            item_path = self.path.add_key(start + offset, None)
+            try:
+                items.append(context.complete_value(self.item_type, self.field_nodes, self.info, item_path, item))
+            except Exception as raw_error:
+                # Raises again for a non-null item type, which ends the stream.
+                context.handle_field_error(located_error(raw_error, self.field_nodes, item_path.as_list()), self.item_type)
+                items.append(None)
+        entry['items'] = items
+        return bool(self.buffer)
+
+
+class IncrementalExecutionContext(ExecutionContext):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pending = deque()
+
+    # Field collection, as in graphql.execution.collect_fields, except that
+    # fragments with an active @defer are kept aside on the returned FieldMap.
+    def collect(self, runtime_type, selection_sets):
+        fields = FieldMap()
+        visited = set()
+        for selection_set in selection_sets:
+            self.collect_into(runtime_type, selection_set, fields, visited)
+        return fields
+
+    def collect_into(self, runtime_type, selection_set, fields, visited):
+        for selection in selection_set.selections:
+            if not should_include_node(self.variable_values, selection):
+                continue
+            if isinstance(selection, FieldNode):
+                fields.setdefault(get_field_entry_key(selection), []).append(selection)
+                continue
+            if isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                fragment = self.fragments.get(name)
+                if name in visited or fragment is None:
+                    continue
+            else:
+                name, fragment = None, selection
+            if not does_fragment_condition_match(self.schema, fragment, runtime_type):
+                continue
+            defer = get_directive_values(defer_directive, selection, self.variable_values)
+            if defer and defer['if']:
+                fields.deferred.append((defer.get('label'), fragment.selection_set))
+                continue
+            if name is not None:
+                visited.add(name)
+            self.collect_into(runtime_type, fragment.selection_set, fields, visited)
+
+    def collect_subfields(self, return_type, field_nodes):
+        key = (return_type, *map(id, field_nodes))
+        fields = self._subfields_cache.get(key)
+        if fields is None:
+            fields = self.collect(return_type, [node.selection_set for node in field_nodes if node.selection_set])
+            self._subfields_cache[key] = fields
+        return fields
+
+    def execute_operation(self, operation, root_value):
+        root_type = self.schema.get_root_type(operation.operation)
+        if root_type is None:
+            return super().execute_operation(operation, root_value)
+        fields = self.collect(root_type, [operation.selection_set])
+        return (
+            self.execute_fields_serially if operation.operation == OperationType.MUTATION else self.execute_fields
+        )(root_type, root_value, None, fields)
+
+    def execute_fields(self, parent_type, source_value, path, fields):
+        results = super().execute_fields(parent_type, source_value, path, fields)
+        for label, selection_set in getattr(fields, 'deferred', ()):
+            self.pending.append(DeferredFragment(label, parent_type, source_value, path, selection_set))
+        return results
+
+    def complete_list_value(self, return_type, field_nodes, info, path, result):
+        stream = get_directive_values(stream_directive, field_nodes[0], self.variable_values)
+        if not stream or not stream['if'] or not is_iterable(result):
+            return super().complete_list_value(return_type, field_nodes, info, path, result)
+        if stream['initialCount'] < 0:
+            raise GraphQLError('initialCount must be a positive integer.', field_nodes)
+        items = iterate(result)
+        initial = list(islice(items, stream['initialCount']))
+        completed = super().complete_list_value(return_type, field_nodes, info, path, initial)
+        record = StreamedList(stream.get('label'), return_type.of_type, field_nodes, info, path, items, len(initial))
+        if record.buffer:
+            self.pending.append(record)
+        return completed
+
+    def run(self, record):
+        errors, self.errors = self.errors, []
+        entry = {'path': record.entry_path()}
+        try:
+            more = record.execute(self, entry)
+        except GraphQLError as error:
+            self.errors.append(error)
+            entry[record.key] = None
+            more = False
+        if record.label is not None:
+            entry['label'] = record.label
+        if self.errors:
+            entry['errors'] = self.errors
+        self.errors = errors
+        return entry, more
+
+    def execute_incremental(self):
+        try:
+            data = self.execute_operation(self.operation, self.root_value)
+        except GraphQLError as error:
+            self.errors.append(error)
+            self.pending.clear()
+            data = None
+        result = self.build_response(data, self.errors)
+        payload = {'data': result.data, 'hasNext': bool(self.pending)}
+        if result.errors:
+            payload['errors'] = result.errors
+        yield payload
+        while self.pending:
+            record = self.pending.popleft()
+            entry, more = self.run(record)
+            if more:
+                self.pending.append(record)
+            yield {'incremental': [entry], 'hasNext': bool(self.pending)}
+
+
+# Yields the initial payload, then one payload per deferred fragment or batch
+# of streamed items. Errors are left as GraphQLError for the caller to format.
+def execute_incremental(schema, document, root_value=None, context_value=None, variable_values=None,
+                        operation_name=None, middleware=None):
+    context = IncrementalExecutionContext.build(
+        schema, document, root_value, context_value, variable_values, operation_name,
+        middleware=middleware, is_awaitable=assume_not_awaitable,
+    )
+    if isinstance(context, list):
+        yield {'errors': context, 'hasNext': False}
+        return
+    yield from context.execute_incremental()
+
+
+def format_payload(payload, format_error):
+    if 'errors' in payload:
+        payload['errors'] = [format_error(error) for error in payload['errors']]
+    for entry in payload.get('incremental', ()):
+        if 'errors' in entry:
+            entry['errors'] = [format_error(error) for error in entry['errors']]
+    return payload
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import threading
+
+from django.conf import settings
+from graphql import get_introspection_query, graphql_sync, print_schema
+
+from .coalescing import normalize
+
+
+# Precomputed introspection. The printed SDL and the results of introspection
+# queries depend only on the schema, so they are computed once and served from
+# memory with an ETag derived from the schema hash (a sha256 of the SDL). A
+# deploy that changes the schema changes the hash, which drops the stored
+# results and every client's copy; nothing else invalidates them. The standard
+# introspection queries are computed by warm() (call it from the post_fork
+# hook) or loaded from INTROSPECTION_CACHE_FILE when `manage.py
+# build_introspection` wrote it for the same schema hash. Any other query that
+# only selects __schema, __type or __typename is stored after its first
+# execution, up to MAX_RESULTS of them.
+
+INTROSPECTION_FIELDS = frozenset(('__schema', '__type', '__typename'))
+MAX_RESULTS = 256
+
+STANDARD_QUERIES = (
+    get_introspection_query(),
+    get_introspection_query(
+        specified_by_url=True, directive_is_repeatable=True, schema_description=True, input_value_deprecation=True
+    ),
+)
+
+
+def digest(value):
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+class IntrospectionCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._schema = None
+        self._results = {}
+        self.sdl = None
+        self.hash = None
+
+    @property
+    def etag(self):
+        return f'"{self.hash[:32]}"'
+
+    def prepare(self, schema):
+        with self._lock:
+            if self._schema is not schema:
+                sdl = print_schema(schema)
+                schema_hash = digest(sdl)
+                if schema_hash != self.hash:
+                    self._results = self.read_file(schema_hash)
+                    self.sdl, self.hash = sdl, schema_hash
+                self._schema = schema
+        return self
+
+    def key(self, document, variables, operation_name):
+        return digest(json.dumps([document, variables or {}, operation_name], sort_keys=True, default=str))
+
+    # (response body, ETag) for an introspection query, or None for any other
+    # query or one that fails, which are left to the regular execution.
+    def response(self, schema, query, variables=None, operation_name=None):
+        try:
+            normalized = normalize(query, operation_name)
+        except Exception:
+            return None
+        if normalized is None or not normalized[1] <= INTROSPECTION_FIELDS:
+            return None
+        self.prepare(schema)
+        key = self.key(normalized[0], variables, operation_name)
+        content = self._results.get(key)
+        if content is None:
+            result = graphql_sync(schema, query, variable_values=variables, operation_name=operation_name)
+            if result.errors:
+                return None
+            content = json.dumps({'data': result.data}, separators=(',', ':'))
+            if len(self._results) < MAX_RESULTS:
+                self._results[key] = content
+        return content, f'"{self.hash[:16]}-{key[:16]}"'
+
+    def warm(self, schema):
+        for query in STANDARD_QUERIES:
+            for operation_name in (None, 'IntrospectionQuery'):
+                self.response(schema, query, operation_name=operation_name)
+
+    # Build time file
+
+    def read_file(self, schema_hash):
+        path = settings.INTROSPECTION_CACHE_FILE
+        if path is None:
+            return {}
+        try:
+            with open(path) as file:
+                stored = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        return stored['results'] if stored.get('hash') == schema_hash else {}
+
+    def write_file(self, schema, path):
+        self.warm(schema)
+        with open(path, 'w') as file:
+            json.dump({'hash': self.hash, 'results': self._results}, file)
+
+
+introspection_cache = IntrospectionCache()
@@ -0,0 +1,257 @@
+import asyncio
+import json
+import random
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+
+from django.contrib.auth.hashers import make_password
+from graphql_jwt.shortcuts import get_token
+
+from .models import User
+
+
+# Load test harness for the GraphQL endpoint: seeded users with JWTs, a weighted
+# mix of scenarios run by concurrent asyncio clients over keep-alive HTTP/1.1
+# connections, and per operation latency and error statistics.
+
+LOADTEST_DOMAIN = 'loadtest.local'
+
+SCENARIOS = ('timeline', 'followedIdeas', 'addIdea', 'followRequest', 'tokenAuth', 'me')
+
+# tokenAuth is left out: it is rate limited per IP and every client of a run
+# shares one, so it would mostly measure THROTTLED errors.
+DEFAULT_MIX = {'timeline': 50, 'followedIdeas': 20, 'addIdea': 10, 'followRequest': 10, 'me': 10}
+RATE_LIMITED_SCENARIOS = ('tokenAuth',)
+
+LIST_ALL_IDEAS = 'query listAllIdeas { listAllIdeas { id content pubDate pubUser { username } } }'
+LIST_FOLLOWED_IDEAS = (
+    'query listFollowedIdeas($idUser: ID!) { listFollowedIdeas(idUser: $idUser) { id content pubDate } }'
+)
+ME = 'query me { me { id username followers { id } following { id } } }'
+ADD_IDEA = (
+    'mutation addIdea($content: String!, $visibility: String) '
+    '{ addIdea(content: $content, visibility: $visibility) { success idea { id } } }'
+)
+SEND_FOLLOW_REQUEST = (
+    'mutation sendFollowRequest($idUser: ID!) { sendFollowRequest(idUser: $idUser) { success followRequest { id } } }'
+)
+FOLLOW_UP_REQUEST = 'query followUpRequest { followUpRequest(first: 20) { id requester { id } } }'
+RESPONSE_FOLLOW_REQUEST = (
+    'mutation responseFollowRequest($idRequest: ID!, $response: Boolean!) '
+    '{ responseFollowRequest(idRequest: $idRequest, response: $response) { success } }'
+)
+TOKEN_AUTH = 'mutation tokenAuth($email: String!, $password: String!) { tokenAuth(email: $email, password: $password) { token } }'
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        if name not in SCENARIOS:
+            raise ValueError(f'Unknown scenario {name!r}, expected one of {", ".join(SCENARIOS)}')
+        mix[name] = int(weight or 1)
+    return mix
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+# Seeding
+
+def seed_users(count, password, ideas_per_user=5, follows_per_user=5, rng=None):
+    rng = rng or random.Random(0)
+    existing = {user.email: user for user in User.objects.filter(email__endswith=f'@{LOADTEST_DOMAIN}')}
+    password_hash = make_password(password)
+    missing = [
+        User(username=f'loadtest{index}', email=f'loadtest{index}@{LOADTEST_DOMAIN}', password=password_hash)
+        for index in range(count)
+        if f'loadtest{index}@{LOADTEST_DOMAIN}' not in existing
+    ]
+    for user in missing:
+        user.save()
+        for number in range(ideas_per_user):
+            user.idea_user.create(content=f'seeded idea {number} of {user.username}')
+    users = list(User.objects.filter(email__endswith=f'@{LOADTEST_DOMAIN}').order_by('pk')[:count])
+    for user in missing:
+        others = [other for other in users if other.pk != user.pk]
+        user.following.add(*rng.sample(others, min(follows_per_user, len(others))))
+    return users
+
+
+class VirtualUser:
+    def __init__(self, user, password):
+        self.id = user.pk
+        self.email = user.email
+        self.password = password
+        self.token = get_token(user)
+        self.following = list(user.following.values_list('pk', flat=True))
+
+
+# HTTP
+
+class Connection:
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.path = parts.path or '/'
+        self.reader = self.writer = None
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+    async def post(self, body, headers):
+        if self.writer is None:
+            await self.open()
+        head = [f'POST {self.path} HTTP/1.1', f'Host: {self.host}:{self.port}', 'Content-Type: application/json',
+                f'Content-Length: {len(body)}']
+        head.extend(f'{name}: {value}' for name, value in headers.items())
+        self.writer.write(('\r\n'.join(head) + '\r\n\r\n').encode() + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('Connection closed by the server')
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+        if 'content-length' in response_headers:
+            content = await self.reader.readexactly(int(response_headers['content-length']))
+        else:
+            content = await self.reader.read()
+            response_headers['connection'] = 'close'
+        if response_headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, content
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(Counter)
+
+    def record(self, operation, seconds, error=None):
+        self.latencies[operation].append(seconds)
+        if error:
+            self.errors[operation][error] += 1
+
+    def report(self, elapsed):
+        rows = []
+        for operation in sorted(self.latencies):
+            latencies = self.latencies[operation]
+            errors = sum(self.errors[operation].values())
+            rows.append({
+                'operation': operation,
+                'requests': len(latencies),
+                'throughput': len(latencies) / elapsed if elapsed else 0,
+                'p50': percentile(latencies, 0.50) * 1000,
+                'p90': percentile(latencies, 0.90) * 1000,
+                'p99': percentile(latencies, 0.99) * 1000,
+                'max': max(latencies) * 1000,
+                'error_rate': errors / len(latencies),
+                'errors': dict(self.errors[operation]),
+            })
+        return rows
+
+
+# Client
+
+class Client:
+    def __init__(self, url, stats, users, rng):
+        self.connection = Connection(url)
+        self.stats = stats
+        self.users = users
+        self.rng = rng
+        self.scenarios = {
+            'timeline': self.timeline,
+            'followedIdeas': self.followed_ideas,
+            'addIdea': self.add_idea,
+            'followRequest': self.follow_request,
+            'tokenAuth': self.token_auth,
+            'me': self.me,
+        }
+
+    async def execute(self, operation, query, variables=None, user=None):
+        body = json.dumps({'query': query, 'variables': variables or {}, 'operationName': operation}).encode()
+        headers = {'Authorization': f'JWT {user.token}'} if user else {}
+        start = time.perf_counter()
+        error = None
+        data = None
+        try:
+            status, content = await self.connection.post(body, headers)
+            payload = json.loads(content) if content else {}
+            data = payload.get('data')
+            if payload.get('errors'):
+                first = payload['errors'][0]
+                error = (first.get('extensions') or {}).get('code') or first.get('message', 'error')[:80]
+            elif status != 200:
+                error = f'HTTP {status}'
+        except (OSError, ValueError, asyncio.IncompleteReadError) as exc:
+            self.connection.close()
+            error = type(exc).__name__
+        self.stats.record(operation, time.perf_counter() - start, error)
+        return data
+
+    async def timeline(self, user):
+        await self.execute('listAllIdeas', LIST_ALL_IDEAS, user=user)
+
+    async def followed_ideas(self, user):
+        if user.following:
+            await self.execute('listFollowedIdeas', LIST_FOLLOWED_IDEAS, {'idUser': self.rng.choice(user.following)}, user)
+
+    async def me(self, user):
+        await self.execute('me', ME, user=user)
+
+    async def add_idea(self, user):
+        visibility = self.rng.choice(['public', 'public', 'protected', 'private'])
+        await self.execute('addIdea', ADD_IDEA, {'content': f'load test idea {self.rng.random()}', 'visibility': visibility}, user)
+
+    async def follow_request(self, user):
+        target = self.rng.choice([other for other in self.users if other.id != user.id])
+        await self.execute('sendFollowRequest', SEND_FOLLOW_REQUEST, {'idUser': target.id}, user)
+        data = await self.execute('followUpRequest', FOLLOW_UP_REQUEST, user=target)
+        for request in ((data or {}).get('followUpRequest') or [])[:1]:
+            await self.execute(
+                'responseFollowRequest', RESPONSE_FOLLOW_REQUEST,
+                {'idRequest': request['id'], 'response': self.rng.random() < 0.5}, target
+            )
+
+    async def token_auth(self, user):
+        await self.execute('tokenAuth', TOKEN_AUTH, {'email': user.email, 'password': user.password})
+
+
+async def run_client(client, scenarios, weights, deadline, remaining):
+    try:
+        while time.monotonic() < deadline and remaining.get('requests', 1) > 0:
+            if 'requests' in remaining:
+                remaining['requests'] -= 1
+            scenario = client.rng.choices(scenarios, weights)[0]
+            await client.scenarios[scenario](client.rng.choice(client.users))
+    finally:
+        client.connection.close()
+
+
+async def run_load(url, users, mix, concurrency, duration=None, requests=None, seed=0):
+    stats = Stats()
+    scenarios, weights = zip(*mix.items())
+    deadline = time.monotonic() + duration if duration else float('inf')
+    remaining = {'requests': requests} if requests else {}
+    clients = [Client(url, stats, users, random.Random(seed + index)) for index in range(concurrency)]
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(client, scenarios, weights, deadline, remaining) for client in clients))
+    return stats, time.perf_counter() - start
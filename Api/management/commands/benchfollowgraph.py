@@ -0,0 +1,69 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from Api.followgraph import Follow, FollowGraph
+from Api.models import User
+
+
+class Command(BaseCommand):
+    help = 'Compare follow lookups in the in-memory follow graph index against SQL on a random graph'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--edges', type=int, default=1000000)
+        parser.add_argument('--lookups', type=int, default=10000)
+        parser.add_argument('--sql', action='store_true', help='Also load the graph in the database (rolled back) and time SQL')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        users, lookups = options['users'], options['lookups']
+        edges = sorted({(rng.randrange(1, users + 1), rng.randrange(1, users + 1)) for _ in range(options['edges'])})
+        edges = [(follower, followed) for follower, followed in edges if follower != followed]
+        pairs = [(rng.randrange(1, users + 1), rng.randrange(1, users + 1)) for _ in range(lookups)]
+
+        start = time.perf_counter()
+        graph = FollowGraph.from_edges(edges)
+        self.stdout.write(
+            f'index: {len(edges)} edges built in {time.perf_counter() - start:.2f} s, '
+            f'{graph.memory_bytes() / 2 ** 20:.1f} MiB'
+        )
+        self.report('index follows', lambda: [graph.follows(a, b) for a, b in pairs], lookups)
+        self.report('index following', lambda: [graph.following(a) for a, _ in pairs], lookups)
+
+        if options['sql']:
+            with transaction.atomic():
+                offset = self.load_database(users, edges)
+                pairs = [(offset + a, offset + b) for a, b in pairs]
+                self.report(
+                    'sql follows', lambda: [Follow.objects.filter(from_user_id=a, to_user_id=b).exists() for a, b in pairs],
+                    lookups
+                )
+                self.report(
+                    'sql following',
+                    lambda: [list(Follow.objects.filter(from_user_id=a).values_list('to_user_id', flat=True)) for a, _ in pairs],
+                    lookups
+                )
+                transaction.set_rollback(True)
+
+    def report(self, name, run, lookups):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f'{name:>16}: {elapsed / lookups * 1e6:10.2f} us/lookup')
+
+    def load_database(self, users, edges):
+        offset = (User.objects.order_by('-pk').values_list('pk', flat=True).first() or 0)
+        User.objects.bulk_create(
+            [User(pk=offset + i, username=f'bench{offset + i}', email=f'bench{offset + i}@bench.test') for i in range(1, users + 1)],
+            batch_size=5000
+        )
+        Follow.objects.bulk_create(
+            [Follow(from_user_id=offset + a, to_user_id=offset + b) for a, b in edges],
+            batch_size=10000
+        )
+        self.stdout.write(f'database: {users} users and {len(edges)} edges loaded')
+        return offset
@@ -0,0 +1,51 @@
+import timeit
+
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.utils import timezone
+from graphene_django.views import GraphQLView as BaseGraphQLView
+
+from Api.renderers import compress_response
+from Api.views import GraphQLView
+
+
+class Command(BaseCommand):
+    help = 'Compare response rendering of the stock GraphQLView against Api.views.GraphQLView'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ideas', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        pub_date = timezone.now().isoformat()
+        data = {'data': {'listAllIdeas': [
+            {
+                'id': str(i),
+                'content': f'idea number {i} ' * 8,
+                'visibility': 'PUBLIC',
+                'pubDate': pub_date,
+                'pubUser': {'username': f'user{i % 500}'},
+            }
+            for i in range(options['ideas'])
+        ]}}
+        request = RequestFactory().post('/graphql/', HTTP_ACCEPT_ENCODING='gzip, br')
+        repeat = options['repeat']
+
+        base_view = BaseGraphQLView()
+        view = GraphQLView()
+        for name, encode in (('stock', base_view.json_encode), ('fast', view.json_encode)):
+            seconds = min(timeit.repeat(lambda: encode(request, data), number=1, repeat=repeat))
+            self.stdout.write(f'{name:>8} encode: {seconds * 1000:8.2f} ms')
+
+        body = view.json_encode(request, data)
+
+        def render():
+            return compress_response(request, HttpResponse(body, content_type='application/json'))
+
+        seconds = min(timeit.repeat(render, number=1, repeat=repeat))
+        response = render()
+        self.stdout.write(
+            f'compress: {seconds * 1000:8.2f} ms '
+            f'({len(body)} -> {len(response.content)} bytes, {response.get("Content-Encoding", "identity")})'
+        )
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from Api.introspection import introspection_cache
+
+
+class Command(BaseCommand):
+    help = 'Precompute the introspection results of the schema into INTROSPECTION_CACHE_FILE'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Write to this file instead of INTROSPECTION_CACHE_FILE')
+
+    def handle(self, *args, **options):
+        from Api.schema import build_schema
+
+        path = options['output'] or settings.INTROSPECTION_CACHE_FILE
+        if path is None:
+            raise CommandError('INTROSPECTION_CACHE_FILE is not set, pass --output.')
+        introspection_cache.write_file(build_schema().graphql_schema, path)
+        self.stdout.write(f'Schema {introspection_cache.hash[:16]} written to {path}')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from Api.suggestions import compute_follow_suggestions
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the "people you may know" suggestions from the whole follow graph'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        users = compute_follow_suggestions(batch_size=options['batch_size'])
+        self.stdout.write(f'Suggestions computed for {users} users')
@@ -0,0 +1,29 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from Api.outbox import dispatch_pending, purge_dispatched, requeue_parked
+
+
+class Command(BaseCommand):
+    help = 'Deliver the pending outbox events to their receivers in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--loop', type=float, default=0, help='Keep running, polling every LOOP seconds')
+        parser.add_argument('--keep-hours', type=int, default=72, help='Delete dispatched events older than KEEP_HOURS')
+        parser.add_argument('--requeue-parked', action='store_true', help='Retry the events parked after repeated failures')
+
+    def handle(self, *args, **options):
+        if options['requeue_parked']:
+            self.stdout.write(f'{requeue_parked()} parked events requeued')
+        while True:
+            dispatched = dispatch_pending(batch_size=options['batch_size'])
+            purged = purge_dispatched(timezone.now() - timedelta(hours=options['keep_hours']))
+            if dispatched or purged or not options['loop']:
+                self.stdout.write(f'{dispatched} events dispatched, {purged} purged')
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
@@ -0,0 +1,59 @@
+import asyncio
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Api.loadtest import DEFAULT_MIX, RATE_LIMITED_SCENARIOS, SCENARIOS, VirtualUser, parse_mix, run_load, seed_users
+
+
+class Command(BaseCommand):
+    help = 'Drive a running server with concurrent GraphQL clients and report throughput, latency and errors per operation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000/graphql/')
+        parser.add_argument('--users', type=int, default=50, help='Seeded users (created on first run, password --password)')
+        parser.add_argument('--password', default='loadtest-password')
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to run, ignored when --requests is given')
+        parser.add_argument('--requests', type=int, help='Number of scenarios to run instead of a duration')
+        parser.add_argument(
+            '--mix', default=','.join(f'{name}={weight}' for name, weight in DEFAULT_MIX.items()),
+            help=f'Weighted scenarios among {", ".join(SCENARIOS)}'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options['mix'])
+        except ValueError as err:
+            raise CommandError(err)
+        for name in RATE_LIMITED_SCENARIOS:
+            if mix.get(name):
+                self.stderr.write(
+                    f'{name} is rate limited per IP and all clients share this one, expect THROTTLED errors.'
+                )
+        users = [VirtualUser(user, options['password']) for user in seed_users(options['users'], options['password'])]
+        if len(users) < 2:
+            raise CommandError('At least two users are needed')
+
+        stats, elapsed = asyncio.run(run_load(
+            options['url'], users, mix, options['concurrency'],
+            duration=None if options['requests'] else options['duration'], requests=options['requests'], seed=options['seed']
+        ))
+        rows = stats.report(elapsed)
+        if options['json']:
+            self.stdout.write(json.dumps({'elapsed': elapsed, 'operations': rows}, indent=2))
+            return
+
+        self.stdout.write(f'{sum(row["requests"] for row in rows)} requests in {elapsed:.1f} s, concurrency {options["concurrency"]}')
+        self.stdout.write(
+            f'{"operation":<24}{"requests":>9}{"req/s":>9}{"p50 ms":>9}{"p90 ms":>9}{"p99 ms":>9}{"max ms":>9}{"errors":>8}'
+        )
+        for row in rows:
+            self.stdout.write(
+                f'{row["operation"]:<24}{row["requests"]:>9}{row["throughput"]:>9.1f}{row["p50"]:>9.1f}{row["p90"]:>9.1f}'
+                f'{row["p99"]:>9.1f}{row["max"]:>9.1f}{row["error_rate"]:>8.1%}'
+            )
+            for error, count in row['errors'].items():
+                self.stdout.write(f'{"":<4}{count} x {error}')
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from Api.partitioning import archive_partitions, convert_to_partitioned, create_future_partitions
+
+
+class Command(BaseCommand):
+    help = 'Manage monthly PostgreSQL range partitions of the Idea table by pub_date'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['convert', 'create', 'archive'])
+        parser.add_argument('--months', type=int, default=3, help='Future months to create partitions for')
+        parser.add_argument('--keep-months', type=int, default=12, help='Months kept before archiving')
+        parser.add_argument('--archive-dir', default=settings.IDEA_ARCHIVE_DIR)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Partitioning is only supported on PostgreSQL')
+        try:
+            if options['action'] == 'convert':
+                convert_to_partitioned(months_ahead=options['months'])
+                self.stdout.write('Idea table converted to monthly partitions')
+            elif options['action'] == 'create':
+                created = create_future_partitions(months_ahead=options['months'])
+                self.stdout.write(f'{len(created)} partitions created')
+            else:
+                for path in archive_partitions(options['keep_months'], options['archive_dir']):
+                    self.stdout.write(f'Archived to {path}')
+        except ValueError as err:
+            raise CommandError(str(err))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from Api.purge import purge_deleted_users
+
+
+class Command(BaseCommand):
+    help = 'Physically delete soft-deleted users and everything they own, in bounded batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        purged = purge_deleted_users(batch_size=options['batch_size'])
+        self.stdout.write(f'{purged} users purged')
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from Api.rebalance import rebalance_ideas
+
+
+class Command(BaseCommand):
+    help = "Move every idea to its author's shard, e.g. after adding or removing an IDEA_SHARDS alias"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from', dest='sources', nargs='+',
+            help='Database aliases to drain, by default the IDEA_SHARDS (also list a removed shard here)'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        moved = rebalance_ideas(sources=options['sources'], batch_size=options['batch_size'], dry_run=options['dry_run'])
+        for (source, target), count in sorted(moved.items()):
+            self.stdout.write(f'{source} -> {target}: {count} ideas{" (dry run)" if options["dry_run"] else ""}')
+        if not moved:
+            self.stdout.write('Every idea is on its shard')
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from Api.trending import refresh_trending
+
+
+class Command(BaseCommand):
+    help = 'Recompute the trending score of new ideas and of ideas whose author gained or lost followers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--loop', type=int, default=0, help='Keep running, refreshing every LOOP seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            updated, removed = refresh_trending(batch_size=options['batch_size'])
+            self.stdout.write(f'{updated} scores updated, {removed} expired')
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from Api.models import SlowQuery
+from Api.sqllog import slow_query_report
+
+
+class Command(BaseCommand):
+    help = 'Report the slow SQL statements grouped by GraphQL operation, field and statement'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help='Only statements logged in the last HOURS')
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--explain', action='store_true', help='Print the latest captured plan of each statement')
+        parser.add_argument('--purge-days', type=int, help='Delete the entries older than PURGE_DAYS instead of reporting')
+
+    def handle(self, *args, **options):
+        if options['purge_days'] is not None:
+            deleted, _ = SlowQuery.objects.filter(
+                created_at__lt=timezone.now() - timedelta(days=options['purge_days'])
+            ).delete()
+            self.stdout.write(f'{deleted} entries deleted')
+            return
+
+        report = slow_query_report(since=timezone.now() - timedelta(hours=options['hours']), limit=options['limit'])
+        for entry in report:
+            self.stdout.write(
+                f'{entry["count"]:>6}x  avg {entry["avg_ms"]:.1f} ms  max {entry["max_ms"]:.1f} ms  '
+                f'{entry["operation_name"] or "-"} {entry["field_path"] or "-"}'
+            )
+            self.stdout.write(f'        {entry["sql"]}')
+            if options['explain'] and entry['explain']:
+                for line in entry['explain'].splitlines():
+                    self.stdout.write(f'          {line}')
+        if not report:
+            self.stdout.write('No slow statements logged')
@@ -0,0 +1,35 @@
+# Generated by Django 3.2.16 on 2026-10-19 00:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Api', '0004_alter_followrequest_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='followrequest',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='idea',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.CreateModel(
+            name='IdeaTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('idea_id', models.BigIntegerField()),
+                ('visibility', models.CharField(choices=[('public', 'Public'), ('protected', 'Protected'), ('private', 'Private')], max_length=9)),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('pub_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='idea_tombstones', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
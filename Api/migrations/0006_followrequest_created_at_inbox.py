@@ -0,0 +1,24 @@
+# Generated by Django 3.2.16 on 2026-10-19 00:21
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Api', '0005_sync_updated_at_tombstones'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='followrequest',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='followrequest',
+            index=models.Index(fields=['to_follow', 'status', '-created_at', '-id'], name='followrequest_inbox_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.16 on 2026-10-19 00:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Api', '0006_followrequest_created_at_inbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdeaScore',
+            fields=[
+                ('idea', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='score', serialize=False, to='Api.idea')),
+                ('followers', models.PositiveIntegerField(default=0)),
+                ('score', models.FloatField(db_index=True)),
+            ],
+        ),
+    ]
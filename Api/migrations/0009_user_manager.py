@@ -0,0 +1,20 @@
+# Generated by Django 3.2.16 on 2026-10-19 00:26
+
+import Api.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Api', '0008_followsuggestion'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', Api.models.UserManager()),
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.16 on 2026-10-19 00:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Api', '0009_user_manager'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='ideatombstone',
+            name='pub_user',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='idea_tombstones', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
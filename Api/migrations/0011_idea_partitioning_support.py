@@ -0,0 +1,23 @@
+# Generated by Django 3.2.16 on 2026-10-19 00:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Api', '0010_user_soft_delete'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ideascore',
+            name='idea',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='score', serialize=False, to='Api.idea'),
+        ),
+        migrations.AddIndex(
+            model_name='idea',
+            index=models.Index(fields=['-pub_date'], name='idea_pub_date_idx'),
+        ),
+    ]
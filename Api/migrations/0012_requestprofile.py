@@ -0,0 +1,27 @@
+# Generated by Django 3.2.16 on 2026-10-19 00:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Api', '0011_idea_partitioning_support'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('path', models.CharField(max_length=200)),
+                ('operation_name', models.CharField(blank=True, max_length=200)),
+                ('variables_hash', models.CharField(blank=True, max_length=64)),
+                ('duration_ms', models.FloatField()),
+                ('query_count', models.PositiveIntegerField(default=0)),
+                ('kind', models.CharField(choices=[('cprofile', 'cProfile'), ('stacks', 'Stack samples')], max_length=8)),
+                ('file_name', models.CharField(max_length=200)),
+            ],
+        ),
+    ]
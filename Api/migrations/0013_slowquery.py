@@ -0,0 +1,27 @@
+# Generated by Django 3.2.16 on 2026-10-19 00:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Api', '0012_requestprofile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('operation_name', models.CharField(blank=True, max_length=200)),
+                ('field_path', models.CharField(blank=True, max_length=200)),
+                ('fingerprint', models.CharField(db_index=True, max_length=64)),
+                ('duration_ms', models.FloatField()),
+                ('sql', models.TextField()),
+                ('params', models.TextField(blank=True)),
+                ('explain', models.TextField(blank=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.16 on 2026-10-19 00:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Api', '0013_slowquery'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='idea',
+            name='pub_user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='idea_user', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.16 on 2026-10-19 00:54
+
+import Api.entitycache
+from django.conf import settings
+from django.db import migrations
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Api', '0015_outboxevent'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='followrequest',
+            name='requester',
+            field=Api.entitycache.CachedForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='follow_send', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='followrequest',
+            name='to_follow',
+            field=Api.entitycache.CachedForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='follow_recived', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='idea',
+            name='pub_user',
+            field=Api.entitycache.CachedForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='idea_user', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+# Slow queries used to be saved with the repr of their parameters.
+def redact_params(apps, schema_editor):
+    apps.get_model('Api', 'SlowQuery').objects.using(schema_editor.connection.alias).update(params='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Api', '0016_cached_foreign_keys'),
+    ]
+
+    operations = [
+        migrations.RunPython(redact_params, migrations.RunPython.noop),
+    ]
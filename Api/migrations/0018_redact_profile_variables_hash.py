@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+# Profiles used to be saved with an unsalted sha256 of the request variables.
+def redact_variables_hash(apps, schema_editor):
+    apps.get_model('Api', 'RequestProfile').objects.using(schema_editor.connection.alias).update(variables_hash='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Api', '0017_redact_slow_query_params'),
+    ]
+
+    operations = [
+        migrations.RunPython(redact_variables_hash, migrations.RunPython.noop),
+    ]
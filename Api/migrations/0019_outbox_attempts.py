@@ -0,0 +1,36 @@
+# Generated by Django 3.2.16 on 2026-10-19 01:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Api', '0018_redact_profile_variables_hash'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='outboxevent',
+            name='outboxevent_pending_idx',
+        ),
+        migrations.AddField(
+            model_name='outboxevent',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='outboxevent',
+            name='last_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='outboxevent',
+            name='parked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='outboxevent',
+            index=models.Index(condition=models.Q(('dispatched_at__isnull', True), ('parked_at__isnull', True)), fields=['id'], name='outboxevent_pending_idx'),
+        ),
+    ]
@@ -1,11 +1,39 @@
-from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, models, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from django.contrib.auth.models import AbstractUser, UserManager as BaseUserManager
+
+from .entitycache import CachedForeignKey
+from .sharding import next_idea_id, shard_for_user
+
+
+class UserQuerySet(models.QuerySet):
+    def alive(self):
+        return self.filter(deleted_at__isnull=True)
+
+    def with_relationship(self, viewer):
+        follow = User.following.through
+        pending = FollowRequest.objects.filter(status=FollowRequest.PENDING)
+        return self.annotate(
+            viewer_follows=Exists(follow.objects.filter(from_user=viewer.pk, to_user=OuterRef('pk'))),
+            follows_viewer=Exists(follow.objects.filter(from_user=OuterRef('pk'), to_user=viewer.pk)),
+            viewer_requested=Exists(pending.filter(requester=viewer.pk, to_follow=OuterRef('pk'))),
+            requested_viewer=Exists(pending.filter(requester=OuterRef('pk'), to_follow=viewer.pk)),
+        )
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
+    pass
 
 
 class User(AbstractUser):
     username = models.CharField('username', max_length=100, unique=True)
     email = models.EmailField('email address', unique=True)
     following = models.ManyToManyField("self", symmetrical=False, blank=True, related_name='followers')
+    deleted_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    objects = UserManager()
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username',)
@@ -13,6 +41,43 @@ class User(AbstractUser):
     def __str__(self):
         return self.username
 
+    def soft_delete(self):
+        self.deleted_at = timezone.now()
+        self.is_active = False
+        with transaction.atomic():
+            self.save(update_fields=['deleted_at', 'is_active'])
+            hide_ideas_of([self.pk])
+
+
+def visibility_filter(viewer, following=None):
+    if viewer.is_anonymous:
+        return Q(visibility=Idea.PUBLIC)
+    if following is None:
+        following = viewer.following.values('pk')
+    return (
+        Q(pub_user=viewer)
+        | Q(visibility=Idea.PUBLIC)
+        | Q(visibility=Idea.PROTECTED, pub_user__in=following)
+    )
+
+
+class IdeaQuerySet(models.QuerySet):
+    # An idea shard other than the default database has no users to join, so
+    # there the user side is evaluated first and passed as a list of ids.
+    def on_shard(self):
+        return self.db != DEFAULT_DB_ALIAS
+
+    def alive(self):
+        if self.on_shard():
+            deleted = User.objects.filter(deleted_at__isnull=False).values_list('pk', flat=True)
+            return self.exclude(pub_user_id__in=list(deleted))
+        return self.filter(pub_user__deleted_at__isnull=True)
+
+    def visible_to(self, viewer, following=None):
+        if self.on_shard() and not viewer.is_anonymous and not isinstance(following, list):
+            following = list(viewer.following.values_list('pk', flat=True))
+        return self.alive().filter(visibility_filter(viewer, following))
+
 
 class Idea(models.Model):
     PUBLIC = 'public'
@@ -25,15 +90,27 @@ class Idea(models.Model):
     ]
     content = models.CharField(max_length=280, blank=False)
     pub_date = models.DateTimeField(auto_now_add=True)
-    pub_user = models.ForeignKey(User, on_delete=models.CASCADE, null=False, blank=False, related_name='idea_user')
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    pub_user = CachedForeignKey(User, on_delete=models.CASCADE, null=False, blank=False, related_name='idea_user', db_constraint=False)
     visibility = models.CharField(max_length=9, choices=VISIBILITY_CHOICES, default=PUBLIC)
 
+    objects = IdeaQuerySet.as_manager()
+
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(fields=['-pub_date'], name='idea_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.content
 
+    def save(self, *args, **kwargs):
+        if self.pk is None and len(settings.IDEA_SHARDS) > 1:
+            self.pk = next_idea_id()
+            kwargs['force_insert'] = True
+        super().save(*args, **kwargs)
+
 
 class FollowRequest(models.Model):
     PENDING = 'pending'
@@ -44,10 +121,130 @@ class FollowRequest(models.Model):
         (ACCEPTED, 'Accepted'),
         (DENIED, 'Denied')
     ]
-    to_follow = models.ForeignKey(User, on_delete=models.CASCADE, blank=False, related_name='follow_recived')
-    requester = models.ForeignKey(User, on_delete=models.CASCADE, blank=False, related_name='follow_send')
+    to_follow = CachedForeignKey(User, on_delete=models.CASCADE, blank=False, related_name='follow_recived')
+    requester = CachedForeignKey(User, on_delete=models.CASCADE, blank=False, related_name='follow_send')
     status = models.CharField(max_length=8, choices=STATUS_CHOICES, default=PENDING)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['to_follow', 'status', '-created_at', '-id'], name='followrequest_inbox_idx'),
+        ]
 
     def __str__(self):
         return f'{self.requester.username} follows {self.to_follow.username}'
 
+
+
+class IdeaTombstone(models.Model):
+    idea_id = models.BigIntegerField()
+    pub_user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='idea_tombstones')
+    visibility = models.CharField(max_length=9, choices=Idea.VISIBILITY_CHOICES)
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f'Idea {self.idea_id} removed'
+
+
+# Sync clients keep the ideas they received until they get a tombstone, so
+# hiding the ideas of soft deleted authors writes one for each idea, and
+# restoring the authors touches their ideas so that they are sent again.
+
+def hide_ideas_of(user_ids, batch_size=1000):
+    for user_id in user_ids:
+        ideas = Idea.objects.using(shard_for_user(user_id)).filter(pub_user_id=user_id).order_by('pk')
+        last_pk = 0
+        while True:
+            rows = list(ideas.filter(pk__gt=last_pk).values_list('pk', 'visibility')[:batch_size])
+            if not rows:
+                break
+            last_pk = rows[-1][0]
+            IdeaTombstone.objects.bulk_create(
+                [IdeaTombstone(idea_id=pk, pub_user_id=user_id, visibility=visibility) for pk, visibility in rows]
+            )
+
+
+def show_ideas_of(user_ids):
+    for user_id in user_ids:
+        Idea.objects.using(shard_for_user(user_id)).filter(pub_user_id=user_id).update(updated_at=timezone.now())
+
+
+class IdeaScore(models.Model):
+    idea = models.OneToOneField(Idea, on_delete=models.CASCADE, primary_key=True, related_name='score', db_constraint=False)
+    followers = models.PositiveIntegerField(default=0)
+    score = models.FloatField(db_index=True)
+
+    def __str__(self):
+        return f'{self.idea_id}: {self.score}'
+
+
+class FollowSuggestion(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='follow_suggestions')
+    suggested = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    mutual_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'suggested'], name='unique_follow_suggestion'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-mutual_count'], name='followsuggestion_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.suggested_id} for {self.user_id} ({self.mutual_count})'
+
+
+class RequestProfile(models.Model):
+    CPROFILE = 'cprofile'
+    STACKS = 'stacks'
+    KIND_CHOICES = [
+        (CPROFILE, 'cProfile'),
+        (STACKS, 'Stack samples')
+    ]
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    path = models.CharField(max_length=200)
+    operation_name = models.CharField(max_length=200, blank=True)
+    variables_hash = models.CharField(max_length=64, blank=True)
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField(default=0)
+    kind = models.CharField(max_length=8, choices=KIND_CHOICES)
+    file_name = models.CharField(max_length=200)
+
+    def __str__(self):
+        return f'{self.operation_name or self.path} ({self.duration_ms:.0f} ms)'
+
+
+class SlowQuery(models.Model):
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    operation_name = models.CharField(max_length=200, blank=True)
+    field_path = models.CharField(max_length=200, blank=True)
+    fingerprint = models.CharField(max_length=64, db_index=True)
+    duration_ms = models.FloatField()
+    sql = models.TextField()
+    params = models.TextField(blank=True)
+    explain = models.TextField(blank=True)
+
+    def __str__(self):
+        return f'{self.field_path or self.operation_name} ({self.duration_ms:.0f} ms)'
+
+
+class OutboxEvent(models.Model):
+    topic = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    parked_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['id'], condition=Q(dispatched_at__isnull=True, parked_at__isnull=True), name='outboxevent_pending_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.topic} #{self.pk}'
@@ -0,0 +1,114 @@
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import OutboxEvent
+
+
+logger = logging.getLogger(__name__)
+
+# Transactional outbox. Mutations record their domain events with emit() in the
+# same transaction as the change; dispatch_events() later hands the pending
+# events in bulk to the receivers of outbox_events, one call per batch. Delivery
+# is at least once: a batch whose receivers raise is delivered again, so
+# receivers must be idempotent. Failed events are retried one at a time, so a
+# poison event only holds back itself, and after OUTBOX_MAX_ATTEMPTS failures
+# it is parked (parked_at) until requeue_parked() puts it back.
+#
+#     @receiver(outbox_events)
+#     def invalidate_timelines(sender, events, **kwargs):
+#         ...
+
+outbox_events = Signal()
+
+IDEA_ADDED = 'idea.added'
+IDEA_EDITED = 'idea.edited'
+IDEA_DELETED = 'idea.deleted'
+FOLLOW_REQUEST_SENT = 'follow_request.sent'
+FOLLOW_REQUEST_ANSWERED = 'follow_request.answered'
+
+
+def emit(topic, **payload):
+    return OutboxEvent.objects.create(topic=topic, payload=payload)
+
+
+def emit_many(topic, payloads):
+    return OutboxEvent.objects.bulk_create([OutboxEvent(topic=topic, payload=payload) for payload in payloads])
+
+
+def idea_payload(idea):
+    return {'idea_id': idea.pk, 'pub_user_id': idea.pub_user_id, 'visibility': idea.visibility}
+
+
+def follow_request_payload(follow_request):
+    return {
+        'follow_request_id': follow_request.pk,
+        'requester_id': follow_request.requester_id,
+        'to_follow_id': follow_request.to_follow_id,
+        'status': follow_request.status,
+    }
+
+
+def pending_events():
+    return OutboxEvent.objects.filter(dispatched_at__isnull=True, parked_at__isnull=True)
+
+
+def dispatch_events(batch_size=500):
+    with transaction.atomic():
+        events = list(pending_events().select_for_update(skip_locked=True).order_by('pk')[:batch_size])
+        if not events:
+            return 0
+        if events[0].attempts:
+            events = events[:1]
+        try:
+            # The receivers' own writes are rolled back with a failed batch.
+            with transaction.atomic():
+                outbox_events.send(sender=OutboxEvent, events=events)
+        except Exception as error:
+            logger.exception('Outbox batch %s-%s failed, it will be delivered again', events[0].pk, events[-1].pk)
+            record_failure(events, error)
+            return 0
+        OutboxEvent.objects.filter(pk__in=[event.pk for event in events]).update(dispatched_at=timezone.now())
+    return len(events)
+
+
+def record_failure(events, error):
+    ids = [event.pk for event in events]
+    OutboxEvent.objects.filter(pk__in=ids).update(attempts=F('attempts') + 1, last_error=repr(error)[:2000])
+    parked = OutboxEvent.objects.filter(pk__in=ids, attempts__gte=settings.OUTBOX_MAX_ATTEMPTS).update(
+        parked_at=timezone.now()
+    )
+    if parked:
+        logger.error('%s outbox events failed %s times and were parked', parked, settings.OUTBOX_MAX_ATTEMPTS)
+
+
+# Stops at the first failure; the next run retries it.
+def dispatch_pending(batch_size=500):
+    dispatched = 0
+    while True:
+        count = dispatch_events(batch_size)
+        dispatched += count
+        if not count:
+            return dispatched
+
+
+def requeue_parked():
+    return OutboxEvent.objects.filter(dispatched_at__isnull=True, parked_at__isnull=False).update(
+        parked_at=None, attempts=0, last_error=''
+    )
+
+
+def purge_dispatched(before, batch_size=10000):
+    deleted = 0
+    while True:
+        ids = list(
+            OutboxEvent.objects.filter(dispatched_at__lt=before).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        OutboxEvent.objects.filter(pk__in=ids).delete()
+        deleted += len(ids)
@@ -0,0 +1,155 @@
+import gzip
+import re
+from datetime import date
+from pathlib import Path
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Idea, IdeaScore, IdeaTombstone
+
+
+# PostgreSQL declarative range partitioning of the Idea table by pub_date month.
+# The primary key of a partitioned table must contain the partition key, so the
+# converted table is keyed by (id, pub_date); ids stay unique through the
+# sequence, and nothing may hold a database-level foreign key to it.
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f'{table}_p{month:%Y%m}'
+
+
+def is_partitioned(cursor, table):
+    cursor.execute('SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)', [connection.ops.quote_name(table)])
+    row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def list_partitions(cursor, table):
+    cursor.execute(
+        'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass(%s)',
+        [connection.ops.quote_name(table)]
+    )
+    pattern = re.compile(rf'^{re.escape(table)}_p(\d{{4}})(\d{{2}})$')
+    partitions = {}
+    for (name,) in cursor.fetchall():
+        match = pattern.match(name)
+        if match:
+            partitions[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+
+def create_partition(cursor, table, month):
+    name = partition_name(table, month)
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS {connection.ops.quote_name(name)} PARTITION OF {connection.ops.quote_name(table)} '
+        f'FOR VALUES FROM (%s) TO (%s)',
+        [month.isoformat(), add_months(month, 1).isoformat()]
+    )
+    return name
+
+
+def create_future_partitions(months_ahead=3):
+    table = Idea._meta.db_table
+    current = month_start(timezone.now())
+    with transaction.atomic(), connection.cursor() as cursor:
+        if not is_partitioned(cursor, table):
+            raise ValueError(f'{table} is not partitioned')
+        existing = list_partitions(cursor, table)
+        return [
+            create_partition(cursor, table, add_months(current, offset))
+            for offset in range(months_ahead + 1)
+            if add_months(current, offset) not in existing
+        ]
+
+
+def convert_to_partitioned(months_ahead=3):
+    table = Idea._meta.db_table
+    quote = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        if is_partitioned(cursor, table):
+            raise ValueError(f'{table} is already partitioned')
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        cursor.execute(
+            'SELECT conrelid::regclass::text FROM pg_constraint WHERE confrelid = to_regclass(%s) AND contype = %s',
+            [quote(table), 'f']
+        )
+        referencing = [row[0] for row in cursor.fetchall()]
+        if referencing:
+            raise ValueError(f'Foreign keys to {table} from {", ".join(referencing)} must be dropped first')
+
+        cursor.execute('SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s', [table, f'{table}_pkey'])
+        indexes = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            'SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = %s',
+            [quote(table), 'f']
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [quote(table)])
+        sequence = cursor.fetchone()[0]
+        cursor.execute(f'SELECT min(pub_date) FROM {quote(table)}')
+        oldest = cursor.fetchone()[0] or timezone.now()
+
+        old_table = f'{table}_unpartitioned'
+        cursor.execute(f'ALTER TABLE {quote(table)} RENAME TO {quote(old_table)}')
+        cursor.execute(
+            f'CREATE TABLE {quote(table)} (LIKE {quote(old_table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY RANGE (pub_date)'
+        )
+        month = month_start(oldest)
+        last = add_months(month_start(timezone.now()), months_ahead)
+        while month <= last:
+            create_partition(cursor, table, month)
+            month = add_months(month, 1)
+        cursor.execute(f'CREATE TABLE {quote(table + "_default")} PARTITION OF {quote(table)} DEFAULT')
+        cursor.execute(f'INSERT INTO {quote(table)} SELECT * FROM {quote(old_table)}')
+        if sequence:
+            cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {quote(table)}.id')
+        cursor.execute(f'DROP TABLE {quote(old_table)}')
+
+        cursor.execute(f'ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(table + "_pkey")} PRIMARY KEY (id, pub_date)')
+        for index in indexes:
+            cursor.execute(index)
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} {definition}')
+
+
+def archive_partitions(keep_months, archive_dir):
+    table = Idea._meta.db_table
+    quote = connection.ops.quote_name
+    cutoff = add_months(month_start(timezone.now()), -keep_months)
+    archive_dir = Path(archive_dir)
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    archived = []
+    with connection.cursor() as cursor:
+        if not is_partitioned(cursor, table):
+            raise ValueError(f'{table} is not partitioned')
+        for month, name in sorted(list_partitions(cursor, table).items()):
+            if add_months(month, 1) > cutoff:
+                continue
+            with transaction.atomic():
+                cursor.execute(f'ALTER TABLE {quote(table)} DETACH PARTITION {quote(name)}')
+                cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {quote(name)})')
+                if cursor.fetchone()[0]:
+                    path = archive_dir / f'{name}.csv.gz'
+                    with gzip.open(path, 'wb') as archive:
+                        cursor.copy_expert(f'COPY {quote(name)} TO STDOUT WITH CSV HEADER', archive)
+                    # Sync clients drop the archived ideas through their tombstones.
+                    cursor.execute(
+                        f'INSERT INTO {quote(IdeaTombstone._meta.db_table)} (idea_id, pub_user_id, visibility, deleted_at) '
+                        f'SELECT id, pub_user_id, visibility, clock_timestamp() FROM {quote(name)}'
+                    )
+                    cursor.execute(
+                        f'DELETE FROM {quote(IdeaScore._meta.db_table)} WHERE idea_id IN (SELECT id FROM {quote(name)})'
+                    )
+                    archived.append(path)
+                cursor.execute(f'DROP TABLE {quote(name)}')
+    return archived
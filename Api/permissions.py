@@ -0,0 +1,98 @@
+import hashlib
+
+from django.conf import settings
+from graphql import GraphQLError
+
+from .followgraph import get_follow_graph
+from .models import Idea
+
+
+# Root fields that need an authenticated user, with the error they answer with.
+LOGIN_REQUIRED = {
+    'me': 'User not logged in',
+    'searchUsers': 'You must be logged in',
+    'suggestedFollows': 'You must be logged in',
+    'listAllIdeas': 'You must be logged in',
+    'listMyIdeas': 'You must be logged to see your ideas',
+    'listFollowedIdeas': 'You must be logged in',
+    'ideasSince': 'You must be logged in',
+    'trendingIdeas': 'You must be logged in',
+    'followUpRequest': 'You must be logged to see your follow request list',
+    'followRequestsSince': 'You must be logged to see your follow request list',
+    'changePassword': 'You must be logged to change your password',
+    'unfollow': 'You must be logged in for this',
+    'removeFollower': 'You must be logged in for this',
+    'deleteAccount': 'You must be logged to delete your account',
+    'addIdea': 'You must be logged to add ideas',
+    'editIdea': 'You must be logged to edit your ideas',
+    'deleteIdea': 'You must be logged to delete your ideas',
+    'sendFollowRequest': 'You must be logged to follow user',
+    'responseFollowRequest': 'You must be logged for this',
+}
+
+
+class PermissionMiddleware:
+    def resolve(self, next, root, info, **kwargs):
+        if info.path.prev is None and info.field_name in LOGIN_REQUIRED and info.context.user.is_anonymous:
+            raise GraphQLError(LOGIN_REQUIRED[info.field_name])
+        return next(root, info, **kwargs)
+
+
+# Visibility scope: the viewer's followed ids are read once per request, from
+# the follow graph index when it is enabled and fresh, and shared by every field
+# that returns ideas. Past VISIBILITY_INLINE_FOLLOWING ids the predicate falls
+# back to a subquery instead of a literal id list.
+
+class VisibilityScope:
+    def __init__(self, user):
+        self.user = user
+        self._following = None
+
+    @property
+    def following(self):
+        if self.user.is_anonymous:
+            return None
+        if self._following is None:
+            limit = settings.VISIBILITY_INLINE_FOLLOWING
+            graph = get_follow_graph()
+            if graph is not None:
+                ids = graph.following(self.user.pk)
+            else:
+                ids = list(self.user.following.values_list('pk', flat=True)[:limit + 1])
+            self._following = ids if len(ids) <= limit else self.user.following.values('pk')
+        return self._following
+
+    # Changes whenever the set of followed users does, and with it the
+    # PROTECTED ideas the user may see.
+    def fingerprint(self):
+        following = self.following
+        if isinstance(following, list):
+            ids = sorted(following)
+        else:
+            ids = self.user.following.order_by('pk').values_list('pk', flat=True).iterator()
+        return hashlib.sha256(','.join(map(str, ids)).encode()).hexdigest()[:16]
+
+    # What the viewer may see: their own ideas and the PROTECTED ideas of the
+    # users they follow. Requests with the same key may share a response.
+    def key(self):
+        if self.user.is_anonymous:
+            return 'anonymous'
+        return f'user:{self.user.pk}:{self.fingerprint()}'
+
+
+def get_visibility_scope(request):
+    scope = getattr(request, '_visibility_scope', None)
+    if scope is None or scope.user.pk != request.user.pk:
+        scope = request._visibility_scope = VisibilityScope(request.user)
+    return scope
+
+
+def reset_visibility_scope(request):
+    request._visibility_scope = None
+
+
+def visible_ideas(info, queryset=None):
+    if queryset is None:
+        queryset = Idea.objects.all()
+    scope = get_visibility_scope(info.context)
+    return queryset.visible_to(scope.user, scope.following)
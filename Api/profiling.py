@@ -0,0 +1,205 @@
+import cProfile
+import io
+import json
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+from django.http.request import RawPostDataException
+from django.utils.crypto import salted_hmac
+
+from .models import RequestProfile
+
+
+# Request profiling. A PROFILING_SAMPLE_RATE fraction of the requests is run
+# under cProfile; every other request is watched by a shared stack sampler, and
+# its samples are kept when it takes longer than PROFILING_SLOW_MS. Reports are
+# written to PROFILING_DIR, listed by RequestProfile and rotated past
+# PROFILING_MAX_FILES.
+
+class StackSampler:
+    def __init__(self, interval):
+        self.interval = interval
+        self._samples = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, thread_id):
+        with self._lock:
+            self._samples[thread_id] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+                self._thread.start()
+
+    def stop(self, thread_id):
+        with self._lock:
+            return self._samples.pop(thread_id, Counter())
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, samples in self._samples.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[collapse_stack(frame)] += 1
+
+
+def collapse_stack(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f'{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(stack))
+
+
+# Variables are identified by an HMAC keyed with SECRET_KEY: a plain hash of
+# the variables of register or tokenAuth could be brute-forced back to the
+# password.
+def variables_hash(variables):
+    return salted_hmac('Api.profiling.variables', variables, algorithm='sha256').hexdigest()
+
+
+def parse_operation(request):
+    if request.method == 'GET':
+        data = request.GET
+    else:
+        try:
+            data = json.loads(request.body or b'{}')
+        except (ValueError, RawPostDataException):
+            return '', ''
+    if isinstance(data, list):
+        return ','.join(item.get('operationName') or '' for item in data if isinstance(item, dict)), ''
+    if not hasattr(data, 'get'):
+        return '', ''
+    variables = data.get('variables') or ''
+    if not isinstance(variables, str):
+        variables = json.dumps(variables, sort_keys=True)
+    return data.get('operationName') or '', variables_hash(variables) if variables else ''
+
+
+def format_sql(queries):
+    return '\n'.join(f'[{query["duration"] * 1000:.1f} ms] {query["sql"]}' for query in queries)
+
+
+def format_profile(profiler):
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(60)
+    return output.getvalue()
+
+
+def format_stacks(samples):
+    return '\n'.join(f'{stack} {count}' for stack, count in samples.most_common())
+
+
+def rotate_profiles(directory, max_files):
+    for profile in RequestProfile.objects.order_by('-created_at', '-id')[max_files:]:
+        (directory / profile.file_name).unlink(missing_ok=True)
+        profile.delete()
+
+
+def save_profile(request, kind, duration_ms, queries, body):
+    directory = Path(settings.PROFILING_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    operation_name, variables_hash = parse_operation(request)
+    file_name = f'{time.strftime("%Y%m%d-%H%M%S")}-{threading.get_ident()}-{random.getrandbits(32):08x}.txt'
+    header = (
+        f'path: {request.path}\noperation: {operation_name}\nvariables: {variables_hash}\n'
+        f'duration: {duration_ms:.1f} ms\nqueries: {len(queries)}\n'
+    )
+    (directory / file_name).write_text(f'{header}\n== {kind} ==\n{body}\n\n== SQL ==\n{format_sql(queries)}\n')
+    profile = RequestProfile.objects.create(
+        path=request.path[:200],
+        operation_name=operation_name[:200],
+        variables_hash=variables_hash,
+        duration_ms=duration_ms,
+        query_count=len(queries),
+        kind=kind,
+        file_name=file_name,
+    )
+    rotate_profiles(directory, settings.PROFILING_MAX_FILES)
+    return profile
+
+
+def read_report(profile):
+    path = Path(settings.PROFILING_DIR) / profile.file_name
+    return path.read_text() if path.exists() else ''
+
+
+class QueryLog:
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({'sql': sql, 'duration': time.perf_counter() - start})
+
+
+class ProfilingMiddleware:
+    # cProfile hooks are process wide on newer Pythons, so only one request is
+    # profiled at a time; the others fall back to the stack sampler.
+    _profile_lock = threading.Lock()
+    _sampler = None
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    @classmethod
+    def get_sampler(cls):
+        if cls._sampler is None:
+            cls._sampler = StackSampler(settings.PROFILING_INTERVAL_MS / 1000)
+        return cls._sampler
+
+    def __call__(self, request):
+        if not settings.PROFILING_ENABLED or request.path not in settings.PROFILING_PATHS:
+            return self.get_response(request)
+
+        if random.random() < settings.PROFILING_SAMPLE_RATE and self._profile_lock.acquire(blocking=False):
+            try:
+                return self.profile(request)
+            finally:
+                self._profile_lock.release()
+        if settings.PROFILING_SLOW_MS is None:
+            return self.get_response(request)
+        return self.sample(request)
+
+    def profile(self, request):
+        query_log = QueryLog()
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        with connection.execute_wrapper(query_log):
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        duration_ms = (time.perf_counter() - start) * 1000
+        save_profile(request, RequestProfile.CPROFILE, duration_ms, query_log.queries, format_profile(profiler))
+        return response
+
+    def sample(self, request):
+        query_log = QueryLog()
+        sampler = self.get_sampler()
+        thread_id = threading.get_ident()
+        start = time.perf_counter()
+        sampler.start(thread_id)
+        try:
+            with connection.execute_wrapper(query_log):
+                response = self.get_response(request)
+        finally:
+            samples = sampler.stop(thread_id)
+        duration_ms = (time.perf_counter() - start) * 1000
+        if duration_ms >= settings.PROFILING_SLOW_MS:
+            save_profile(request, RequestProfile.STACKS, duration_ms, query_log.queries, format_stacks(samples))
+        return response
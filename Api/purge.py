@@ -0,0 +1,82 @@
+from django.db import transaction
+from django.db.models import Q
+
+from .followgraph import follow_graph_index
+from .models import User, FollowRequest, IdeaTombstone, FollowSuggestion
+from .sharding import shard_for_user
+from .suggestions import update_user_suggestions
+
+
+Follow = User.following.through
+
+
+# Each step removes at most batch_size rows per transaction, so no lock is held
+# for long even on accounts with very large histories.
+def delete_in_batches(queryset, batch_size):
+    deleted = 0
+    while True:
+        ids = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        with transaction.atomic():
+            queryset.model.objects.filter(pk__in=ids).delete()
+        deleted += len(ids)
+
+
+# The soft delete already wrote the tombstones of the ideas of a deleted user.
+def delete_ideas(user, batch_size):
+    deleted = 0
+    while True:
+        ideas = list(user.idea_user.values('pk', 'visibility')[:batch_size])
+        if not ideas:
+            return deleted
+        with transaction.atomic(), transaction.atomic(using=shard_for_user(user.pk)):
+            if user.deleted_at is None:
+                IdeaTombstone.objects.bulk_create(
+                    [IdeaTombstone(idea_id=idea['pk'], pub_user=user, visibility=idea['visibility']) for idea in ideas]
+                )
+            user.idea_user.filter(pk__in=[idea['pk'] for idea in ideas]).delete()
+        deleted += len(ideas)
+
+
+# The batched deletes send no m2m_changed, so the follow graph and the
+# suggestions of the former followers are updated here: every copy of the graph
+# is marked stale and each follower's list is recomputed without the user.
+def delete_follows(user, batch_size):
+    follows = Follow.objects.filter(Q(from_user=user) | Q(to_user=user))
+    followers = set()
+    while True:
+        rows = list(follows.values_list('pk', 'from_user_id')[:batch_size])
+        if not rows:
+            break
+        with transaction.atomic():
+            Follow.objects.filter(pk__in=[pk for pk, _ in rows]).delete()
+        followers.update(follower_id for _, follower_id in rows if follower_id != user.pk)
+    follow_graph_index.invalidate_on_commit()
+    delete_in_batches(FollowSuggestion.objects.filter(Q(user=user) | Q(suggested=user)), batch_size)
+    for follower_id in followers:
+        update_user_suggestions(follower_id)
+
+
+def detach_tombstones(user, batch_size):
+    while True:
+        ids = list(IdeaTombstone.objects.filter(pub_user=user).values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return
+        IdeaTombstone.objects.filter(pk__in=ids).update(pub_user=None)
+
+
+def purge_user(user, batch_size=1000):
+    delete_ideas(user, batch_size)
+    delete_in_batches(FollowRequest.objects.filter(Q(requester=user) | Q(to_follow=user)), batch_size)
+    delete_follows(user, batch_size)
+    detach_tombstones(user, batch_size)
+    user.delete()
+
+
+def purge_deleted_users(batch_size=1000):
+    purged = 0
+    for user in User.objects.filter(deleted_at__isnull=False).iterator():
+        purge_user(user, batch_size)
+        purged += 1
+    return purged
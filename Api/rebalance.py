@@ -0,0 +1,50 @@
+from collections import defaultdict
+
+from django.db import transaction
+
+from .entitycache import entity_cache
+from .models import Idea
+from .sharding import idea_shards, shard_for_user
+
+
+# Moves every idea that is not on its author's shard, in batches. The copy is
+# committed on the target before the source rows are deleted, and ideas already
+# present on the target are not copied again, so an interrupted run can simply
+# be started again. Rows are inserted raw to keep their ids and dates.
+
+def misplaced_ideas(source, after, batch_size):
+    return list(Idea.objects.using(source).filter(pk__gt=after).order_by('pk')[:batch_size])
+
+
+def move_ideas(source, target, ideas):
+    ids = [idea.pk for idea in ideas]
+    existing = set(Idea.objects.using(target).filter(pk__in=ids).values_list('pk', flat=True))
+    with transaction.atomic(using=target):
+        for idea in ideas:
+            if idea.pk not in existing:
+                idea.save_base(raw=True, force_insert=True, using=target)
+    with transaction.atomic(using=source):
+        Idea.objects.using(source).filter(pk__in=ids).delete()
+    # The deletes on the source marked the moved ideas as deleted.
+    entity_cache.invalidate(Idea, ids)
+
+
+def rebalance_ideas(sources=None, batch_size=1000, dry_run=False):
+    moved = defaultdict(int)
+    for source in sources or idea_shards():
+        last_pk = 0
+        while True:
+            ideas = misplaced_ideas(source, last_pk, batch_size)
+            if not ideas:
+                break
+            last_pk = ideas[-1].pk
+            targets = defaultdict(list)
+            for idea in ideas:
+                target = shard_for_user(idea.pub_user_id)
+                if target != source:
+                    targets[target].append(idea)
+            for target, batch in targets.items():
+                if not dry_run:
+                    move_ideas(source, target, batch)
+                moved[source, target] += len(batch)
+    return dict(moved)
@@ -0,0 +1,84 @@
+import gzip
+import json
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.module_loading import import_string
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Serializers
+
+def dumps_stdlib(data):
+    return json.dumps(data, separators=(',', ':'))
+
+
+def dumps_orjson(data):
+    return orjson.dumps(data).decode()
+
+
+def get_serializer():
+    path = settings.GRAPHENE.get('JSON_SERIALIZER')
+    if path:
+        return import_string(path)
+    return dumps_orjson if orjson is not None else dumps_stdlib
+
+
+# Compression
+
+def accepted_encodings(header):
+    # {coding: q} from an Accept-Encoding header; '*' stands for the others.
+    encodings = {}
+    for item in header.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        encodings[coding.lower()] = q
+    return encodings
+
+
+def accepts(encodings, coding):
+    return encodings.get(coding, encodings.get('*', 0)) > 0
+
+
+def compress_response(request, response):
+    min_size = settings.GRAPHENE.get('COMPRESS_MIN_SIZE')
+    if min_size is None or response.streaming or response.has_header('Content-Encoding'):
+        return response
+    if len(response.content) < min_size:
+        return response
+
+    encodings = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    if brotli is not None and accepts(encodings, 'br'):
+        response.content = brotli.compress(response.content, quality=4)
+        response['Content-Encoding'] = 'br'
+    elif accepts(encodings, 'gzip'):
+        response.content = gzip.compress(response.content, compresslevel=6)
+        response['Content-Encoding'] = 'gzip'
+    else:
+        return response
+    response['Content-Length'] = str(len(response.content))
+    patch_vary_headers(response, ('Accept-Encoding',))
+    # A strong ETag names one byte sequence; the compressed body shares only a
+    # weak one with the identity body.
+    etag = response.get('ETag')
+    if etag and not etag.startswith('W/'):
+        response['ETag'] = f'W/{etag}'
+    return response
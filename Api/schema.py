@@ -1,16 +1,32 @@
-import graphene
-import graphql_jwt
-from .types import UserQuery, UserMutation, IdeaQuery, IdeaMutation, FollowRequestQuery, FollowRequestMutation
+from functools import lru_cache
 
 
-class Query(UserQuery, IdeaQuery, FollowRequestQuery, graphene.ObjectType):
-    pass
+# The schema is built on first use: GRAPHENE['SCHEMA'] points at the module
+# attribute below, which is resolved by the first GraphQL request (or by
+# build_schema() in a worker's post_fork hook), so management commands never
+# import the types.
+@lru_cache(maxsize=None)
+def build_schema():
+    import graphene
+    import graphql_jwt
+    from graphql import specified_directives
+    from .incremental import defer_directive, stream_directive
+    from .types import UserQuery, UserMutation, IdeaQuery, IdeaMutation, FollowRequestQuery, FollowRequestMutation
 
+    class Query(UserQuery, IdeaQuery, FollowRequestQuery, graphene.ObjectType):
+        pass
 
-class Mutation(UserMutation, IdeaMutation, FollowRequestMutation, graphene.ObjectType):
-    token_auth = graphql_jwt.ObtainJSONWebToken.Field()
-    verify_token = graphql_jwt.Verify.Field()
-    refresh_token = graphql_jwt.Refresh.Field()
+    class Mutation(UserMutation, IdeaMutation, FollowRequestMutation, graphene.ObjectType):
+        token_auth = graphql_jwt.ObtainJSONWebToken.Field()
+        verify_token = graphql_jwt.Verify.Field()
+        refresh_token = graphql_jwt.Refresh.Field()
 
+    return graphene.Schema(
+        query=Query, mutation=Mutation, directives=[*specified_directives, defer_directive, stream_directive]
+    )
 
-schema = graphene.Schema(query=Query, mutation=Mutation)
\ No newline at end of file
+
+def __getattr__(name):
+    if name == 'schema':
+        return build_schema()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,117 @@
+import heapq
+import os
+import threading
+import time
+import zlib
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS
+
+
+# Ideas are sharded by author across the IDEA_SHARDS database aliases; every
+# other model stays on the default database. With a single shard (the default
+# configuration) the router sends everything to the default database and
+# nothing changes. Each shard carries the full schema, but only its Idea table
+# is used, so idea queries never join users on a shard.
+
+def idea_shards():
+    return settings.IDEA_SHARDS
+
+
+def sharding_enabled():
+    return len(settings.IDEA_SHARDS) > 1
+
+
+def shard_for_user(user_id):
+    shards = idea_shards()
+    return shards[zlib.crc32(str(user_id).encode()) % len(shards)]
+
+
+def is_idea(model):
+    return model._meta.label == 'Api.Idea'
+
+
+def is_user(model):
+    return model._meta.label == settings.AUTH_USER_MODEL
+
+
+class IdeaShardRouter:
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is None:
+            return None
+        if not is_idea(model):
+            # Related objects of an idea (its author, its score...) live on default.
+            return DEFAULT_DB_ALIAS if is_idea(instance) else None
+        if is_idea(instance) and instance.pub_user_id is not None:
+            return shard_for_user(instance.pub_user_id)
+        if is_user(instance):
+            return shard_for_user(instance.pk)
+        return None
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if {obj1._meta.label, obj2._meta.label} == {'Api.Idea', settings.AUTH_USER_MODEL}:
+            return True
+        return None
+
+
+# Ids. Shards cannot share a sequence, so with more than one shard new ideas
+# get time-ordered 63 bit ids: milliseconds since IDEA_ID_EPOCH_MS, a 10 bit
+# worker number and a 12 bit per-millisecond counter. The worker number comes
+# from IDEA_ID_WORKER and must differ between concurrently running processes;
+# nothing can derive it safely (replicas in containers share their PIDs), so
+# it is required once sharding is enabled.
+
+class IdeaIdGenerator:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._sequence = 0
+
+    def worker(self):
+        worker = settings.IDEA_ID_WORKER
+        if worker is None:
+            if sharding_enabled():
+                raise ImproperlyConfigured('IDEA_ID_WORKER must be set when ideas are sharded.')
+            return os.getpid() % 1024
+        if not 0 <= worker < 1024:
+            raise ImproperlyConfigured('IDEA_ID_WORKER must be between 0 and 1023.')
+        return worker
+
+    def next_id(self):
+        with self._lock:
+            now = int(time.time() * 1000) - settings.IDEA_ID_EPOCH_MS
+            if now <= self._last_ms:
+                self._sequence = (self._sequence + 1) % 4096
+                if self._sequence == 0:
+                    self._last_ms += 1
+                now = self._last_ms
+            else:
+                self._sequence = 0
+                self._last_ms = now
+            return (now << 22) | (self.worker() << 12) | self._sequence
+
+
+id_generator = IdeaIdGenerator()
+
+
+def next_idea_id():
+    return id_generator.next_id()
+
+
+# Scatter-gather. build(alias) returns the queryset to run on one shard, already
+# ordered by key (descending unless reverse is false); the shard results are
+# merged lazily.
+
+def scatter(build, key, reverse=True):
+    shards = idea_shards()
+    if len(shards) == 1:
+        return build(shards[0])
+    return list(heapq.merge(*(build(alias).iterator() for alias in shards), key=key, reverse=reverse))
+
+
+def by_pub_date(idea):
+    return idea.pub_date, idea.pk
@@ -0,0 +1,37 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .entitycache import entity_cache
+from .followgraph import follow_graph_index
+from .models import User, Idea
+from .suggestions import follows_added, follows_removed, update_user_suggestions
+
+
+@receiver(m2m_changed, sender=User.following.through)
+def follow_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove'):
+        if reverse:
+            pairs = [(pk, instance.pk) for pk in pk_set]
+        else:
+            pairs = [(instance.pk, pk) for pk in pk_set]
+        follow_graph_index.on_commit(pairs, action == 'post_add')
+        if action == 'post_add':
+            follows_added(pairs)
+        else:
+            follows_removed(pairs)
+    elif action == 'post_clear':
+        follow_graph_index.invalidate_on_commit()
+        if not reverse:
+            update_user_suggestions(instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Idea)
+def entity_saved(sender, instance, using, **kwargs):
+    entity_cache.saved(instance, using)
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Idea)
+def entity_deleted(sender, instance, using, **kwargs):
+    entity_cache.deleted(instance, using)
@@ -0,0 +1,135 @@
+import hashlib
+import random
+import re
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Avg, Count, Max
+
+from .models import SlowQuery
+
+
+# Slow SQL log. SlowQueryMiddleware observes every statement of a request, on
+# every database, and keeps those slower than SLOW_SQL_MS with the types of
+# their parameters (never the values: they include password hashes, emails and
+# tokens); a SLOW_SQL_EXPLAIN_RATE sample of the slow
+# SELECTs is run again under EXPLAIN (ANALYZE, BUFFERS) on PostgreSQL. The
+# GraphQL middleware records which operation and field is being resolved, so
+# each statement is attributed to the last field entered before it ran.
+
+current_operation = ContextVar('current_operation', default='')
+current_field = ContextVar('current_field', default='')
+
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+def fingerprint(sql):
+    return hashlib.sha256(IN_LIST.sub('IN (...)', sql).encode()).hexdigest()
+
+
+def param_types(params, many):
+    if many:
+        return f'{len(params)} rows'
+    if isinstance(params, dict):
+        return repr({name: type(value).__name__ for name, value in params.items()})
+    return repr([type(value).__name__ for value in params or ()])
+
+
+class SqlContextMiddleware:
+    def resolve(self, next, root, info, **kwargs):
+        if info.path.prev is None:
+            current_operation.set(info.operation.name.value if info.operation.name else '')
+        current_field.set(f'{info.parent_type.name}.{info.field_name}')
+        return next(root, info, **kwargs)
+
+
+class SlowQueryObserver:
+    def __init__(self, threshold_ms, explain_rate):
+        self.threshold_ms = threshold_ms
+        self.explain_rate = explain_rate
+        self.records = []
+        self._explaining = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if self._explaining:
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration_ms = (time.perf_counter() - start) * 1000
+        if duration_ms >= self.threshold_ms:
+            self.records.append(SlowQuery(
+                operation_name=current_operation.get()[:200],
+                field_path=current_field.get()[:200],
+                fingerprint=fingerprint(sql),
+                duration_ms=duration_ms,
+                sql=sql,
+                params=param_types(params, many),
+                explain=self.explain(context['connection'], sql, params, many),
+            ))
+        return result
+
+    # The plan is read with a separate cursor, inside a savepoint so a failing
+    # EXPLAIN does not abort the request's transaction.
+    def explain(self, connection, sql, params, many):
+        if (
+            many or connection.vendor != 'postgresql' or not sql.lstrip().upper().startswith('SELECT')
+            or random.random() >= self.explain_rate
+        ):
+            return ''
+        self._explaining = True
+        try:
+            with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS) {sql}', params)
+                return '\n'.join(row[0] for row in cursor.fetchall())
+        except DatabaseError as error:
+            return f'EXPLAIN failed: {error}'
+        finally:
+            self._explaining = False
+
+    def flush(self):
+        if self.records:
+            SlowQuery.objects.bulk_create(self.records)
+            self.records = []
+
+
+class SlowQueryMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if settings.SLOW_SQL_MS is None:
+            return self.get_response(request)
+        observer = SlowQueryObserver(settings.SLOW_SQL_MS, settings.SLOW_SQL_EXPLAIN_RATE)
+        operation_token = current_operation.set('')
+        field_token = current_field.set('')
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(observer))
+                response = self.get_response(request)
+        finally:
+            current_operation.reset(operation_token)
+            current_field.reset(field_token)
+        observer.flush()
+        return response
+
+
+def slow_query_report(since=None, limit=20):
+    queries = SlowQuery.objects.all()
+    if since is not None:
+        queries = queries.filter(created_at__gte=since)
+    groups = (
+        queries.values('fingerprint', 'operation_name', 'field_path')
+        .annotate(count=Count('id'), avg_ms=Avg('duration_ms'), max_ms=Max('duration_ms'), last_id=Max('id'))
+        .order_by('-count', '-max_ms')[:limit]
+    )
+    report = []
+    for group in groups:
+        sample = queries.filter(fingerprint=group['fingerprint']).exclude(explain='').order_by('-id').first()
+        if sample is None:
+            sample = SlowQuery.objects.get(pk=group['last_id'])
+        report.append({**group, 'sql': sample.sql, 'explain': sample.explain})
+    return report
@@ -0,0 +1,108 @@
+import heapq
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef
+
+from .models import User, FollowSuggestion
+
+
+Follow = User.following.through
+
+
+# Batch computation over the whole edge list
+
+def load_follow_graph():
+    following = defaultdict(set)
+    edges = Follow.objects.values_list('from_user_id', 'to_user_id').iterator(chunk_size=10000)
+    for follower, followed in edges:
+        following[follower].add(followed)
+    return following
+
+
+def rank_suggestions(user_id, following, limit):
+    followed = following.get(user_id, set())
+    mutuals = Counter()
+    for friend in followed:
+        mutuals.update(following.get(friend, ()))
+    for excluded in followed:
+        mutuals.pop(excluded, None)
+    mutuals.pop(user_id, None)
+    return heapq.nsmallest(limit, mutuals.items(), key=lambda item: (-item[1], item[0]))
+
+
+def compute_follow_suggestions(batch_size=1000):
+    following = load_follow_graph()
+    limit = settings.FOLLOW_SUGGESTIONS_LIMIT
+    user_ids = sorted(following)
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        suggestions = [
+            FollowSuggestion(user_id=user_id, suggested_id=suggested_id, mutual_count=mutual_count)
+            for user_id in batch
+            for suggested_id, mutual_count in rank_suggestions(user_id, following, limit)
+        ]
+        with transaction.atomic():
+            FollowSuggestion.objects.filter(user_id__in=batch).delete()
+            FollowSuggestion.objects.bulk_create(suggestions)
+    FollowSuggestion.objects.exclude(Exists(Follow.objects.filter(from_user=OuterRef('user')))).delete()
+    return len(user_ids)
+
+
+# Incremental updates
+
+def update_user_suggestions(user_id):
+    followed = Follow.objects.filter(from_user_id=user_id).values('to_user_id')
+    ranked = (
+        Follow.objects.filter(from_user_id__in=followed)
+        .exclude(to_user_id__in=followed)
+        .exclude(to_user_id=user_id)
+        .values('to_user_id')
+        .annotate(mutual_count=Count('*'))
+        .order_by('-mutual_count', 'to_user_id')[:settings.FOLLOW_SUGGESTIONS_LIMIT]
+    )
+    suggestions = [
+        FollowSuggestion(user_id=user_id, suggested_id=row['to_user_id'], mutual_count=row['mutual_count'])
+        for row in ranked
+    ]
+    with transaction.atomic():
+        FollowSuggestion.objects.filter(user_id=user_id).delete()
+        FollowSuggestion.objects.bulk_create(suggestions)
+
+
+# The follower's own list is recomputed (it is capped at the limit). Fans of
+# the follower get the followed user as a new candidate only while they have
+# fewer than FOLLOW_SUGGESTIONS_LIMIT suggestions, and for at most
+# FOLLOW_SUGGESTIONS_FANOUT of them per follow; the others are left to
+# compute_follow_suggestions.
+
+def follows_added(pairs):
+    limit = settings.FOLLOW_SUGGESTIONS_LIMIT
+    for follower_id, followed_id in pairs:
+        update_user_suggestions(follower_id)
+        fans = Follow.objects.filter(to_user_id=follower_id).exclude(from_user_id=followed_id).values('from_user_id')
+        FollowSuggestion.objects.filter(user_id__in=fans, suggested_id=followed_id).update(mutual_count=F('mutual_count') + 1)
+        full = (
+            FollowSuggestion.objects.filter(user_id__in=fans)
+            .values('user_id').annotate(count=Count('*')).filter(count__gte=limit).values('user_id')
+        )
+        new_fans = (
+            fans.exclude(from_user_id__in=Follow.objects.filter(to_user_id=followed_id).values('from_user_id'))
+            .exclude(from_user_id__in=FollowSuggestion.objects.filter(suggested_id=followed_id).values('user_id'))
+            .exclude(from_user_id__in=full)
+            .values_list('from_user_id', flat=True)[:settings.FOLLOW_SUGGESTIONS_FANOUT]
+        )
+        FollowSuggestion.objects.bulk_create(
+            [FollowSuggestion(user_id=fan_id, suggested_id=followed_id, mutual_count=1) for fan_id in new_fans],
+            ignore_conflicts=True
+        )
+
+
+def follows_removed(pairs):
+    for follower_id, followed_id in pairs:
+        update_user_suggestions(follower_id)
+        fans = Follow.objects.filter(to_user_id=follower_id).values('from_user_id')
+        suggestions = FollowSuggestion.objects.filter(user_id__in=fans, suggested_id=followed_id)
+        suggestions.filter(mutual_count__lte=1).delete()
+        suggestions.update(mutual_count=F('mutual_count') - 1)
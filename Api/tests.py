@@ -1,14 +1,67 @@
+import asyncio
+import gzip
+import hashlib
 import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory, gettempdir
+from unittest import skipUnless
 
-from django.test import TestCase
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, make_password
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.db import connection
+from django.db.models import Q
+from django.test import LiveServerTestCase, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
 from graphene_django.utils.testing import GraphQLTestCase
+from graphql import get_introspection_query, graphql_sync, print_schema
 from graphql_jwt.shortcuts import get_token
 
-from .models import User, Idea, FollowRequest
+from .models import User, Idea, FollowRequest, FollowSuggestion, IdeaTombstone, RequestProfile, SlowQuery, OutboxEvent
+from .coalescing import SingleFlight, request_key, shared_flight
+from .entitycache import DELETED, entity_cache
+from .hashing import PooledPBKDF2PasswordHasher, acheck_password, hashing_pool
+from .introspection import IntrospectionCache, introspection_cache
+from .followgraph import FollowGraph, follow_graph_index, get_follow_graph
+from .loadtest import parse_mix, percentile
+from .outbox import dispatch_events, dispatch_pending, emit, outbox_events, purge_dispatched
+from .partitioning import add_months, create_future_partitions, is_partitioned, partition_name
+from .permissions import VisibilityScope, get_visibility_scope
+from .purge import purge_deleted_users
+from .rebalance import rebalance_ideas
+from .renderers import accepted_encodings, compress_response
+from .sqllog import param_types
+from .sharding import IdeaShardRouter, next_idea_id, shard_for_user
+from .suggestions import compute_follow_suggestions
+from .throttling import CacheBackend, LocMemBackend, get_backend, take_token
+from .trending import refresh_trending
 
 # Create your tests here.
 
+# A cache every process can see, for the features that require one.
+SHARED_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': str(Path(gettempdir()) / 'projectPrueba-test-cache'),
+    },
+}
+
+
 class UserQueryTest(GraphQLTestCase):
 
     GRAPHQL_URL = 'http://localhost:8000/graphql/'
@@ -420,6 +473,38 @@ class FollowRequestQueryTest(GraphQLTestCase):
         self.assertResponseNoErrors(response)
         self.assertEqual(content, compare)
 
+    def test_resolve_follow_up_request_pagination(self):
+        user = User.objects.get(email="test1@test1.com")
+        requesters = [User.objects.create(email=f"req{i}@test.com", username=f"requester{i}") for i in range(3)]
+        for requester in requesters:
+            FollowRequest.objects.create(requester=requester, to_follow=user)
+        FollowRequest.objects.create(requester=requesters[0], to_follow=user, status=FollowRequest.DENIED)
+        token = get_token(user)
+        header = {"HTTP_AUTHORIZATION": f"JWT {token}"}
+        query = '''
+            query followUpRequest($first: Int, $after: String, $status: String){
+                followUpRequest(first: $first, after: $after, status: $status){
+                    requester{
+                        username
+                    }
+                    status
+                    cursor
+                }
+            }
+        '''
+        response = self.query(query, headers=header, variables={'first': 2})
+        self.assertResponseNoErrors(response)
+        first_page = json.loads(response.content)['data']['followUpRequest']
+        self.assertEqual([req['requester']['username'] for req in first_page], ["requester2", "requester1"])
+
+        response = self.query(query, headers=header, variables={'first': 2, 'after': first_page[-1]['cursor']})
+        second_page = json.loads(response.content)['data']['followUpRequest']
+        self.assertEqual([req['requester']['username'] for req in second_page], ["requester0", "usertest2"])
+
+        response = self.query(query, headers=header, variables={'status': 'denied'})
+        denied = json.loads(response.content)['data']['followUpRequest']
+        self.assertEqual([(req['requester']['username'], req['status']) for req in denied], [("requester0", "DENIED")])
+
 
 class FollowRequestMutationTest(GraphQLTestCase):
 
@@ -488,3 +573,1732 @@ class FollowRequestMutationTest(GraphQLTestCase):
         self.assertResponseNoErrors(response)
         self.assertEqual(content, compare)
 
+    def test_response_follow_request_from_deleted_user(self):
+        user = User.objects.get(email="test1@test1.com")
+        f_req = user.follow_recived.first()
+        f_req.requester.soft_delete()
+        response = self.query(
+            'mutation { responseFollowRequest(idRequest: %d, response: true) { success } }' % f_req.id,
+            headers={"HTTP_AUTHORIZATION": f"JWT {get_token(user)}"}
+        )
+        self.assertResponseHasErrors(response)
+        self.assertFalse(f_req.requester.following.exists())
+        self.assertEqual(FollowRequest.objects.get(pk=f_req.pk).status, FollowRequest.PENDING)
+
+
+
+class IdeaExportTest(TestCase):
+
+    def setUp(self):
+        user1 = User.objects.create(email="test1@test1.com", username="usertest1")
+        user2 = User.objects.create(email="test2@test2.com", username="usertest2")
+        Idea.objects.create(content="primera idea de usertest1", pub_user=user1, visibility=Idea.PUBLIC)
+        Idea.objects.create(content="segunda idea de usertest1", pub_user=user1, visibility=Idea.PRIVATE)
+        Idea.objects.create(content="primera idea de usertest2", pub_user=user2, visibility=Idea.PUBLIC)
+
+    def test_export_ideas_ndjson(self):
+        user = User.objects.get(email="test1@test1.com")
+        token = get_token(user)
+        response = self.client.get('/export/ideas/', HTTP_AUTHORIZATION=f"JWT {token}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        contents = [json.loads(line)['content'] for line in lines]
+        self.assertEqual(contents, ["segunda idea de usertest1", "primera idea de usertest1"])
+
+    def test_export_ideas_csv(self):
+        user = User.objects.get(email="test2@test2.com")
+        token = get_token(user)
+        response = self.client.get('/export/ideas/', {'format': 'csv'}, HTTP_AUTHORIZATION=f"JWT {token}")
+        self.assertEqual(response.status_code, 200)
+        rows = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(rows[0], 'id,content,visibility,pub_date')
+        self.assertEqual(len(rows), 2)
+        self.assertIn('primera idea de usertest2', rows[1])
+
+    def test_export_ideas_anonymous(self):
+        response = self.client.get('/export/ideas/')
+        self.assertEqual(response.status_code, 401)
+
+
+class SyncQueryTest(GraphQLTestCase):
+
+    GRAPHQL_URL = 'http://localhost:8000/graphql/'
+
+    IDEAS_SINCE = '''
+        query ideasSince($cursor: String){
+            ideasSince(cursor: $cursor){
+                ideas{
+                    content
+                }
+                removedIds
+                reset
+                cursor
+                hasMore
+            }
+        }
+    '''
+
+    def setUp(self):
+        user1 = User.objects.create(email="test1@test1.com", username="usertest1")
+        user2 = User.objects.create(email="test2@test2.com", username="usertest2")
+        Idea.objects.create(content="primera idea de usertest1", pub_user=user1, visibility=Idea.PUBLIC)
+        Idea.objects.create(content="segunda idea de usertest1", pub_user=user1, visibility=Idea.PRIVATE)
+        Idea.objects.create(content="primera idea de usertest2", pub_user=user2, visibility=Idea.PUBLIC)
+        FollowRequest.objects.create(requester=user2, to_follow=user1)
+
+    def sync_ideas(self, header, cursor=None):
+        response = self.query(self.IDEAS_SINCE, headers=header, variables={'cursor': cursor})
+        self.assertResponseNoErrors(response)
+        return json.loads(response.content)['data']['ideasSince']
+
+    def test_resolve_ideas_since(self):
+        user = User.objects.get(email="test2@test2.com")
+        header = {"HTTP_AUTHORIZATION": f"JWT {get_token(user)}"}
+        first_sync = self.sync_ideas(header)
+        self.assertEqual(
+            sorted(idea['content'] for idea in first_sync['ideas']),
+            ["primera idea de usertest1", "primera idea de usertest2"]
+        )
+        self.assertEqual(first_sync['removedIds'], [])
+        self.assertFalse(first_sync['hasMore'])
+
+        empty_sync = self.sync_ideas(header, first_sync['cursor'])
+        self.assertEqual(empty_sync['ideas'], [])
+        self.assertEqual(empty_sync['removedIds'], [])
+
+        deleted = Idea.objects.get(content="primera idea de usertest1")
+        owner_header = {"HTTP_AUTHORIZATION": f"JWT {get_token(deleted.pub_user)}"}
+        response = self.query(
+            '''
+            mutation deleteIdea($id: ID!){
+                deleteIdea(id: $id){
+                    success
+                }
+            }
+            ''',
+            headers=owner_header,
+            variables={'id': deleted.id}
+        )
+        self.assertResponseNoErrors(response)
+        Idea.objects.create(content="segunda idea de usertest2", pub_user=user, visibility=Idea.PROTECTED)
+
+        delta_sync = self.sync_ideas(header, empty_sync['cursor'])
+        self.assertEqual([idea['content'] for idea in delta_sync['ideas']], ["segunda idea de usertest2"])
+        self.assertEqual(delta_sync['removedIds'], [str(deleted.id)])
+
+    def test_follow_changes_restart_the_sync(self):
+        user1 = User.objects.get(email="test1@test1.com")
+        user2 = User.objects.get(email="test2@test2.com")
+        Idea.objects.create(content="idea protegida de usertest1", pub_user=user1, visibility=Idea.PROTECTED)
+        header = {"HTTP_AUTHORIZATION": f"JWT {get_token(user2)}"}
+        first_sync = self.sync_ideas(header)
+        self.assertFalse(first_sync['reset'])
+        self.assertNotIn("idea protegida de usertest1", [idea['content'] for idea in first_sync['ideas']])
+
+        user2.following.add(user1)
+        followed_sync = self.sync_ideas(header, first_sync['cursor'])
+        self.assertTrue(followed_sync['reset'])
+        self.assertIn("idea protegida de usertest1", [idea['content'] for idea in followed_sync['ideas']])
+        self.assertFalse(self.sync_ideas(header, followed_sync['cursor'])['reset'])
+
+        user2.following.remove(user1)
+        unfollowed_sync = self.sync_ideas(header, followed_sync['cursor'])
+        self.assertTrue(unfollowed_sync['reset'])
+        self.assertNotIn("idea protegida de usertest1", [idea['content'] for idea in unfollowed_sync['ideas']])
+
+    def test_late_commits_are_read_once(self):
+        user = User.objects.get(email="test2@test2.com")
+        header = {"HTTP_AUTHORIZATION": f"JWT {get_token(user)}"}
+        first_sync = self.sync_ideas(header)
+        position = Idea.objects.order_by('-updated_at').first().updated_at
+
+        # Dated before the cursor but committed after it was handed out.
+        late = Idea.objects.create(content="idea tardia", pub_user=user, visibility=Idea.PUBLIC)
+        Idea.objects.filter(pk=late.pk).update(updated_at=position - timedelta(seconds=1))
+        lost = Idea.objects.create(content="idea perdida", pub_user=user, visibility=Idea.PUBLIC)
+        Idea.objects.filter(pk=lost.pk).update(updated_at=position - timedelta(seconds=settings.SYNC_OVERLAP_SECONDS + 1))
+        late_sync = self.sync_ideas(header, first_sync['cursor'])
+        self.assertEqual([idea['content'] for idea in late_sync['ideas']], ["idea tardia"])
+        self.assertEqual(self.sync_ideas(header, late_sync['cursor'])['ideas'], [])
+
+        with self.settings(SYNC_PAGE_SIZE=1):
+            paged = self.sync_ideas(header)
+            contents = []
+            while paged['ideas']:
+                contents += [idea['content'] for idea in paged['ideas']]
+                paged = self.sync_ideas(header, paged['cursor'])
+        self.assertEqual(len(contents), len(set(contents)))
+
+    def test_soft_deleted_authors_are_removed(self):
+        user1 = User.objects.get(email="test1@test1.com")
+        user2 = User.objects.get(email="test2@test2.com")
+        header = {"HTTP_AUTHORIZATION": f"JWT {get_token(user2)}"}
+        first_sync = self.sync_ideas(header)
+        user1.soft_delete()
+        removed_sync = self.sync_ideas(header, first_sync['cursor'])
+        self.assertEqual(removed_sync['removedIds'], [str(Idea.objects.get(content="primera idea de usertest1").pk)])
+
+        admin = User.objects.create(email="admin@test.com", username="admin", is_staff=True, is_superuser=True)
+        self.client.force_login(admin)
+        self.client.post('/admin/Api/user/', {'action': 'restore_users', '_selected_action': [user1.pk]})
+        self.client.logout()
+        restored_sync = self.sync_ideas(header, removed_sync['cursor'])
+        self.assertEqual([idea['content'] for idea in restored_sync['ideas']], ["primera idea de usertest1"])
+
+    def test_resolve_ideas_since_negative_first(self):
+        user = User.objects.get(email="test2@test2.com")
+        header = {"HTTP_AUTHORIZATION": f"JWT {get_token(user)}"}
+        response = self.query('query { ideasSince(first: -1) { cursor } }', headers=header)
+        self.assertResponseHasErrors(response)
+        self.assertEqual(json.loads(response.content)['errors'][0]['message'], 'first must not be negative')
+
+    def test_resolve_follow_requests_since(self):
+        user = User.objects.get(email="test1@test1.com")
+        header = {"HTTP_AUTHORIZATION": f"JWT {get_token(user)}"}
+        query = '''
+            query followRequestsSince($cursor: String){
+                followRequestsSince(cursor: $cursor){
+                    followRequests{
+                        status
+                    }
+                    cursor
+                }
+            }
+        '''
+        response = self.query(query, headers=header, variables={'cursor': None})
+        first_sync = json.loads(response.content)['data']['followRequestsSince']
+        self.assertEqual(first_sync['followRequests'], [{"status": "PENDING"}])
+
+        follow_request = FollowRequest.objects.get()
+        follow_request.status = FollowRequest.DENIED
+        follow_request.save()
+        response = self.query(query, headers=header, variables={'cursor': first_sync['cursor']})
+        delta_sync = json.loads(response.content)['data']['followRequestsSince']
+        self.assertEqual(delta_sync['followRequests'], [{"status": "DENIED"}])
+
+    def test_resolve_ideas_since_invalid_cursor(self):
+        user = User.objects.get(email="test2@test2.com")
+        header = {"HTTP_AUTHORIZATION": f"JWT {get_token(user)}"}
+        response = self.query(self.IDEAS_SINCE, headers=header, variables={'cursor': 'not-a-cursor'})
+        self.assertResponseHasErrors(response)
+
+
+class RateLimitTest(GraphQLTestCase):
+
+    GRAPHQL_URL = 'http://localhost:8000/graphql/'
+
+    def setUp(self):
+        get_backend().reset()
+        User.objects.create(email="test1@test1.com", username="usertest1")
+        User.objects.create(email="test2@test2.com", username="usertest2")
+
+    def tearDown(self):
+        get_backend().reset()
+
+    def search_users(self, header):
+        return self.query(
+            '''
+            query searchUsers($username: String!){
+                searchUsers(username: $username){
+                    username
+                }
+            }
+            ''',
+            headers=header,
+            variables={'username': 'test'}
+        )
+
+    def test_rate_limit_search_users(self):
+        limits = {'searchUsers': {'rate': '2/m', 'key': 'user'}}
+        user1 = User.objects.get(email="test1@test1.com")
+        user2 = User.objects.get(email="test2@test2.com")
+        header1 = {"HTTP_AUTHORIZATION": f"JWT {get_token(user1)}"}
+        header2 = {"HTTP_AUTHORIZATION": f"JWT {get_token(user2)}"}
+        with self.settings(GRAPHENE={**settings.GRAPHENE, 'RATE_LIMITS': limits}):
+            self.assertResponseNoErrors(self.search_users(header1))
+            self.assertResponseNoErrors(self.search_users(header1))
+            response = self.search_users(header1)
+            self.assertResponseNoErrors(self.search_users(header2))
+        self.assertResponseHasErrors(response)
+        error = json.loads(response.content)['errors'][0]
+        self.assertEqual(error['extensions']['code'], 'THROTTLED')
+        self.assertGreater(error['extensions']['retryAfter'], 0)
+
+    def test_take_token(self):
+        tokens, retry_after = take_token(0, 0, 30, 2, 60)
+        self.assertEqual((tokens, retry_after), (0, 0))
+        tokens, retry_after = take_token(0, 0, 15, 2, 60)
+        self.assertEqual((tokens, retry_after), (0.5, 15))
+
+    def test_locmem_backend_evicts_idle_buckets(self):
+        backend = LocMemBackend()
+        backend.max_buckets = 3
+        self.assertEqual(backend.consume('attacker', 1, 60), 0)
+        for i in range(10):
+            backend.consume(f'other:{i}', 1, 60)
+            self.assertGreater(backend.consume('attacker', 1, 60), 0)
+
+    def test_cache_backend_reset_keeps_other_keys(self):
+        cache = caches['default']
+        cache.set('unrelated', 'kept')
+        with self.settings(GRAPHENE={**settings.GRAPHENE, 'RATE_LIMIT_CACHE': 'default'}):
+            backend = CacheBackend()
+            self.assertEqual(backend.consume('client', 1, 60), 0)
+            self.assertGreater(backend.consume('client', 1, 60), 0)
+            backend.reset()
+            self.assertEqual(backend.consume('client', 1, 60), 0)
+        self.assertEqual(cache.get('unrelated'), 'kept')
+
+
+class BatchRequestTest(TestCase):
+
+    def setUp(self):
+        user1 = User.objects.create(email="test1@test1.com", username="usertest1")
+        user2 = User.objects.create(email="test2@test2.com", username="usertest2")
+        Idea.objects.create(content="primera idea de usertest2", pub_user=user2, visibility=Idea.PUBLIC)
+        FollowRequest.objects.create(requester=user2, to_follow=user1)
+
+    def post_batch(self, operations, user):
+        return self.client.post(
+            '/graphql/',
+            json.dumps(operations),
+            content_type='application/json',
+            HTTP_AUTHORIZATION=f"JWT {get_token(user)}"
+        )
+
+    def test_batch_request(self):
+        user = User.objects.get(email="test1@test1.com")
+        response = self.post_batch([
+            {'query': 'query { me { username } }'},
+            {'query': 'query { listAllIdeas { content } }'},
+            {'query': 'query { followUpRequest { requester { username } } }'},
+        ], user)
+        self.assertEqual(response.status_code, 200)
+        content = json.loads(response.content)
+        self.assertEqual([result['data'] for result in content], [
+            {"me": {"username": "usertest1"}},
+            {"listAllIdeas": [{"content": "primera idea de usertest2"}]},
+            {"followUpRequest": [{"requester": {"username": "usertest2"}}]},
+        ])
+
+    def test_batch_request_too_large(self):
+        user = User.objects.get(email="test1@test1.com")
+        operations = [{'query': 'query { me { username } }'}] * (settings.GRAPHENE['MAX_BATCH_SIZE'] + 1)
+        response = self.post_batch(operations, user)
+        self.assertEqual(response.status_code, 400)
+
+
+class ResponseRenderingTest(TestCase):
+
+    def setUp(self):
+        user = User.objects.create(email="test1@test1.com", username="usertest1")
+        for i in range(50):
+            Idea.objects.create(content=f"idea {i} de usertest1", pub_user=user, visibility=Idea.PUBLIC)
+
+    def list_all_ideas(self, **extra):
+        user = User.objects.get(email="test1@test1.com")
+        return self.client.post(
+            '/graphql/',
+            json.dumps({'query': 'query { listAllIdeas { content pubDate } }'}),
+            content_type='application/json',
+            HTTP_AUTHORIZATION=f"JWT {get_token(user)}",
+            **extra
+        )
+
+    def test_response_compression(self):
+        with self.settings(GRAPHENE={**settings.GRAPHENE, 'COMPRESS_MIN_SIZE': 100}):
+            response = self.list_all_ideas(HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        content = json.loads(gzip.decompress(response.content))
+        self.assertEqual(len(content['data']['listAllIdeas']), 50)
+
+    def test_response_compression_honours_q_values(self):
+        self.assertEqual(accepted_encodings('gzip;q=0, br; q=0.5, *;q=0'), {'gzip': 0.0, 'br': 0.5, '*': 0.0})
+        with self.settings(GRAPHENE={**settings.GRAPHENE, 'COMPRESS_MIN_SIZE': 100}):
+            self.assertFalse(self.list_all_ideas(HTTP_ACCEPT_ENCODING='gzip;q=0, br;q=0').has_header('Content-Encoding'))
+            self.assertFalse(self.list_all_ideas(HTTP_ACCEPT_ENCODING='identity').has_header('Content-Encoding'))
+            response = self.list_all_ideas(HTTP_ACCEPT_ENCODING='br;q=0, *')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+        response = HttpResponse(b'x' * 200)
+        response['Vary'] = 'Cookie'
+        request = RequestFactory().get('/graphql/', HTTP_ACCEPT_ENCODING='gzip')
+        with self.settings(GRAPHENE={**settings.GRAPHENE, 'COMPRESS_MIN_SIZE': 100}):
+            compress_response(request, response)
+        self.assertEqual(response['Vary'], 'Cookie, Accept-Encoding')
+
+    def test_response_serializer(self):
+        with self.settings(GRAPHENE={**settings.GRAPHENE, 'JSON_SERIALIZER': 'Api.renderers.dumps_stdlib'}):
+            stdlib_response = self.list_all_ideas()
+        response = self.list_all_ideas()
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(json.loads(response.content), json.loads(stdlib_response.content))
+
+
+class TrendingIdeasTest(GraphQLTestCase):
+
+    GRAPHQL_URL = 'http://localhost:8000/graphql/'
+
+    def setUp(self):
+        user1 = User.objects.create(email="test1@test1.com", username="usertest1")
+        user2 = User.objects.create(email="test2@test2.com", username="usertest2")
+        user3 = User.objects.create(email="test3@test3.com", username="usertest3")
+        user1.following.add(user2)
+        user3.following.add(user2)
+        Idea.objects.create(content="primera idea de usertest1", pub_user=user1, visibility=Idea.PUBLIC)
+        Idea.objects.create(content="primera idea de usertest2", pub_user=user2, visibility=Idea.PUBLIC)
+        Idea.objects.create(content="segunda idea de usertest2", pub_user=user2, visibility=Idea.PRIVATE)
+
+    def test_refresh_trending(self):
+        self.assertEqual(refresh_trending(), (2, 0))
+        self.assertEqual(refresh_trending(), (0, 0))
+        user1 = User.objects.get(email="test1@test1.com")
+        user1.followers.add(User.objects.get(email="test2@test2.com"))
+        self.assertEqual(refresh_trending(), (1, 0))
+        Idea.objects.filter(pub_user=user1).update(visibility=Idea.PRIVATE)
+        self.assertEqual(refresh_trending(), (0, 1))
+
+    def test_resolve_trending_ideas(self):
+        refresh_trending()
+        user = User.objects.get(email="test3@test3.com")
+        token = get_token(user)
+        header = {"HTTP_AUTHORIZATION": f"JWT {token}"}
+        response = self.query(
+            '''
+            query {
+                trendingIdeas(first: 10){
+                    content
+                }
+            }
+            ''',
+            headers=header
+        )
+        compare = {"data": {"trendingIdeas": [{"content": "primera idea de usertest2"}, {"content": "primera idea de usertest1"}]}}
+        content = json.loads(response.content)
+        self.assertResponseNoErrors(response)
+        self.assertEqual(content, compare)
+
+
+class FollowSuggestionTest(GraphQLTestCase):
+
+    GRAPHQL_URL = 'http://localhost:8000/graphql/'
+
+    def setUp(self):
+        users = [User.objects.create(email=f"test{i}@test{i}.com", username=f"usertest{i}") for i in range(1, 6)]
+        user1, user2, user3, user4, user5 = users
+        user1.following.add(user2, user3)
+        user2.following.add(user4, user5)
+        user3.following.add(user4)
+
+    def suggestions(self, user):
+        return list(user.follow_suggestions.order_by('-mutual_count', 'suggested_id').values_list('suggested__username', 'mutual_count'))
+
+    def test_compute_follow_suggestions(self):
+        FollowSuggestion.objects.all().delete()
+        compute_follow_suggestions()
+        user1 = User.objects.get(username="usertest1")
+        self.assertEqual(self.suggestions(user1), [("usertest4", 2), ("usertest5", 1)])
+
+    def test_incremental_follow_suggestions(self):
+        user1 = User.objects.get(username="usertest1")
+        user3 = User.objects.get(username="usertest3")
+        user5 = User.objects.get(username="usertest5")
+        self.assertEqual(self.suggestions(user1), [("usertest4", 2), ("usertest5", 1)])
+        user3.following.add(user5)
+        self.assertEqual(self.suggestions(user1), [("usertest4", 2), ("usertest5", 2)])
+        user1.following.add(user5)
+        self.assertEqual(self.suggestions(user1), [("usertest4", 2)])
+        user3.following.remove(user5)
+        user1.following.remove(user5)
+        self.assertEqual(self.suggestions(user1), [("usertest4", 2), ("usertest5", 1)])
+
+    def test_unfollow_keeps_suggestions_with_other_mutuals(self):
+        user1 = User.objects.get(username="usertest1")
+        user3 = User.objects.get(username="usertest3")
+        user5 = User.objects.get(username="usertest5")
+        user3.following.add(user5)
+        self.assertEqual(self.suggestions(user1), [("usertest4", 2), ("usertest5", 2)])
+        user3.following.remove(user5)
+        self.assertEqual(self.suggestions(user1), [("usertest4", 2), ("usertest5", 1)])
+        user3.following.remove(User.objects.get(username="usertest4"))
+        self.assertEqual(self.suggestions(user1), [("usertest4", 1), ("usertest5", 1)])
+
+    def test_follow_fanout_is_capped(self):
+        user1, user2, user3, user4, user5 = User.objects.order_by('pk')
+        user6 = User.objects.create(email="test6@test6.com", username="usertest6")
+        user4.following.add(user1)
+        with self.settings(FOLLOW_SUGGESTIONS_LIMIT=2):
+            user2.following.add(user6)
+        self.assertEqual(self.suggestions(user1), [("usertest4", 2), ("usertest5", 1)])
+        with self.settings(FOLLOW_SUGGESTIONS_FANOUT=0):
+            user3.following.add(user6)
+        self.assertFalse(FollowSuggestion.objects.filter(user=user1, suggested=user6).exists())
+        compute_follow_suggestions()
+        self.assertEqual(self.suggestions(user1), [("usertest4", 2), ("usertest6", 2), ("usertest5", 1)])
+
+    def test_resolve_suggested_follows(self):
+        user = User.objects.get(username="usertest1")
+        token = get_token(user)
+        header = {"HTTP_AUTHORIZATION": f"JWT {token}"}
+        response = self.query(
+            '''
+            query {
+                suggestedFollows(first: 1){
+                    suggested{
+                        username
+                    }
+                    mutualCount
+                }
+            }
+            ''',
+            headers=header
+        )
+        compare = {"data": {"suggestedFollows": [{"suggested": {"username": "usertest4"}, "mutualCount": 2}]}}
+        content = json.loads(response.content)
+        self.assertResponseNoErrors(response)
+        self.assertEqual(content, compare)
+
+
+class RelationshipTest(GraphQLTestCase):
+
+    GRAPHQL_URL = 'http://localhost:8000/graphql/'
+
+    QUERY = '''
+        query {
+            searchUsers(username: "test"){
+                username
+                relationship{
+                    following
+                    followedBy
+                    requestSent
+                    requestReceived
+                }
+            }
+        }
+    '''
+
+    NESTED_QUERY = '''
+        query listAuthors($relationship: Boolean!){
+            listAllIdeas{
+                pubUser{
+                    username
+                    relationship @include(if: $relationship){
+                        following
+                        followedBy
+                        requestSent
+                        requestReceived
+                    }
+                }
+            }
+        }
+    '''
+
+    def setUp(self):
+        user1 = User.objects.create(email="test1@test1.com", username="usertest1")
+        user2 = User.objects.create(email="test2@test2.com", username="usertest2")
+        user3 = User.objects.create(email="test3@test3.com", username="usertest3")
+        user4 = User.objects.create(email="test4@test4.com", username="usertest4")
+        user1.following.add(user2)
+        user2.following.add(user1)
+        user3.following.add(user1)
+        FollowRequest.objects.create(requester=user1, to_follow=user4)
+
+    def search_users(self):
+        user = User.objects.get(email="test1@test1.com")
+        token = get_token(user)
+        header = {"HTTP_AUTHORIZATION": f"JWT {token}"}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.query(self.QUERY, headers=header)
+        self.assertResponseNoErrors(response)
+        return json.loads(response.content)['data']['searchUsers'], len(queries)
+
+    def test_resolve_relationship(self):
+        users, _ = self.search_users()
+        relationships = {user['username']: user['relationship'] for user in users}
+        self.assertEqual(relationships, {
+            "usertest2": {"following": True, "followedBy": True, "requestSent": False, "requestReceived": False},
+            "usertest3": {"following": False, "followedBy": True, "requestSent": False, "requestReceived": False},
+            "usertest4": {"following": False, "followedBy": False, "requestSent": True, "requestReceived": False},
+        })
+
+    def list_authors(self, relationship):
+        header = {"HTTP_AUTHORIZATION": f"JWT {get_token(User.objects.get(email='test1@test1.com'))}"}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.query(self.NESTED_QUERY, headers=header, variables={'relationship': relationship})
+        self.assertResponseNoErrors(response)
+        return json.loads(response.content)['data']['listAllIdeas'], len(queries)
+
+    # The authors themselves are read per idea without the entity cache, so
+    # this counts the queries the relationships add.
+    def relationship_queries(self):
+        ideas, num_queries = self.list_authors(True)
+        _, without_relationship = self.list_authors(False)
+        return ideas, num_queries - without_relationship
+
+    def test_resolve_relationship_constant_queries(self):
+        for user in User.objects.all():
+            Idea.objects.create(content=f"idea de {user.username}", pub_user=user, visibility=Idea.PUBLIC)
+        _, num_queries = self.search_users()
+        ideas, nested_queries = self.relationship_queries()
+        relationships = {idea['pubUser']['username']: idea['pubUser']['relationship'] for idea in ideas}
+        self.assertIsNone(relationships["usertest1"])
+        self.assertEqual(relationships["usertest2"], {"following": True, "followedBy": True, "requestSent": False, "requestReceived": False})
+        self.assertEqual(relationships["usertest4"], {"following": False, "followedBy": False, "requestSent": True, "requestReceived": False})
+
+        for i in range(5, 10):
+            user = User.objects.create(email=f"test{i}@test{i}.com", username=f"usertest{i}")
+            Idea.objects.create(content=f"idea de {user.username}", pub_user=user, visibility=Idea.PUBLIC)
+        users, more_users_queries = self.search_users()
+        self.assertEqual(len(users), 8)
+        self.assertEqual(num_queries, more_users_queries)
+        ideas, more_nested_queries = self.relationship_queries()
+        self.assertEqual(len(ideas), 9)
+        self.assertEqual(nested_queries, more_nested_queries)
+
+
+class SoftDeleteTest(GraphQLTestCase):
+
+    GRAPHQL_URL = 'http://localhost:8000/graphql/'
+
+    def setUp(self):
+        user1 = User.objects.create(email="test1@test1.com", username="usertest1")
+        user2 = User.objects.create(email="test2@test2.com", username="usertest2")
+        user1.following.add(user2)
+        user2.following.add(user1)
+        FollowRequest.objects.create(requester=user2, to_follow=user1)
+        Idea.objects.create(content="primera idea de usertest1", pub_user=user1, visibility=Idea.PUBLIC)
+        Idea.objects.create(content="primera idea de usertest2", pub_user=user2, visibility=Idea.PUBLIC)
+        Idea.objects.create(content="segunda idea de usertest2", pub_user=user2, visibility=Idea.PROTECTED)
+
+    def test_delete_account(self):
+        user2 = User.objects.get(email="test2@test2.com")
+        response = self.query(
+            '''
+            mutation {
+                deleteAccount{
+                    success
+                }
+            }
+            ''',
+            headers={"HTTP_AUTHORIZATION": f"JWT {get_token(user2)}"}
+        )
+        self.assertResponseNoErrors(response)
+        user2.refresh_from_db()
+        self.assertIsNotNone(user2.deleted_at)
+        self.assertFalse(user2.is_active)
+
+        user1 = User.objects.get(email="test1@test1.com")
+        response = self.query(
+            '''
+            query {
+                users{
+                    username
+                }
+                me{
+                    followers{
+                        username
+                    }
+                }
+                listAllIdeas{
+                    content
+                }
+                followUpRequest{
+                    status
+                }
+            }
+            ''',
+            headers={"HTTP_AUTHORIZATION": f"JWT {get_token(user1)}"}
+        )
+        compare = {"data": {
+            "users": [{"username": "usertest1"}],
+            "me": {"followers": []},
+            "listAllIdeas": [{"content": "primera idea de usertest1"}],
+            "followUpRequest": []
+        }}
+        self.assertResponseNoErrors(response)
+        self.assertEqual(json.loads(response.content), compare)
+
+    def test_purge_deleted_users(self):
+        user1 = User.objects.get(email="test1@test1.com")
+        user2 = User.objects.get(email="test2@test2.com")
+        user3 = User.objects.create(email="test3@test3.com", username="usertest3")
+        user3.following.add(user1)
+        compute_follow_suggestions()
+        self.assertTrue(FollowSuggestion.objects.filter(user=user3, suggested=user2).exists())
+        user2.soft_delete()
+        with self.settings(CACHES=SHARED_CACHES, FOLLOW_GRAPH_CACHE='shared', FOLLOW_GRAPH_INDEX=True):
+            version = follow_graph_index.shared_version()
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(purge_deleted_users(batch_size=1), 1)
+            self.assertEqual(follow_graph_index.shared_version(), version + 1)
+        self.assertFalse(FollowSuggestion.objects.filter(Q(user=user2) | Q(suggested=user2)).exists())
+        self.assertFalse(User.objects.filter(pk=user2.pk).exists())
+        self.assertEqual(Idea.objects.count(), 1)
+        self.assertEqual(FollowRequest.objects.count(), 0)
+        self.assertEqual(list(User.following.through.objects.values_list("from_user_id", "to_user_id")), [(user3.pk, user1.pk)])
+        self.assertEqual(IdeaTombstone.objects.filter(pub_user__isnull=True).count(), 2)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Partitioning requires PostgreSQL')
+class IdeaPartitioningTest(GraphQLTestCase):
+
+    GRAPHQL_URL = 'http://localhost:8000/graphql/'
+
+    def setUp(self):
+        user = User.objects.create(email="test1@test1.com", username="usertest1")
+        old = Idea.objects.create(content="idea antigua de usertest1", pub_user=user, visibility=Idea.PUBLIC)
+        Idea.objects.filter(pk=old.pk).update(pub_date=timezone.now() - timedelta(days=400))
+        Idea.objects.create(content="idea reciente de usertest1", pub_user=user, visibility=Idea.PUBLIC)
+
+    def list_all_ideas(self):
+        user = User.objects.get(email="test1@test1.com")
+        response = self.query(
+            '''
+            query {
+                listAllIdeas{
+                    content
+                }
+            }
+            ''',
+            headers={"HTTP_AUTHORIZATION": f"JWT {get_token(user)}"}
+        )
+        self.assertResponseNoErrors(response)
+        return [idea['content'] for idea in json.loads(response.content)['data']['listAllIdeas']]
+
+    def test_partition_ideas(self):
+        call_command('partition_ideas', 'convert', stdout=StringIO())
+        with connection.cursor() as cursor:
+            self.assertTrue(is_partitioned(cursor, Idea._meta.db_table))
+        self.assertEqual(create_future_partitions(months_ahead=4), [partition_name(Idea._meta.db_table, add_months(timezone.now().date(), 4))])
+        Idea.objects.create(content="idea nueva de usertest1", pub_user=User.objects.get(), visibility=Idea.PUBLIC)
+        self.assertEqual(
+            self.list_all_ideas(),
+            ["idea nueva de usertest1", "idea reciente de usertest1", "idea antigua de usertest1"]
+        )
+
+        archived = Idea.objects.get(content="idea antigua de usertest1")
+        with TemporaryDirectory() as archive_dir:
+            call_command('partition_ideas', 'archive', '--keep-months', '6', '--archive-dir', archive_dir, stdout=StringIO())
+            archives = list(Path(archive_dir).iterdir())
+            self.assertEqual(len(archives), 1)
+            with gzip.open(archives[0], 'rt') as archive:
+                self.assertIn("idea antigua de usertest1", archive.read())
+        self.assertEqual(self.list_all_ideas(), ["idea nueva de usertest1", "idea reciente de usertest1"])
+        self.assertEqual(IdeaTombstone.objects.get().idea_id, archived.pk)
+
+
+class VisibilityPermissionTest(GraphQLTestCase):
+
+    GRAPHQL_URL = 'http://localhost:8000/graphql/'
+
+    def setUp(self):
+        user1 = User.objects.create(email="test1@test1.com", username="usertest1")
+        user2 = User.objects.create(email="test2@test2.com", username="usertest2")
+        user3 = User.objects.create(email="test3@test3.com", username="usertest3")
+        user1.following.add(user2)
+        for user in (user2, user3):
+            Idea.objects.create(content=f"idea publica de {user.username}", pub_user=user, visibility=Idea.PUBLIC)
+            Idea.objects.create(content=f"idea protegida de {user.username}", pub_user=user, visibility=Idea.PROTECTED)
+            Idea.objects.create(content=f"idea privada de {user.username}", pub_user=user, visibility=Idea.PRIVATE)
+
+    def test_visible_to(self):
+        user1 = User.objects.get(email="test1@test1.com")
+        contents = set(Idea.objects.visible_to(user1).values_list('content', flat=True))
+        self.assertEqual(contents, {
+            "idea publica de usertest2", "idea protegida de usertest2", "idea publica de usertest3"
+        })
+        self.assertEqual(Idea.objects.visible_to(AnonymousUser()).count(), 2)
+
+    def test_nested_ideas_visibility_and_single_follow_lookup(self):
+        user1 = User.objects.get(email="test1@test1.com")
+        user2 = User.objects.get(email="test2@test2.com")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.query(
+                '''
+                query listFollowedIdeas($idUser: ID!){
+                    listAllIdeas{
+                        content
+                    }
+                    listFollowedIdeas(idUser: $idUser){
+                        content
+                    }
+                    users{
+                        username
+                        ideaUser{
+                            content
+                        }
+                    }
+                }
+                ''',
+                headers={"HTTP_AUTHORIZATION": f"JWT {get_token(user1)}"},
+                variables={'idUser': user2.id}
+            )
+        self.assertResponseNoErrors(response)
+        data = json.loads(response.content)['data']
+        self.assertEqual(len(data['listAllIdeas']), 3)
+        self.assertEqual(len(data['listFollowedIdeas']), 2)
+        user_ideas = {user['username']: sorted(idea['content'] for idea in user['ideaUser']) for user in data['users']}
+        self.assertEqual(user_ideas["usertest3"], ["idea publica de usertest3"])
+        self.assertEqual(user_ideas["usertest2"], ["idea protegida de usertest2", "idea publica de usertest2"])
+        following_table = connection.ops.quote_name(User.following.through._meta.db_table)
+        self.assertEqual(len([query for query in queries if following_table in query['sql']]), 1)
+
+    def test_login_required(self):
+        response = self.query(
+            '''
+            query {
+                listAllIdeas{
+                    content
+                }
+            }
+            '''
+        )
+        self.assertResponseHasErrors(response)
+        self.assertEqual(json.loads(response.content)['errors'][0]['message'], 'You must be logged in')
+
+
+class ProfilingTest(GraphQLTestCase):
+
+    GRAPHQL_URL = 'http://localhost:8000/graphql/'
+
+    def setUp(self):
+        user = User.objects.create(email="test1@test1.com", username="usertest1")
+        Idea.objects.create(content="idea de prueba", pub_user=user, visibility=Idea.PUBLIC)
+        self.token = get_token(user)
+        self.directory = TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def list_ideas(self):
+        return self.query(
+            '''
+            query listMyIdeas($withContent: Boolean!){
+                listMyIdeas{
+                    content @include(if: $withContent)
+                }
+            }
+            ''',
+            headers={"HTTP_AUTHORIZATION": f"JWT {self.token}"},
+            variables={'withContent': True},
+            operation_name='listMyIdeas'
+        )
+
+    def test_sampled_request_is_profiled(self):
+        with self.settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=1, PROFILING_DIR=self.directory.name):
+            self.assertResponseNoErrors(self.list_ideas())
+        profile = RequestProfile.objects.get()
+        self.assertEqual(profile.kind, RequestProfile.CPROFILE)
+        self.assertEqual(profile.operation_name, 'listMyIdeas')
+        self.assertEqual(len(profile.variables_hash), 64)
+        self.assertNotEqual(profile.variables_hash, hashlib.sha256(b'{"withContent": true}').hexdigest())
+        self.assertGreater(profile.query_count, 0)
+        report = (Path(self.directory.name) / profile.file_name).read_text()
+        self.assertIn('cumulative', report)
+        self.assertIn('== SQL ==', report)
+
+    def test_slow_requests_keep_stack_samples_and_rotate(self):
+        with self.settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=0, PROFILING_SLOW_MS=1000,
+                           PROFILING_DIR=self.directory.name):
+            self.list_ideas()
+            self.assertFalse(RequestProfile.objects.exists())
+            with self.settings(PROFILING_SLOW_MS=0, PROFILING_MAX_FILES=2):
+                for _ in range(3):
+                    self.assertResponseNoErrors(self.list_ideas())
+        self.assertEqual(RequestProfile.objects.filter(kind=RequestProfile.STACKS).count(), 2)
+        self.assertEqual(len(list(Path(self.directory.name).iterdir())), 2)
+
+    def test_disabled(self):
+        with self.settings(PROFILING_ENABLED=False, PROFILING_SAMPLE_RATE=1, PROFILING_DIR=self.directory.name):
+            self.list_ideas()
+        self.assertFalse(RequestProfile.objects.exists())
+
+
+class SlowQueryLogTest(GraphQLTestCase):
+
+    GRAPHQL_URL = 'http://localhost:8000/graphql/'
+
+    def setUp(self):
+        user = User.objects.create(email="test1@test1.com", username="usertest1")
+        Idea.objects.create(content="idea de prueba", pub_user=user, visibility=Idea.PUBLIC)
+        self.token = get_token(user)
+
+    def list_all_ideas(self):
+        return self.query(
+            '''
+            query listAllIdeas{
+                listAllIdeas{
+                    content
+                }
+            }
+            ''',
+            headers={"HTTP_AUTHORIZATION": f"JWT {self.token}"},
+            operation_name='listAllIdeas'
+        )
+
+    def test_slow_statements_are_attributed_to_fields(self):
+        with self.settings(SLOW_SQL_MS=0, SLOW_SQL_EXPLAIN_RATE=1):
+            self.assertResponseNoErrors(self.list_all_ideas())
+        query = SlowQuery.objects.get(
+            field_path='Query.listAllIdeas', sql__contains=f'FROM {connection.ops.quote_name(Idea._meta.db_table)}'
+        )
+        self.assertEqual(query.operation_name, 'listAllIdeas')
+        self.assertNotIn('usertest1', ''.join(SlowQuery.objects.values_list('params', flat=True)))
+        if connection.vendor == 'postgresql':
+            self.assertIn('actual time', query.explain)
+
+        out = StringIO()
+        call_command('slow_queries', '--explain', stdout=out)
+        self.assertIn('listAllIdeas Query.listAllIdeas', out.getvalue())
+
+    def test_parameter_values_are_not_stored(self):
+        self.assertEqual(param_types(['usertest1', 3, None], False), "['str', 'int', 'NoneType']")
+        self.assertEqual(param_types({'email': 'test1@test1.com'}, False), "{'email': 'str'}")
+        self.assertEqual(param_types([['a'], ['b']], True), '2 rows')
+        self.assertEqual(param_types(None, False), '[]')
+
+    def test_fast_statements_are_ignored(self):
+        with self.settings(SLOW_SQL_MS=10000):
+            self.assertResponseNoErrors(self.list_all_ideas())
+        self.assertFalse(SlowQuery.objects.exists())
+
+
+class StartupImportTest(TestCase):
+
+    LAZY_MODULES = ('Api.schema', 'Api.types', 'graphql_jwt')
+
+    # Runs code in a fresh interpreter under `python -X importtime` and returns
+    # the modules it left in sys.modules and the cumulative import time in ms
+    # of every module in the import log. Modules loaded with import_module (the
+    # installed apps) are not in the log, hence sys.modules for the assertions.
+    def import_times(self, code):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'{code}\nimport json, sys\nprint(json.dumps(list(sys.modules)))'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'projectPrueba.settings'}
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        times = {}
+        for line in result.stderr.splitlines():
+            if line.startswith('import time:') and '|' in line and 'cumulative' not in line:
+                _, cumulative, name = line[len('import time:'):].split('|')
+                times[name[1:].rstrip()] = int(cumulative) / 1000
+        return set(json.loads(result.stdout.splitlines()[-1])), times
+
+    def assert_lazy_modules_not_imported(self, code):
+        loaded, times = self.import_times(code)
+        top_level = {name: cumulative for name, cumulative in times.items() if not name.startswith(' ')}
+        total = sum(top_level.values())
+        heaviest = sorted(top_level, key=top_level.get, reverse=True)[:5]
+        self.assertIn('Api.models', loaded)
+        for module in self.LAZY_MODULES:
+            self.assertFalse(
+                module in loaded,
+                f'{module} imported at startup; {total:.0f} ms of imports, the heaviest: {", ".join(heaviest)}'
+            )
+
+    def test_setup_does_not_build_the_schema(self):
+        self.assert_lazy_modules_not_imported('import django\ndjango.setup()')
+
+    def test_management_commands_do_not_build_the_schema(self):
+        self.assert_lazy_modules_not_imported(
+            'from django.core.management import execute_from_command_line\n'
+            'execute_from_command_line(["manage.py", "check"])'
+        )
+
+    def test_schema_is_built_once_on_first_use(self):
+        from . import schema as schema_module
+        self.assertIs(schema_module.schema, schema_module.build_schema())
+        self.assertIsNotNone(schema_module.schema.graphql_schema.query_type.fields.get('listAllIdeas'))
+
+
+@override_settings(CACHES=SHARED_CACHES, FOLLOW_GRAPH_CACHE='shared')
+class FollowGraphTest(TestCase):
+
+    def setUp(self):
+        self.users = [User.objects.create(email=f"test{i}@test{i}.com", username=f"usertest{i}") for i in range(1, 5)]
+        user1, user2, user3, user4 = self.users
+        user1.following.add(user2, user3)
+        user2.following.add(user3)
+        follow_graph_index.graph = None
+        self.addCleanup(setattr, follow_graph_index, 'graph', None)
+
+    def test_graph_membership_and_overlay(self):
+        user1, user2, user3, user4 = self.users
+        graph = FollowGraph.load()
+        self.assertTrue(graph.follows(user1.pk, user3.pk))
+        self.assertFalse(graph.follows(user3.pk, user1.pk))
+        self.assertFalse(graph.follows(user4.pk + 100, user1.pk))
+        self.assertEqual(graph.following(user1.pk), [user2.pk, user3.pk])
+
+        graph.add(user4.pk, user1.pk)
+        graph.remove(user1.pk, user2.pk)
+        self.assertTrue(graph.follows(user4.pk, user1.pk))
+        self.assertEqual(graph.following(user1.pk), [user3.pk])
+
+        compacted = graph.compact()
+        self.assertFalse(compacted.added or compacted.removed)
+        self.assertEqual(compacted.following(user4.pk), [user1.pk])
+        self.assertEqual(compacted.following(user1.pk), [user3.pk])
+        self.assertEqual(compacted.following(user2.pk), [user3.pk])
+
+    def test_index_applies_local_changes_and_detects_foreign_ones(self):
+        user1, user2, user3, user4 = self.users
+        with self.settings(FOLLOW_GRAPH_INDEX=True):
+            follow_graph_index.reload()
+            self.assertIsNotNone(get_follow_graph())
+
+            with self.captureOnCommitCallbacks(execute=True):
+                user4.following.add(user1)
+            graph = get_follow_graph()
+            self.assertIsNotNone(graph)
+            self.assertTrue(graph.follows(user4.pk, user1.pk))
+
+            follow_graph_index.bump_version()
+            follow_graph_index._loading = True
+            self.addCleanup(setattr, follow_graph_index, '_loading', False)
+            self.assertIsNone(get_follow_graph())
+
+    def test_visibility_scope_reads_the_index(self):
+        user1, user2, user3, user4 = self.users
+        with self.settings(FOLLOW_GRAPH_INDEX=True):
+            follow_graph_index.reload()
+            request = RequestFactory().get('/graphql/')
+            request.user = user1
+            with CaptureQueriesContext(connection) as queries:
+                following = get_visibility_scope(request).following
+        self.assertEqual(following, [user2.pk, user3.pk])
+        self.assertEqual(len(queries), 0)
+
+    def test_compaction_runs_in_background(self):
+        user1, user2, user3, user4 = self.users
+        with self.settings(FOLLOW_GRAPH_INDEX=True, FOLLOW_GRAPH_COMPACT_AT=1):
+            graph = follow_graph_index.reload()
+            with self.captureOnCommitCallbacks(execute=True):
+                user4.following.add(user1)
+            deadline = time.monotonic() + 5
+            while follow_graph_index.graph is graph and time.monotonic() < deadline:
+                time.sleep(0.01)
+            compacted = follow_graph_index.graph
+            self.assertIsNot(compacted, graph)
+            self.assertFalse(compacted.added)
+            self.assertEqual(compacted.following(user4.pk), [user1.pk])
+
+    def test_index_requires_a_shared_cache(self):
+        with self.settings(FOLLOW_GRAPH_INDEX=True, FOLLOW_GRAPH_CACHE='default'):
+            with self.assertRaises(ImproperlyConfigured):
+                get_follow_graph()
+
+
+class ShardingTest(TestCase):
+
+    def test_router_keeps_users_on_default(self):
+        user = User.objects.create(email="test1@test1.com", username="usertest1")
+        idea = Idea.objects.create(content="idea de prueba", pub_user=user)
+        router = IdeaShardRouter()
+        self.assertEqual(router.db_for_read(User, instance=idea), 'default')
+        self.assertEqual(router.db_for_write(Idea, instance=idea), 'default')
+        with self.settings(IDEA_SHARDS=['default', 'ideas_1', 'ideas_2']):
+            shards = {shard_for_user(user_id) for user_id in range(1, 100)}
+            self.assertEqual(shards, {'default', 'ideas_1', 'ideas_2'})
+            self.assertEqual(router.db_for_read(Idea, instance=user), shard_for_user(user.pk))
+            self.assertEqual(router.db_for_read(User, instance=idea), 'default')
+
+    def test_idea_ids_are_unique_and_time_ordered(self):
+        ids = [next_idea_id() for _ in range(10000)]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertLess(ids[-1], 2 ** 63)
+
+    def test_sharded_idea_ids_require_a_worker(self):
+        with self.settings(IDEA_SHARDS=['default', 'ideas_1'], IDEA_ID_WORKER=None):
+            with self.assertRaises(ImproperlyConfigured):
+                next_idea_id()
+        with self.settings(IDEA_SHARDS=['default', 'ideas_1'], IDEA_ID_WORKER=1024):
+            with self.assertRaises(ImproperlyConfigured):
+                next_idea_id()
+        with self.settings(IDEA_SHARDS=['default', 'ideas_1'], IDEA_ID_WORKER=7):
+            self.assertEqual(next_idea_id() >> 12 & 1023, 7)
+
+
+@skipUnless('ideas_1' in settings.DATABASES, 'needs the ideas_1 database (IDEA_SHARD_DATABASES=ideas_1)')
+class ShardedIdeasTest(GraphQLTestCase):
+
+    GRAPHQL_URL = 'http://localhost:8000/graphql/'
+    databases = '__all__'
+    SHARDS = ['default', 'ideas_1']
+
+    def setUp(self):
+        with self.settings(IDEA_SHARDS=self.SHARDS, IDEA_ID_WORKER=1):
+            self.users = {}
+            index = 0
+            while len(self.users) < 2:
+                index += 1
+                user = User.objects.create(email=f"test{index}@test{index}.com", username=f"usertest{index}")
+                if shard_for_user(user.pk) in self.users:
+                    user.delete()
+                else:
+                    self.users[shard_for_user(user.pk)] = user
+        self.viewer = self.users['default']
+        self.viewer.following.add(self.users['ideas_1'])
+
+    def add_idea(self, user, content, visibility='public'):
+        response = self.query(
+            '''
+            mutation addIdea($content: String!, $visibility: String){
+                addIdea(content: $content, visibility: $visibility){
+                    idea{
+                        id
+                    }
+                }
+            }
+            ''',
+            headers={"HTTP_AUTHORIZATION": f"JWT {get_token(user)}"},
+            variables={'content': content, 'visibility': visibility}
+        )
+        self.assertResponseNoErrors(response)
+        return json.loads(response.content)['data']['addIdea']['idea']['id']
+
+    def test_ideas_are_written_to_the_author_shard_and_merged(self):
+        with self.settings(IDEA_SHARDS=self.SHARDS, IDEA_ID_WORKER=1):
+            self.add_idea(self.viewer, "idea 1")
+            self.add_idea(self.users['ideas_1'], "idea 2", 'protected')
+            self.add_idea(self.viewer, "idea 3", 'private')
+            self.add_idea(self.users['ideas_1'], "idea 4", 'private')
+            self.assertEqual(Idea.objects.using('default').count(), 2)
+            self.assertEqual(Idea.objects.using('ideas_1').count(), 2)
+
+            response = self.query(
+                '''
+                query {
+                    listAllIdeas{
+                        content
+                        pubUser{
+                            username
+                        }
+                    }
+                    users{
+                        username
+                        ideaUser{
+                            content
+                        }
+                    }
+                }
+                ''',
+                headers={"HTTP_AUTHORIZATION": f"JWT {get_token(self.viewer)}"}
+            )
+        self.assertResponseNoErrors(response)
+        data = json.loads(response.content)['data']
+        self.assertEqual([idea['content'] for idea in data['listAllIdeas']], ["idea 3", "idea 2", "idea 1"])
+        self.assertEqual(data['listAllIdeas'][1]['pubUser']['username'], self.users['ideas_1'].username)
+        user_ideas = {user['username']: [idea['content'] for idea in user['ideaUser']] for user in data['users']}
+        self.assertEqual(user_ideas[self.users['ideas_1'].username], ["idea 2"])
+
+    def test_delete_idea_on_shard(self):
+        author = self.users['ideas_1']
+        with self.settings(IDEA_SHARDS=self.SHARDS, IDEA_ID_WORKER=1):
+            idea_id = self.add_idea(author, "idea 1")
+            response = self.query(
+                '''
+                mutation deleteIdea($id: ID!){
+                    deleteIdea(id: $id){
+                        success
+                    }
+                }
+                ''',
+                headers={"HTTP_AUTHORIZATION": f"JWT {get_token(author)}"},
+                variables={'id': idea_id}
+            )
+        self.assertResponseNoErrors(response)
+        self.assertFalse(Idea.objects.using('ideas_1').exists())
+        self.assertTrue(IdeaTombstone.objects.filter(idea_id=idea_id).exists())
+
+    def test_sync_and_trending_read_every_shard(self):
+        header = {"HTTP_AUTHORIZATION": f"JWT {get_token(self.viewer)}"}
+        with self.settings(IDEA_SHARDS=self.SHARDS, IDEA_ID_WORKER=1):
+            self.add_idea(self.viewer, "idea 1")
+            self.add_idea(self.users['ideas_1'], "idea 2")
+            self.add_idea(self.users['ideas_1'], "idea 3", 'protected')
+            response = self.query(SyncQueryTest.IDEAS_SINCE, headers=header, variables={'cursor': None})
+            self.assertResponseNoErrors(response)
+            self.assertEqual(
+                [idea['content'] for idea in json.loads(response.content)['data']['ideasSince']['ideas']],
+                ["idea 1", "idea 2", "idea 3"]
+            )
+
+            self.assertEqual(refresh_trending(), (2, 0))
+            self.assertEqual(refresh_trending(), (0, 0))
+            response = self.query('query { trendingIdeas { content } }', headers=header)
+            self.assertResponseNoErrors(response)
+            self.assertEqual(
+                [idea['content'] for idea in json.loads(response.content)['data']['trendingIdeas']], ["idea 2", "idea 1"]
+            )
+            Idea.objects.using('ideas_1').update(visibility=Idea.PRIVATE)
+            self.assertEqual(refresh_trending(), (0, 1))
+
+    def test_admin_shows_one_shard(self):
+        admin = User.objects.create(email="admin@test.com", username="admin", is_staff=True, is_superuser=True)
+        with self.settings(IDEA_SHARDS=self.SHARDS, IDEA_ID_WORKER=1):
+            idea_id = self.add_idea(self.users['ideas_1'], "idea en ideas_1")
+            self.client.force_login(admin)
+            response = self.client.get('/admin/Api/idea/')
+            self.assertNotContains(response, "idea en ideas_1")
+            response = self.client.get('/admin/Api/idea/', {'shard': 'ideas_1'})
+            self.assertContains(response, "idea en ideas_1")
+            self.assertContains(response, self.users['ideas_1'].username)
+            response = self.client.get(f'/admin/Api/idea/{idea_id}/change/')
+            self.assertContains(response, "idea en ideas_1")
+
+            self.client.post('/admin/Api/idea/?shard=ideas_1', {'action': 'make_private', '_selected_action': [idea_id]})
+        self.assertEqual(Idea.objects.using('ideas_1').get().visibility, Idea.PRIVATE)
+        self.assertTrue(IdeaTombstone.objects.filter(idea_id=idea_id).exists())
+
+    def test_rebalance_moves_ideas_to_their_shard(self):
+        for user in self.users.values():
+            Idea.objects.create(content=f"idea de {user.username}", pub_user=user)
+        pub_dates = dict(Idea.objects.values_list('pk', 'pub_date'))
+        with self.settings(IDEA_SHARDS=self.SHARDS, IDEA_ID_WORKER=1):
+            out = StringIO()
+            call_command('rebalance_ideas', stdout=out)
+            self.assertIn('default -> ideas_1: 1 ideas', out.getvalue())
+            moved = Idea.objects.using('ideas_1').get()
+            self.assertEqual(moved.pub_user_id, self.users['ideas_1'].pk)
+            self.assertEqual(moved.pub_date, pub_dates[moved.pk])
+            self.assertEqual(Idea.objects.using('default').count(), 1)
+            self.assertEqual(rebalance_ideas(), {})
+
+
+class LoadTestCommandTest(LiveServerTestCase):
+
+    def test_parse_mix_and_percentile(self):
+        self.assertEqual(parse_mix('timeline=3,addIdea'), {'timeline': 3, 'addIdea': 1})
+        with self.assertRaises(ValueError):
+            parse_mix('unknown=1')
+        self.assertEqual(percentile([0.3, 0.1, 0.2, 0.4], 0.5), 0.3)
+        self.assertEqual(percentile([], 0.99), 0)
+
+    def test_loadtest_reports_every_operation(self):
+        out = StringIO()
+        call_command(
+            'loadtest', '--url', f'{self.live_server_url}/graphql/', '--users', '4', '--concurrency', '2',
+            '--requests', '30', '--mix', 'timeline=1,followedIdeas=1,addIdea=1,followRequest=1,me=1', '--json',
+            stdout=out
+        )
+        report = {row['operation']: row for row in json.loads(out.getvalue())['operations']}
+        self.assertTrue({'listAllIdeas', 'addIdea', 'sendFollowRequest', 'me'} <= set(report))
+        self.assertEqual([row['errors'] for row in report.values() if row['errors']], [])
+        self.assertEqual(User.objects.filter(email__endswith='@loadtest.local').count(), 4)
+
+    def test_default_mix_runs_without_errors(self):
+        out, err = StringIO(), StringIO()
+        call_command(
+            'loadtest', '--url', f'{self.live_server_url}/graphql/', '--users', '4', '--concurrency', '2',
+            '--requests', '40', '--json', stdout=out, stderr=err
+        )
+        report = json.loads(out.getvalue())['operations']
+        self.assertIn('listAllIdeas', {row['operation'] for row in report})
+        self.assertEqual([row['errors'] for row in report if row['errors']], [])
+        self.assertEqual(err.getvalue(), '')
+
+        call_command(
+            'loadtest', '--url', f'{self.live_server_url}/graphql/', '--users', '4', '--requests', '1',
+            '--mix', 'me=1,tokenAuth=1', '--json', stdout=StringIO(), stderr=err
+        )
+        self.assertIn('tokenAuth is rate limited', err.getvalue())
+
+
+class OutboxTest(GraphQLTestCase):
+
+    GRAPHQL_URL = 'http://localhost:8000/graphql/'
+
+    def setUp(self):
+        self.user1 = User.objects.create(email="test1@test1.com", username="usertest1")
+        self.user2 = User.objects.create(email="test2@test2.com", username="usertest2")
+        self.received = []
+        outbox_events.connect(self.receive)
+        self.addCleanup(outbox_events.disconnect, self.receive)
+
+    def receive(self, sender, events, **kwargs):
+        self.received.append([event.topic for event in events])
+
+    def mutate(self, user, query, variables):
+        response = self.query(query, headers={"HTTP_AUTHORIZATION": f"JWT {get_token(user)}"}, variables=variables)
+        self.assertResponseNoErrors(response)
+        return json.loads(response.content)['data']
+
+    def test_mutations_emit_events_dispatched_in_batches(self):
+        idea_id = self.mutate(
+            self.user1, 'mutation addIdea($content: String!){ addIdea(content: $content){ idea{ id } } }',
+            {'content': 'idea de prueba'}
+        )['addIdea']['idea']['id']
+        self.mutate(
+            self.user1, 'mutation editIdea($id: ID!){ editIdea(id: $id, visibility: "private"){ success } }', {'id': idea_id}
+        )
+        self.mutate(self.user1, 'mutation deleteIdea($id: ID!){ deleteIdea(id: $id){ success } }', {'id': idea_id})
+        request_id = self.mutate(
+            self.user1, 'mutation sendFollowRequest($idUser: ID!){ sendFollowRequest(idUser: $idUser){ followRequest{ id } } }',
+            {'idUser': self.user2.id}
+        )['sendFollowRequest']['followRequest']['id']
+        self.mutate(
+            self.user2,
+            'mutation responseFollowRequest($idRequest: ID!){ responseFollowRequest(idRequest: $idRequest, response: true){ success } }',
+            {'idRequest': request_id}
+        )
+
+        event = OutboxEvent.objects.get(topic='follow_request.answered')
+        self.assertEqual(event.payload['status'], FollowRequest.ACCEPTED)
+        self.assertEqual(OutboxEvent.objects.get(topic='idea.deleted').payload['idea_id'], int(idea_id))
+
+        self.assertEqual(dispatch_pending(batch_size=3), 5)
+        self.assertEqual(self.received, [
+            ['idea.added', 'idea.edited', 'idea.deleted'], ['follow_request.sent', 'follow_request.answered']
+        ])
+        self.assertFalse(OutboxEvent.objects.filter(dispatched_at__isnull=True).exists())
+        self.assertEqual(dispatch_pending(), 0)
+        self.assertEqual(purge_dispatched(timezone.now() + timedelta(seconds=1)), 5)
+
+    def test_failed_batch_stays_pending(self):
+        emit('idea.added', idea_id=1)
+
+        def fail(sender, events, **kwargs):
+            raise RuntimeError('consumer down')
+
+        outbox_events.connect(fail)
+        self.addCleanup(outbox_events.disconnect, fail)
+        with self.assertLogs('Api.outbox', 'ERROR'):
+            self.assertEqual(dispatch_events(), 0)
+        event = OutboxEvent.objects.get()
+        self.assertIsNone(event.dispatched_at)
+        self.assertEqual(event.attempts, 1)
+        self.assertIn('consumer down', event.last_error)
+
+    def test_poison_event_is_parked(self):
+        poison = emit('idea.added', idea_id=1)
+        emit('idea.added', idea_id=2)
+
+        def fail(sender, events, **kwargs):
+            if any(event.pk == poison.pk for event in events):
+                raise RuntimeError('bad payload')
+
+        outbox_events.connect(fail)
+        self.addCleanup(outbox_events.disconnect, fail)
+        with self.settings(OUTBOX_MAX_ATTEMPTS=2), self.assertLogs('Api.outbox', 'ERROR'):
+            self.assertEqual(dispatch_pending(), 0)
+            self.assertEqual(dispatch_pending(), 0)
+            self.assertEqual(dispatch_pending(), 1)
+        poison.refresh_from_db()
+        self.assertIsNotNone(poison.parked_at)
+        self.assertEqual(poison.attempts, 2)
+        self.assertEqual(self.received[-1], ['idea.added'])
+        self.assertEqual(OutboxEvent.objects.filter(dispatched_at__isnull=False).get().payload['idea_id'], 2)
+
+        outbox_events.disconnect(fail)
+        call_command('dispatch_outbox', '--requeue-parked', stdout=StringIO())
+        poison.refresh_from_db()
+        self.assertIsNotNone(poison.dispatched_at)
+        self.assertEqual(poison.attempts, 0)
+
+
+class IncrementalDeliveryTest(TestCase):
+
+    def setUp(self):
+        self.user1 = User.objects.create(email="test1@test1.com", username="usertest1")
+        self.user2 = User.objects.create(email="test2@test2.com", username="usertest2")
+        self.user2.following.add(self.user1)
+        for i in range(3):
+            Idea.objects.create(content=f"idea {i} de usertest2", pub_user=self.user2, visibility=Idea.PUBLIC)
+
+    def post(self, query, **extra):
+        return self.client.post(
+            '/graphql/',
+            json.dumps({'query': query}),
+            content_type='application/json',
+            HTTP_AUTHORIZATION=f"JWT {get_token(self.user1)}",
+            **extra
+        )
+
+    def post_multipart(self, query):
+        response = self.post(query, HTTP_ACCEPT='multipart/mixed, application/json')
+        self.assertEqual(response['Content-Type'], 'multipart/mixed; boundary="-"; deferSpec=20220824')
+        body = b''.join(response.streaming_content).decode()
+        self.assertTrue(body.endswith('\r\n-----\r\n'))
+        parts = body[:-len('\r\n-----\r\n')].split('\r\n---\r\n')[1:]
+        return [json.loads(part.split('\r\n\r\n', 1)[1]) for part in parts]
+
+    def test_stream_list(self):
+        query = 'query { listAllIdeas @stream(initialCount: 1, label: "ideas") { content } }'
+        with self.settings(GRAPHENE={**settings.GRAPHENE, 'STREAM_BATCH_SIZE': 1}):
+            payloads = self.post_multipart(query)
+        self.assertEqual(payloads, [
+            {'data': {'listAllIdeas': [{'content': 'idea 2 de usertest2'}]}, 'hasNext': True},
+            {'incremental': [{'path': ['listAllIdeas', 1], 'items': [{'content': 'idea 1 de usertest2'}], 'label': 'ideas'}],
+             'hasNext': True},
+            {'incremental': [{'path': ['listAllIdeas', 2], 'items': [{'content': 'idea 0 de usertest2'}], 'label': 'ideas'}],
+             'hasNext': False},
+        ])
+        full = json.loads(self.post(query).content)['data']['listAllIdeas']
+        self.assertEqual(payloads[0]['data']['listAllIdeas'] + [
+            item for payload in payloads[1:] for item in payload['incremental'][0]['items']
+        ], full)
+
+    def test_defer_fragment(self):
+        query = 'query { users { username ... @defer(label: "followers") { followers { username } } } }'
+        payloads = self.post_multipart(query)
+        initial, deferred = payloads[0], payloads[1:]
+        self.assertTrue(initial['hasNext'])
+        self.assertCountEqual(initial['data']['users'], [{'username': 'usertest1'}, {'username': 'usertest2'}])
+        self.assertEqual([payload['hasNext'] for payload in deferred], [True, False])
+        followers = {}
+        for payload in deferred:
+            entry, = payload['incremental']
+            self.assertEqual(entry['label'], 'followers')
+            username = initial['data']['users'][entry['path'][1]]['username']
+            followers[username] = entry['data']['followers']
+        self.assertEqual(followers, {'usertest1': [{'username': 'usertest2'}], 'usertest2': []})
+
+    def test_without_multipart_directives_are_ignored(self):
+        response = self.post('query { listAllIdeas @stream(initialCount: 1) { ... @defer { content } } }')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(len(json.loads(response.content)['data']['listAllIdeas']), 3)
+        self.assertEqual(json.loads(response.content)['data']['listAllIdeas'][0], {'content': 'idea 2 de usertest2'})
+
+
+class AdminTest(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create(email="admin@test.com", username="admin", is_staff=True, is_superuser=True)
+        self.user1 = User.objects.create(email="test1@test1.com", username="usertest1")
+        self.user2 = User.objects.create(email="test2@test2.com", username="usertest2")
+        self.client.force_login(self.admin)
+
+    def changelist(self, model, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/admin/Api/{model}/', params)
+        self.assertEqual(response.status_code, 200)
+        return response, [query['sql'] for query in queries.captured_queries]
+
+    def test_follow_request_changelist_query_count(self):
+        FollowRequest.objects.create(requester=self.user1, to_follow=self.user2)
+        _, few = self.changelist('followrequest')
+        FollowRequest.objects.create(requester=self.user2, to_follow=self.user1)
+        FollowRequest.objects.create(requester=self.admin, to_follow=self.user1)
+        response, many = self.changelist('followrequest')
+        self.assertEqual(len(few), len(many))
+        self.assertContains(response, 'usertest2')
+
+    @skipUnless(connection.vendor == 'postgresql', 'Estimated counts require PostgreSQL')
+    def test_estimated_count(self):
+        for i in range(3):
+            Idea.objects.create(content=f"idea {i}", pub_user=self.user1)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE "Api_idea"')
+        with self.settings(ADMIN_ESTIMATED_COUNT_MIN=1):
+            response, queries = self.changelist('idea')
+        self.assertEqual(response.context['cl'].result_count, 3)
+        self.assertFalse([sql for sql in queries if 'COUNT(*)' in sql])
+        with self.settings(ADMIN_ESTIMATED_COUNT_MIN=1):
+            response, queries = self.changelist('idea', visibility__exact=Idea.PUBLIC)
+        self.assertEqual(response.context['cl'].result_count, 3)
+        self.assertFalse([sql for sql in queries if 'COUNT(*)' in sql])
+
+        _, queries = self.changelist('idea')
+        self.assertTrue([sql for sql in queries if 'COUNT(*)' in sql])
+
+    def test_user_change_page_uses_raw_id_widget(self):
+        self.user1.following.add(self.user2)
+        response = self.client.get(f'/admin/Api/user/{self.user1.pk}/change/')
+        self.assertContains(response, 'vManyToManyRawIdAdminField')
+        self.assertNotContains(response, '<select name="following"')
+
+    def test_bulk_actions(self):
+        ideas = [Idea.objects.create(content=f"idea {i}", pub_user=self.user1) for i in range(3)]
+        FollowRequest.objects.create(requester=self.user1, to_follow=self.user2)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post('/admin/Api/idea/', {
+                'action': 'make_private', '_selected_action': [idea.pk for idea in ideas]
+            })
+        self.assertEqual(len([query for query in queries.captured_queries if query['sql'].startswith('UPDATE')]), 1)
+        self.assertEqual(Idea.objects.filter(visibility=Idea.PRIVATE).count(), 3)
+        self.assertEqual(OutboxEvent.objects.filter(topic='idea.edited').count(), 3)
+
+        self.client.post('/admin/Api/followrequest/', {
+            'action': 'deny_requests', '_selected_action': list(FollowRequest.objects.values_list('pk', flat=True))
+        })
+        self.assertEqual(FollowRequest.objects.get().status, FollowRequest.DENIED)
+
+        self.client.post('/admin/Api/user/', {
+            'action': 'soft_delete_users', '_selected_action': [self.user1.pk, self.user2.pk]
+        })
+        self.assertEqual(User.objects.filter(deleted_at__isnull=False, is_active=False).count(), 2)
+        response, _ = self.changelist('user', deleted='no')
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+    def test_make_private_removes_ideas_from_followers_sync(self):
+        idea = Idea.objects.create(content="idea publica", pub_user=self.user1, visibility=Idea.PUBLIC)
+        self.user2.following.add(self.user1)
+
+        def sync_ideas(cursor=None):
+            response = self.client.post(
+                '/graphql/', json.dumps({'query': SyncQueryTest.IDEAS_SINCE, 'variables': {'cursor': cursor}}),
+                content_type='application/json', HTTP_AUTHORIZATION=f"JWT {get_token(self.user2)}"
+            )
+            return json.loads(response.content)['data']['ideasSince']
+
+        first_sync = sync_ideas()
+        self.assertEqual([idea['content'] for idea in first_sync['ideas']], ["idea publica"])
+        self.client.post('/admin/Api/idea/', {'action': 'make_private', '_selected_action': [idea.pk]})
+        self.assertEqual(IdeaTombstone.objects.get(idea_id=idea.pk).visibility, Idea.PUBLIC)
+        next_sync = sync_ideas(first_sync['cursor'])
+        self.assertEqual(next_sync['ideas'], [])
+        self.assertEqual(next_sync['removedIds'], [str(idea.pk)])
+
+
+class PasswordHashingTest(GraphQLTestCase):
+
+    GRAPHQL_URL = 'http://localhost:8000/graphql/'
+
+    def test_pooled_hashes_are_compatible(self):
+        stock = PBKDF2PasswordHasher()
+        pooled = PooledPBKDF2PasswordHasher()
+        encoded = make_password('usertest1234')
+        self.assertTrue(encoded.startswith('pbkdf2_sha256$'))
+        self.assertTrue(stock.verify('usertest1234', encoded))
+        self.assertTrue(pooled.verify('usertest1234', stock.encode('usertest1234', stock.salt())))
+        self.assertNotEqual(hashing_pool.run(os.getpid), os.getpid())
+        self.assertTrue(asyncio.run(acheck_password('usertest1234', encoded)))
+        self.assertFalse(asyncio.run(acheck_password('wrong', encoded)))
+
+    def test_pool_recovers_from_a_killed_worker(self):
+        os.kill(hashing_pool.run(os.getpid), signal.SIGKILL)
+        encoded = make_password('usertest1234')
+        self.assertTrue(PBKDF2PasswordHasher().verify('usertest1234', encoded))
+        self.assertTrue(PBKDF2PasswordHasher().verify('usertest1234', make_password('usertest1234')))
+
+    def test_register_single_insert(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.query(
+                'mutation register($username: String!, $email: String!, $password: String!)'
+                '{ register(username: $username, email: $email, password: $password){ success } }',
+                variables={'email': 'test3@test3.com', 'username': 'usertest3', 'password': 'usertest1234'}
+            )
+        self.assertResponseNoErrors(response)
+        writes = [query['sql'] for query in queries.captured_queries if 'INSERT' in query['sql'] or 'UPDATE' in query['sql']]
+        self.assertEqual(len(writes), 1)
+        self.assertTrue(User.objects.get(email='test3@test3.com').check_password('usertest1234'))
+
+
+@override_settings(CACHES=SHARED_CACHES, ENTITY_CACHE='shared')
+class EntityCacheTest(GraphQLTestCase):
+
+    GRAPHQL_URL = 'http://localhost:8000/graphql/'
+
+    def setUp(self):
+        entity_cache.cache.clear()
+        self.user1 = User.objects.create(email="test1@test1.com", username="usertest1")
+        self.user2 = User.objects.create(email="test2@test2.com", username="usertest2")
+
+    def test_get_many_and_write_through(self):
+        with self.assertNumQueries(1):
+            users = entity_cache.get_many(User, [self.user1.pk, self.user2.pk, 0])
+        self.assertEqual({pk: user.username for pk, user in users.items()}, {self.user1.pk: 'usertest1', self.user2.pk: 'usertest2'})
+        with self.assertNumQueries(0):
+            self.assertEqual(len(entity_cache.get_many(User, [self.user1.pk, self.user2.pk, 0])), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user1.username = 'renamed'
+            self.user1.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user2.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(entity_cache.get(User, self.user1.pk).username, 'renamed')
+            self.assertIsNone(entity_cache.get(User, self.user2.pk))
+        self.assertEqual(entity_cache.cache.get(entity_cache.key(User, self.user2.pk)), DELETED)
+
+    def test_waits_for_locked_key_then_loads(self):
+        entity_cache.cache.add(entity_cache.lock_key(User, self.user1.pk), 1)
+        with self.assertNumQueries(1):
+            self.assertEqual(entity_cache.get(User, str(self.user1.pk)).username, 'usertest1')
+
+    def test_pub_user_reads_through_cache(self):
+        for i in range(3):
+            Idea.objects.create(content=f"idea {i}", pub_user=self.user2, visibility=Idea.PUBLIC)
+        header = {"HTTP_AUTHORIZATION": f"JWT {get_token(self.user1)}"}
+        self.query('query { listAllIdeas { pubUser { username } } }', headers=header)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.query('query { listAllIdeas { pubUser { username } } }', headers=header)
+        self.assertResponseNoErrors(response)
+        self.assertEqual(json.loads(response.content)['data']['listAllIdeas'], [{'pubUser': {'username': 'usertest2'}}] * 3)
+        self.assertFalse([query for query in queries.captured_queries if f'"Api_user"."id" = {self.user2.pk}' in query['sql']])
+
+    def test_accepting_a_request_does_not_write_the_cached_requester(self):
+        follow_request = FollowRequest.objects.create(requester=self.user2, to_follow=self.user1)
+        self.assertIsNone(FollowRequest.objects.get(pk=follow_request.pk).requester.deleted_at)
+        User.objects.filter(pk=self.user2.pk).update(email='changed@test2.com')
+        response = self.query(
+            'mutation { responseFollowRequest(idRequest: %d, response: true) { success } }' % follow_request.pk,
+            headers={"HTTP_AUTHORIZATION": f"JWT {get_token(self.user1)}"},
+        )
+        self.assertResponseNoErrors(response)
+        requester = User.objects.get(pk=self.user2.pk)
+        self.assertEqual(requester.email, 'changed@test2.com')
+        self.assertEqual(list(requester.following.all()), [self.user1])
+
+    def test_requires_a_shared_cache(self):
+        with self.settings(ENTITY_CACHE='default'):
+            with self.assertRaises(ImproperlyConfigured):
+                entity_cache.get(User, self.user1.pk)
+        with self.settings(ENTITY_CACHE=None):
+            with self.assertNumQueries(1):
+                self.assertEqual(entity_cache.get(User, self.user1.pk).username, 'usertest1')
+            self.assertEqual(entity_cache.get_many(User, [0]), {})
+
+
+class CoalescingTest(TestCase):
+
+    def setUp(self):
+        self.user1 = User.objects.create(email="test1@test1.com", username="usertest1")
+        self.user2 = User.objects.create(email="test2@test2.com", username="usertest2")
+        self.scopes = [VisibilityScope(self.user1), VisibilityScope(self.user2), VisibilityScope(AnonymousUser())]
+
+    def test_request_key(self):
+        scope1, scope2, anonymous = self.scopes
+        key = request_key('query { me { id } }', None, None, scope1)
+        self.assertEqual(key, request_key('query{\n  me { id }\n}', {}, None, scope1))
+        self.assertNotEqual(key, request_key('query { me { id } }', None, None, scope2))
+        self.assertNotEqual(key, request_key('query { me { id } }', {'first': 1}, None, scope1))
+        self.assertIsNone(request_key('mutation { deleteAccount { success } }', None, None, scope1))
+        self.assertIsNone(request_key('query { forgottenPassword(email: "a@b.c") }', None, None, anonymous))
+        self.assertIsNone(request_key('query {', None, None, anonymous))
+
+        self.user1.following.add(self.user2)
+        self.assertNotEqual(key, request_key('query { me { id } }', None, None, VisibilityScope(self.user1)))
+
+    def test_public_queries_share_one_scope(self):
+        scope1, scope2, anonymous = self.scopes
+        trending = 'query { trendingIdeas { content pubUser { username } } }'
+        self.assertEqual(request_key(trending, None, None, scope1), request_key(trending, None, None, scope2))
+        self.assertNotEqual(request_key(trending, None, None, scope1), request_key(trending, None, None, anonymous))
+        for query in (
+            'query { trendingIdeas { pubUser { relationship { following } } } }',
+            'query { trendingIdeas { ... on IdeaType { pubUser { ideaUser { content } } } } }',
+            'query { trendingIdeas { content } me { id } }',
+        ):
+            self.assertNotEqual(request_key(query, None, None, scope1), request_key(query, None, None, scope2))
+
+    def test_two_users_share_one_execution(self):
+        trending = 'query { trendingIdeas { content } }'
+        keys = [request_key(trending, None, None, scope) for scope in self.scopes[:2]]
+        flight = SingleFlight()
+        release = threading.Event()
+        calls, results = [], []
+
+        def execute():
+            calls.append(1)
+            release.wait(5)
+            return ('{"data": {"trendingIdeas": []}}', 200)
+
+        threads = [threading.Thread(target=lambda key=key: results.append(flight.do(key, execute))) for key in keys]
+        threads[0].start()
+        while not calls:
+            pass
+        threads[1].start()
+        time.sleep(0.2)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [('{"data": {"trendingIdeas": []}}', 200)] * 2)
+
+    def test_followers_share_the_leader_result(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls, results = [], []
+
+        def execute():
+            calls.append(1)
+            release.wait(5)
+            return ('{"data": {}}', 200)
+
+        threads = [threading.Thread(target=lambda: results.append(flight.do('key', execute))) for _ in range(5)]
+        threads[0].start()
+        while not calls:
+            pass
+        for thread in threads[1:]:
+            thread.start()
+        time.sleep(0.2)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [('{"data": {}}', 200)] * 5)
+        self.assertEqual(flight.do('key', lambda: 'again'), 'again')
+
+    def test_shared_flight_waits_for_other_process(self):
+        cache = caches['default']
+        cache.add('coalesce:key', 'other')
+        threading.Timer(0.05, lambda: cache.set('coalesce:key:other', 'from other process')).start()
+        with self.settings(GRAPHENE={**settings.GRAPHENE, 'COALESCE_CACHE': 'default'}):
+            self.assertEqual(shared_flight('key', lambda: 'executed'), 'from other process')
+            cache.delete('coalesce:key')
+            self.assertEqual(shared_flight('key', lambda: 'executed'), 'executed')
+
+
+class IntrospectionCacheTest(TestCase):
+
+    def setUp(self):
+        from .schema import build_schema
+        self.schema = build_schema().graphql_schema
+
+    def post(self, query, **extra):
+        return self.client.post('/graphql/', json.dumps({'query': query}), content_type='application/json', **extra)
+
+    def test_introspection_is_served_with_etag(self):
+        query = get_introspection_query()
+        response = self.post(query)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'data': graphql_sync(self.schema, query).data})
+        self.assertTrue(response['ETag'].startswith(f'"{introspection_cache.hash[:16]}-'))
+
+        with self.assertNumQueries(0):
+            response = self.post(query, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        with self.settings(GRAPHENE={**settings.GRAPHENE, 'COMPRESS_MIN_SIZE': 100}):
+            compressed = self.post(query, HTTP_ACCEPT_ENCODING='gzip')
+            self.assertEqual(compressed['Content-Encoding'], 'gzip')
+            self.assertEqual(compressed['ETag'], f'W/{response["ETag"]}')
+            self.assertEqual(self.post(query, HTTP_IF_NONE_MATCH=compressed['ETag']).status_code, 304)
+        self.assertEqual(self.post('{ __type(name: "IdeaType") { name } }').json(),
+                         {'data': {'__type': {'name': 'IdeaType'}}})
+
+    def test_other_queries_are_executed(self):
+        self.assertIsNone(introspection_cache.response(self.schema, 'query { listAllIdeas { id } }'))
+        self.assertIsNone(introspection_cache.response(self.schema, '{ __typename listAllIdeas { id } }'))
+        self.assertIsNone(introspection_cache.response(self.schema, '{ __type(name: $name) { name } }'))
+        self.assertIsNone(introspection_cache.response(self.schema, 'mutation { __typename }'))
+        response = self.post('query { listAllIdeas { id } }')
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_schema_sdl(self):
+        response = self.client.get('/graphql/schema.graphql')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content.decode(), print_schema(self.schema))
+        self.assertIn('directive @defer', response.content.decode())
+        response = self.client.get('/graphql/schema.graphql', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_build_time_file(self):
+        with TemporaryDirectory() as directory:
+            path = Path(directory) / 'introspection.json'
+            call_command('build_introspection', output=str(path), stdout=StringIO())
+            stored = json.loads(path.read_text())
+            self.assertEqual(stored['hash'], introspection_cache.hash)
+            self.assertEqual(len(stored['results']), 4)
+
+            with self.settings(INTROSPECTION_CACHE_FILE=path):
+                cache = IntrospectionCache()
+                cache.prepare(self.schema)
+                self.assertEqual(cache._results, stored['results'])
+                path.write_text(json.dumps({**stored, 'hash': 'other schema'}))
+                cache = IntrospectionCache()
+                cache.prepare(self.schema)
+                self.assertEqual(cache._results, {})
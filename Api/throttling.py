@@ -0,0 +1,119 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from graphql import GraphQLError
+
+
+RATE_PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    count, period = rate.split('/')
+    return int(count), RATE_PERIODS[period[0]]
+
+
+def take_token(tokens, stamp, now, capacity, period):
+    tokens = min(capacity, tokens + (now - stamp) * capacity / period)
+    if tokens >= 1:
+        return tokens - 1, 0
+    return tokens, (1 - tokens) * period / capacity
+
+
+# Backends
+
+class LocMemBackend:
+    # Buckets are kept in least recently used order; past max_buckets the
+    # longest idle ones are dropped, and a client that keeps calling is never
+    # the one evicted.
+    max_buckets = 10000
+
+    def __init__(self):
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, period):
+        now = time.monotonic()
+        with self._lock:
+            tokens, stamp = self._buckets.pop(key, (capacity, now))
+            tokens, retry_after = take_token(tokens, stamp, now, capacity, period)
+            while len(self._buckets) >= self.max_buckets:
+                self._buckets.popitem(last=False)
+            self._buckets[key] = (tokens, now)
+        return retry_after
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBackend:
+    # Shared between workers through a Django cache (memcached, redis...). The
+    # read-modify-write is not atomic, so bursts racing on the same key may let
+    # a few extra calls through. Keys carry a generation number, so reset()
+    # drops every bucket without touching the rest of the cache.
+    key_prefix = 'ratelimit:'
+
+    def __init__(self):
+        self.cache = caches[settings.GRAPHENE.get('RATE_LIMIT_CACHE', 'default')]
+
+    @property
+    def generation_key(self):
+        return f'{self.key_prefix}generation'
+
+    def consume(self, key, capacity, period):
+        now = time.time()
+        generation = self.cache.get_or_set(self.generation_key, 0, timeout=None)
+        cache_key = f'{self.key_prefix}{generation}:{key}'
+        tokens, stamp = self.cache.get(cache_key, (capacity, now))
+        tokens, retry_after = take_token(tokens, stamp, now, capacity, period)
+        self.cache.set(cache_key, (tokens, now), timeout=period)
+        return retry_after
+
+    def reset(self):
+        self.cache.add(self.generation_key, 0, timeout=None)
+        self.cache.incr(self.generation_key)
+
+
+@lru_cache(maxsize=None)
+def load_backend(path):
+    return import_string(path)()
+
+
+def get_backend():
+    return load_backend(settings.GRAPHENE.get('RATE_LIMIT_BACKEND', 'Api.throttling.LocMemBackend'))
+
+
+# Middleware
+
+def get_client_ip(request):
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def get_rate_key(info, key):
+    request = info.context
+    user = getattr(request, 'user', None)
+    if key == 'user' and user is not None and user.is_authenticated:
+        return f'{info.field_name}:user:{user.pk}'
+    return f'{info.field_name}:ip:{get_client_ip(request)}'
+
+
+class RateLimitMiddleware:
+    def resolve(self, next, root, info, **kwargs):
+        if info.path.prev is None:
+            limit = settings.GRAPHENE.get('RATE_LIMITS', {}).get(info.field_name)
+            if limit:
+                capacity, period = parse_rate(limit['rate'])
+                retry_after = get_backend().consume(get_rate_key(info, limit.get('key', 'ip')), capacity, period)
+                if retry_after:
+                    retry_after = math.ceil(retry_after)
+                    raise GraphQLError(
+                        f'Too many requests, retry in {retry_after} seconds',
+                        extensions={'code': 'THROTTLED', 'retryAfter': retry_after}
+                    )
+        return next(root, info, **kwargs)
@@ -0,0 +1,95 @@
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import User, Idea, IdeaScore
+from .sharding import idea_shards
+
+
+# Exponential decay expressed in log space: an idea published TRENDING_DECAY_SECONDS
+# later needs ten times fewer followers to rank the same. The order between two
+# ideas never changes as time passes, so a score only has to be recomputed when
+# the idea is new or its author's follower count changed.
+def compute_score(followers, pub_date):
+    return math.log10(1 + followers) + pub_date.timestamp() / settings.TRENDING_DECAY_SECONDS
+
+
+# Ideas are read shard by shard; the follower counts and the scores live on
+# the default database, so nothing is joined across databases.
+
+def follower_counts(user_ids):
+    return dict(
+        User.following.through.objects.filter(to_user__in=user_ids)
+        .values('to_user')
+        .annotate(total=Count('*'))
+        .values_list('to_user', 'total')
+    )
+
+
+def trending_candidates(alias, cutoff):
+    return Idea.objects.using(alias).alive().filter(visibility=Idea.PUBLIC, pub_date__gte=cutoff)
+
+
+def refresh_trending(batch_size=1000):
+    cutoff = timezone.now() - timedelta(hours=settings.TRENDING_WINDOW_HOURS)
+    removed = 0
+    last_pk = 0
+    while True:
+        ids = list(IdeaScore.objects.filter(idea_id__gt=last_pk).order_by('idea_id').values_list('idea_id', flat=True)[:batch_size])
+        if not ids:
+            break
+        last_pk = ids[-1]
+        alive = set()
+        for alias in idea_shards():
+            alive.update(trending_candidates(alias, cutoff).filter(pk__in=ids).values_list('pk', flat=True))
+        expired, _ = IdeaScore.objects.filter(idea_id__in=[pk for pk in ids if pk not in alive]).delete()
+        removed += expired
+
+    updated = 0
+    for alias in idea_shards():
+        candidates = trending_candidates(alias, cutoff).order_by('pk').values('pk', 'pub_user_id', 'pub_date')
+        last_pk = 0
+        while True:
+            rows = list(candidates.filter(pk__gt=last_pk)[:batch_size])
+            if not rows:
+                break
+            last_pk = rows[-1]['pk']
+            followers = follower_counts({row['pub_user_id'] for row in rows})
+            with transaction.atomic():
+                existing = dict(
+                    IdeaScore.objects.filter(idea_id__in=[row['pk'] for row in rows]).values_list('idea_id', 'followers')
+                )
+                scores = [
+                    IdeaScore(
+                        idea_id=row['pk'],
+                        followers=followers.get(row['pub_user_id'], 0),
+                        score=compute_score(followers.get(row['pub_user_id'], 0), row['pub_date'])
+                    )
+                    for row in rows if existing.get(row['pk']) != followers.get(row['pub_user_id'], 0)
+                ]
+                IdeaScore.objects.bulk_update([score for score in scores if score.idea_id in existing], ['followers', 'score'])
+                IdeaScore.objects.bulk_create([score for score in scores if score.idea_id not in existing])
+            updated += len(scores)
+    return updated, removed
+
+
+# The best scored ideas that are still public and whose author is active; the
+# scores lag behind until the next refresh, so a page may need more reads.
+def trending_ideas(first):
+    scores = IdeaScore.objects.order_by('-score', 'idea_id').values_list('idea_id', flat=True)
+    ideas = []
+    offset = 0
+    while len(ideas) < first:
+        ids = list(scores[offset:offset + first])
+        if not ids:
+            break
+        offset += first
+        found = {}
+        for alias in idea_shards():
+            found.update((idea.pk, idea) for idea in Idea.objects.using(alias).alive().filter(pk__in=ids, visibility=Idea.PUBLIC))
+        ideas.extend(found[pk] for pk in ids if pk in found)
+    return ideas[:first]
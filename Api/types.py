@@ -1,33 +1,250 @@
+from datetime import timedelta
+
 import graphene
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
 from django.core.exceptions import ValidationError, ObjectDoesNotExist
+from django.http import Http404
 from django.shortcuts import get_object_or_404
-from django.utils.encoding import force_bytes
-from django.utils.http import urlsafe_base64_encode
-from django.template.loader import render_to_string
-from django.core.mail import send_mail
-from django.contrib.auth.tokens import default_token_generator
-from graphql import GraphQLError
+from django.db import transaction
+from django.db.models import Q
+from graphql import GraphQLError, FieldNode, FragmentSpreadNode
 from graphene_django import DjangoObjectType
 from graphql_jwt.shortcuts import get_token
 
-from .models import User, Idea, FollowRequest
+from .cursors import encode_cursor, decode_cursor, decode_datetime
+from .entitycache import get_cached_object_or_404
+from .models import User, Idea, FollowRequest, IdeaTombstone, FollowSuggestion, visibility_filter
+from .outbox import (
+    emit, idea_payload, follow_request_payload,
+    IDEA_ADDED, IDEA_EDITED, IDEA_DELETED, FOLLOW_REQUEST_SENT, FOLLOW_REQUEST_ANSWERED
+)
+from .permissions import get_visibility_scope, reset_visibility_scope, visible_ideas
+from .sharding import by_pub_date, scatter, shard_for_user
+from .trending import trending_ideas
+
+
+# Helpers
+
+# Keyset sync on (date, pk). The dates are set before the writing transaction
+# commits, so a row can become visible behind a position already handed out.
+# A position is (date, pk, since, sent): every page also re-reads the rows
+# dated after since, up to SYNC_OVERLAP_SECONDS behind the position, and skips
+# the (pk, date) pairs already sent from that window.
+
+def sync_position(date, pk, since, sent):
+    if date is None:
+        return None
+    if not isinstance(sent, list) or not all(isinstance(entry, list) and len(entry) == 2 for entry in sent):
+        raise GraphQLError('Invalid cursor')
+    return decode_datetime(date), pk, decode_datetime(since), [(sent_pk, decode_datetime(sent_date)) for sent_pk, sent_date in sent]
+
+def sync_cursor_values(position):
+    if position is None:
+        return None, None, None, []
+    date, pk, since, sent = position
+    return date, pk, since, [[sent_pk, sent_date.isoformat()] for sent_pk, sent_date in sent]
+
+def sync_window(date, pk, since, sent):
+    overlap = date - timedelta(seconds=settings.SYNC_OVERLAP_SECONDS)
+    since = overlap if since is None else max(since, overlap)
+    sent = sorted((entry for entry in set(sent) if entry[1] > since), key=lambda entry: entry[1])
+    if len(sent) > settings.SYNC_OVERLAP_MAX_ROWS:
+        # Past the limit the window shrinks instead of the cursor growing.
+        since = sent[-settings.SYNC_OVERLAP_MAX_ROWS - 1][1]
+        sent = [entry for entry in sent if entry[1] > since]
+    return date, pk, since, sent
+
+# The position after every row, the rows of the overlap window counted as sent.
+def sync_start(queryset, date_field):
+    last = queryset.order_by(f'-{date_field}', '-pk').first()
+    if last is None:
+        return None
+    date = getattr(last, date_field)
+    recent = queryset.filter(**{f'{date_field}__gt': date - timedelta(seconds=settings.SYNC_OVERLAP_SECONDS)})
+    return sync_window(date, last.pk, None, list(recent.values_list('pk', date_field)))
+
+def sync_filter(queryset, date_field, position, first):
+    if position is None:
+        return queryset.order_by(date_field, 'pk')[:first + 1]
+    date, pk, since, sent = position
+    after = Q(**{f'{date_field}__gt': date}) | Q(**{date_field: date, 'pk__gt': pk})
+    return queryset.filter(after | Q(**{f'{date_field}__gt': since})).order_by(date_field, 'pk')[:len(sent) + first + 1]
+
+def sync_result(rows, date_field, position, first):
+    if position is not None:
+        sent = set(position[3])
+        rows = [row for row in rows if (row.pk, getattr(row, date_field)) not in sent]
+    has_more = len(rows) > first
+    rows = rows[:first]
+    if rows:
+        date, pk, since, sent = position or (None, None, None, [])
+        last = (getattr(rows[-1], date_field), rows[-1].pk)
+        if date is None or last > (date, pk):
+            date, pk = last
+        position = sync_window(date, pk, since, [*sent, *((row.pk, getattr(row, date_field)) for row in rows)])
+    return rows, position, has_more
+
+def sync_page(queryset, date_field, position, first):
+    return sync_result(list(sync_filter(queryset, date_field, position, first)), date_field, position, first)
+
+# build(alias) returns the queryset of one idea shard; the shard pages are
+# merged in (date, pk) order.
+def sync_shards(build, date_field, position, first):
+    rows = scatter(
+        lambda alias: sync_filter(build(alias), date_field, position, first),
+        lambda row: (getattr(row, date_field), row.pk), reverse=False
+    )
+    limit = first + 1 + (len(position[3]) if position else 0)
+    return sync_result(list(rows)[:limit], date_field, position, first)
+
+def requested_fields(info):
+    names = set()
+
+    def collect(selection_set):
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                names.add(selection.name.value)
+            elif isinstance(selection, FragmentSpreadNode):
+                collect(info.fragments[selection.name.value].selection_set)
+            else:
+                collect(selection.selection_set)
+
+    for field_node in info.field_nodes:
+        if field_node.selection_set:
+            collect(field_node.selection_set)
+    return names
+
+def with_relationship(queryset, info):
+    viewer = info.context.user
+    if viewer.is_anonymous or 'relationship' not in requested_fields(info):
+        return queryset
+    return queryset.with_relationship(viewer)
+
+# The viewer's side of every relationship, read once per operation for the
+# users that come without the with_relationship annotations (idea authors,
+# users of follow requests...). A set of more than RELATIONSHIP_PREFETCH_LIMIT
+# ids is not kept, and those users are annotated one by one instead.
+class ViewerRelationships:
+    def __init__(self, viewer):
+        follow = User.following.through.objects
+        pending = FollowRequest.objects.filter(status=FollowRequest.PENDING)
+        self.sets = [
+            self.load(follow.filter(from_user=viewer.pk).values_list('to_user', flat=True)),
+            self.load(follow.filter(to_user=viewer.pk).values_list('from_user', flat=True)),
+            self.load(pending.filter(requester=viewer.pk).values_list('to_follow', flat=True)),
+            self.load(pending.filter(to_follow=viewer.pk).values_list('requester', flat=True)),
+        ]
+
+    def load(self, ids):
+        limit = settings.RELATIONSHIP_PREFETCH_LIMIT
+        ids = set(ids[:limit + 1])
+        return ids if len(ids) <= limit else None
+
+    # (following, followed by, request sent, request received), or None.
+    def get(self, user_id):
+        if None in self.sets:
+            return None
+        return tuple(user_id in ids for ids in self.sets)
+
+def get_viewer_relationships(info):
+    request = info.context
+    cached = getattr(request, '_viewer_relationships', None)
+    if cached is None or cached[0] is not info.operation or cached[1] != request.user.pk:
+        cached = request._viewer_relationships = (info.operation, request.user.pk, ViewerRelationships(request.user))
+    return cached[2]
+
+def get_alive_user_or_404(id_user):
+    user = get_cached_object_or_404(User, id_user)
+    if user.deleted_at is not None:
+        raise Http404('No User matches the given query.')
+    return user
+
+def page_size(first, limit):
+    if first is not None and first < 0:
+        raise GraphQLError('first must not be negative')
+    if not first or first > limit:
+        return limit
+    return first
 
 
 # Types
 
+class RelationshipType(graphene.ObjectType):
+    following = graphene.Boolean()
+    followed_by = graphene.Boolean()
+    request_sent = graphene.Boolean()
+    request_received = graphene.Boolean()
+
 class UserType(DjangoObjectType):
+    relationship = graphene.Field(RelationshipType)
+
     class Meta:
         model = User
         exclude = ('password',)
 
+    @classmethod
+    def get_queryset(cls, queryset, info):
+        return with_relationship(queryset.alive(), info)
+
+    def resolve_relationship(self, info):
+        viewer = info.context.user
+        if viewer.is_anonymous or viewer.pk == self.pk:
+            return None
+        if not hasattr(self, 'viewer_follows'):
+            relationship = get_viewer_relationships(info).get(self.pk)
+            if relationship is not None:
+                return RelationshipType(*relationship)
+            self = User.objects.with_relationship(viewer).get(pk=self.pk)
+        return RelationshipType(
+            following=self.viewer_follows,
+            followed_by=self.follows_viewer,
+            request_sent=self.viewer_requested,
+            request_received=self.requested_viewer
+        )
+
 class IdeaType(DjangoObjectType):
+    pub_user = graphene.Field(UserType, required=True)
+
     class Meta:
         model = Idea
 
+    # The author comes through the entity cache; the generated field would load
+    # it again through UserType.get_queryset for every idea.
+    def resolve_pub_user(self, info):
+        user = self.pub_user
+        return user if user.deleted_at is None else None
+
+    @classmethod
+    def get_queryset(cls, queryset, info):
+        return visible_ideas(info, queryset)
+
 class FollowRequestType(DjangoObjectType):
+    cursor = graphene.String()
+
     class Meta:
         model = FollowRequest
 
+    def resolve_cursor(self, info):
+        return encode_cursor(self.created_at, self.pk)
+
+class FollowSuggestionType(DjangoObjectType):
+    class Meta:
+        model = FollowSuggestion
+        fields = ('suggested', 'mutual_count')
+
+class IdeaSyncType(graphene.ObjectType):
+    ideas = graphene.List(IdeaType)
+    removed_ids = graphene.List(graphene.ID)
+    reset = graphene.Boolean()
+    cursor = graphene.String()
+    has_more = graphene.Boolean()
+
+class FollowRequestSyncType(graphene.ObjectType):
+    follow_requests = graphene.List(FollowRequestType)
+    cursor = graphene.String()
+    has_more = graphene.Boolean()
+
 # User Queries
 
 class UserQuery(graphene.ObjectType):
@@ -35,24 +252,27 @@ class UserQuery(graphene.ObjectType):
     me = graphene.Field(UserType)
     search_users = graphene.List(UserType, username=graphene.String(required=True))
     forgotten_password = graphene.String(email=graphene.String(required=True))
+    suggested_follows = graphene.List(FollowSuggestionType, first=graphene.Int())
 
     def resolve_users(self, info):
-        return User.objects.all()
+        return with_relationship(User.objects.alive(), info)
     
     def resolve_me(self, info):
-        user = info.context.user
-        if user.is_anonymous:
-            raise GraphQLError('User not logged in')
-        return user
+        return info.context.user
 
     def resolve_search_users(self, info, username):
         user = info.context.user
-        if user.is_anonymous:
-            raise GraphQLError('You must be logged in')
-        return User.objects.filter(username__icontains=username).exclude(pk=user.id)
+        return with_relationship(User.objects.alive().filter(username__icontains=username).exclude(pk=user.id), info)
     
     def resolve_forgotten_password(self, info, email):
-        user_email = get_object_or_404(User, email=email)
+        # Mail and template machinery is only needed here, keep it out of the schema import.
+        from django.contrib.auth.tokens import default_token_generator
+        from django.core.mail import send_mail
+        from django.template.loader import render_to_string
+        from django.utils.encoding import force_bytes
+        from django.utils.http import urlsafe_base64_encode
+
+        user_email = get_object_or_404(User.objects.alive(), email=email)
         if user_email:
             subject = 'Password Reset Request'
             email_template_name = 'template_text_email.txt'
@@ -72,6 +292,11 @@ class UserQuery(graphene.ObjectType):
             except:
                 return GraphQLError('Error password reset')
 
+    def resolve_suggested_follows(self, info, first=None):
+        user = info.context.user
+        first = page_size(first, settings.FOLLOW_SUGGESTIONS_LIMIT)
+        return user.follow_suggestions.filter(suggested__deleted_at__isnull=True).select_related('suggested').order_by('-mutual_count', 'suggested_id')[:first]
+
      
 # User Mutation
 
@@ -88,9 +313,7 @@ class Register(graphene.Mutation):
 
     def mutate(self, info, username, email, password):
             try:
-                user = User.objects.create(username=username, email=email)
-                user.set_password(password)
-                user.save()
+                user = User.objects.create(username=username, email=email, password=make_password(password))
                 token = get_token(user)
                 return Register(user=user, token=token, success=True)
             except ValidationError as err:
@@ -105,11 +328,9 @@ class ChangePassword(graphene.Mutation):
 
     def mutate(self, info, password):
         user = info.context.user
-        if user.is_anonymous:
-            raise GraphQLError('You must be logged to change your password')
         try:
             user.set_password(password)
-            user.save()
+            user.save(update_fields=['password'])
             return ChangePassword(success=True)
         except ValidationError as err:
             return ChangePassword(success=False, error=err)
@@ -125,11 +346,10 @@ class DeleteFollow(graphene.Mutation):
 
     def mutate(self, info, id_user):
         user = info.context.user
-        if user.is_anonymous:
-            raise GraphQLError('You must be logged in for this')
         try:
-            follow = get_object_or_404(User, pk=id_user)
+            follow = get_cached_object_or_404(User, id_user)
             user.following.remove(follow)
+            reset_visibility_scope(info.context)
             return DeleteFollow(success=True, message=f'Unfollow {follow.username}')
         except ValidationError as err:
             return DeleteFollow(success=False, error=err)
@@ -145,20 +365,28 @@ class DeleteFollower(graphene.Mutation):
 
     def mutate(self, info, id_user):
         user = info.context.user
-        if user.is_anonymous:
-            raise GraphQLError('You must be logged in for this')
         try:
-            follower = get_object_or_404(User, pk=id_user)
+            follower = get_cached_object_or_404(User, id_user)
             user.followers.remove(follower)
             return DeleteFollower(success=True, message=f'{follower.username} removed from follower list')
         except ValidationError as err:
             return DeleteFollower(success=False, error=err)
 
+class DeleteAccount(graphene.Mutation):
+    success = graphene.Boolean()
+    message = graphene.String()
+
+    def mutate(self, info):
+        user = info.context.user
+        user.soft_delete()
+        return DeleteAccount(success=True, message='Account deleted')
+
 class UserMutation (graphene.ObjectType):
     register = Register.Field()
     change_password = ChangePassword.Field()
     unfollow = DeleteFollow.Field()
     remove_follower = DeleteFollower.Field()
+    delete_account = DeleteAccount.Field()
 
 
 # Idea Queries
@@ -167,39 +395,62 @@ class IdeaQuery(graphene.ObjectType):
     list_all_ideas = graphene.List(IdeaType)
     list_my_ideas = graphene.List(IdeaType)
     list_followed_ideas = graphene.List(IdeaType, id_user=graphene.ID(required=True))
+    ideas_since = graphene.Field(IdeaSyncType, cursor=graphene.String(), first=graphene.Int())
+    trending_ideas = graphene.List(IdeaType, first=graphene.Int())
 
     def resolve_list_all_ideas(self, info):
-        user = info.context.user
-        if user.is_anonymous:
-            raise GraphQLError('You must be logged in')
         try:
-            q1 = user.idea_user.all()
-            q2 = Idea.objects.filter(pub_user__in = user.following.all()).exclude(visibility=Idea.PRIVATE)
-            q3 = Idea.objects.filter(visibility=Idea.PUBLIC)
-            q_final = q3.union(q1, q2).order_by('-pub_date')
-            return q_final
+            return scatter(lambda alias: visible_ideas(info, Idea.objects.using(alias)).order_by('-pub_date', '-pk'), by_pub_date)
         except ValidationError as err:
             raise GraphQLError('Error')
 
     def resolve_list_my_ideas(self, info):
         user = info.context.user
-        if user.is_anonymous:
-            raise GraphQLError('You must be logged to see your ideas')
-        return Idea.objects.filter(pub_user=user)
+        return user.idea_user.all()
     
     def resolve_list_followed_ideas(self, info, id_user):
-        user = info.context.user
-        if user.is_anonymous:
-            raise GraphQLError('You must be logged in')
         try:
-            followed_user = get_object_or_404(User, pk = id_user)
-            if user.following.filter(pk=followed_user.id).exists():
-                return followed_user.idea_user.exclude(visibility=Idea.PRIVATE)
-            else:
-                return followed_user.idea_user.filter(visibility=Idea.PUBLIC)
+            followed_user = get_alive_user_or_404(id_user)
+            return visible_ideas(info, followed_user.idea_user.all())
         except ValidationError as err:
             raise GraphQLError('Error')
 
+    # A follow or unfollow changes which PROTECTED ideas the viewer may see,
+    # without touching the ideas, so the cursor carries a fingerprint of the
+    # followed users; when it no longer matches, the sync starts over with
+    # reset set and the client drops its copy first.
+    def resolve_ideas_since(self, info, cursor=None, first=None):
+        first = page_size(first, settings.SYNC_PAGE_SIZE)
+        scope = get_visibility_scope(info.context)
+        fingerprint = scope.fingerprint()
+        reset = False
+        visible_removed = IdeaTombstone.objects.filter(
+            visibility_filter(scope.user, scope.following) | Q(pub_user__isnull=True)
+        )
+        if cursor:
+            *values, cursor_fingerprint = decode_cursor(cursor, 9)
+            reset = cursor_fingerprint != fingerprint
+        if cursor and not reset:
+            idea_position = sync_position(*values[:4])
+            removed_position = sync_position(*values[4:])
+        else:
+            idea_position = None
+            removed_position = sync_start(visible_removed, 'deleted_at')
+        ideas, idea_position, ideas_more = sync_shards(
+            lambda alias: visible_ideas(info, Idea.objects.using(alias)), 'updated_at', idea_position, first
+        )
+        removed, removed_position, removed_more = sync_page(visible_removed, 'deleted_at', removed_position, first)
+        return IdeaSyncType(
+            ideas=ideas,
+            removed_ids=[tombstone.idea_id for tombstone in removed],
+            reset=reset,
+            cursor=encode_cursor(*sync_cursor_values(idea_position), *sync_cursor_values(removed_position), fingerprint),
+            has_more=ideas_more or removed_more
+        )
+
+    def resolve_trending_ideas(self, info, first=None):
+        return trending_ideas(page_size(first, settings.TRENDING_PAGE_SIZE))
+
 
 # Idea Mutation
 
@@ -215,15 +466,15 @@ class AddIdea(graphene.Mutation):
     def mutate(self, info, content, **kwargs):
         visibility = kwargs.get('visibility', None)
         user = info.context.user
-        if user.is_anonymous:
-            raise GraphQLError('You must be logged to add ideas')
         try:
-            if visibility:
-                idea = Idea.objects.create(content=content, visibility=visibility.lower(), pub_user=user)
-                idea.save()
-            else:
-                idea = Idea.objects.create(content=content, pub_user=user)
-                idea.save()
+            with transaction.atomic(), transaction.atomic(using=shard_for_user(user.pk)):
+                if visibility:
+                    idea = user.idea_user.create(content=content, visibility=visibility.lower())
+                    idea.save()
+                else:
+                    idea = user.idea_user.create(content=content)
+                    idea.save()
+                emit(IDEA_ADDED, **idea_payload(idea))
             return AddIdea(success=True, idea=idea)
         except ValidationError as err:
             return AddIdea(success=False, error=err)
@@ -243,18 +494,18 @@ class EditIdea(graphene.Mutation):
         content = kwargs.get('content', None)
         visibility = kwargs.get('visibility', None)
         user = info.context.user
-
-        if user.is_anonymous:
-            raise GraphQLError('You must be logged to edit your ideas')
         
         try:
-            idea_qs = Idea.objects.filter(pub_user=user)
+            idea_qs = user.idea_user.all()
             edit_idea = get_object_or_404(idea_qs, pk=id)
             if content:
                 edit_idea.content=content
-            if visibility:
-                edit_idea.visibility=visibility.lower()
-            edit_idea.save()
+            with transaction.atomic(), transaction.atomic(using=edit_idea._state.db):
+                if visibility and visibility.lower() != edit_idea.visibility:
+                    IdeaTombstone.objects.create(idea_id=edit_idea.pk, pub_user=user, visibility=edit_idea.visibility)
+                    edit_idea.visibility=visibility.lower()
+                edit_idea.save()
+                emit(IDEA_EDITED, **idea_payload(edit_idea))
             return EditIdea(success=True, idea=edit_idea)
         except ValidationError as err:
             return EditIdea(success=False, error=err)
@@ -270,12 +521,13 @@ class DeleteIdea(graphene.Mutation):
 
     def mutate(self, info, id):
         user = info.context.user
-        if user.is_anonymous:
-            raise GraphQLError('You must be logged to delete your ideas')
         try:
-            idea_qs = Idea.objects.filter(pub_user=user)
+            idea_qs = user.idea_user.all()
             idea = get_object_or_404(idea_qs, pk=id)
-            idea.delete()
+            with transaction.atomic(), transaction.atomic(using=idea._state.db):
+                IdeaTombstone.objects.create(idea_id=idea.pk, pub_user=user, visibility=idea.visibility)
+                emit(IDEA_DELETED, **idea_payload(idea))
+                idea.delete()
             return DeleteIdea(success=True, message='Delete success')
         except ValidationError as err:
             return DeleteIdea(success=False, error=err, message='Delete not success')
@@ -290,13 +542,38 @@ class IdeaMutation(graphene.ObjectType):
 # FollowRequest Queries
 
 class FollowRequestQuery(graphene.ObjectType):
-    follow_up_request = graphene.List(FollowRequestType)
-
-    def resolve_follow_up_request(self, info):
+    follow_up_request = graphene.List(
+        FollowRequestType,
+        status=graphene.String(default_value=FollowRequest.PENDING),
+        first=graphene.Int(),
+        after=graphene.String()
+    )
+    follow_requests_since = graphene.Field(FollowRequestSyncType, cursor=graphene.String(), first=graphene.Int())
+
+    def resolve_follow_up_request(self, info, status=FollowRequest.PENDING, first=None, after=None):
+        user = info.context.user
+        follow_requests = user.follow_recived.filter(requester__deleted_at__isnull=True)
+        if status:
+            status = status.lower()
+            if status not in dict(FollowRequest.STATUS_CHOICES):
+                raise GraphQLError(f'Invalid status {status}')
+            follow_requests = follow_requests.filter(status=status)
+        if after:
+            created_at, pk = decode_cursor(after, 2)
+            created_at = decode_datetime(created_at)
+            follow_requests = follow_requests.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+        first = page_size(first, settings.FOLLOW_REQUEST_PAGE_SIZE)
+        return follow_requests.order_by('-created_at', '-pk')[:first]
+
+    def resolve_follow_requests_since(self, info, cursor=None, first=None):
         user = info.context.user
-        if user.is_anonymous:
-            raise GraphQLError('You must be logged to see your follow request list')
-        return user.follow_recived.all()
+        position = sync_position(*decode_cursor(cursor, 4)) if cursor else None
+        follow_requests, position, has_more = sync_page(user.follow_recived.filter(requester__deleted_at__isnull=True), 'updated_at', position, page_size(first, settings.SYNC_PAGE_SIZE))
+        return FollowRequestSyncType(
+            follow_requests=follow_requests,
+            cursor=encode_cursor(*sync_cursor_values(position)),
+            has_more=has_more
+        )
 
 
 # FollowRequest Mutation
@@ -312,13 +589,12 @@ class SendFollowRequest(graphene.Mutation):
 
     def mutate(self, info, id_user):
         user = info.context.user
-        if user.is_anonymous:
-            raise GraphQLError('You must be logged to follow user')
         try:
-            users = User.objects.all()
-            to_follow = get_object_or_404(users, pk=id_user)
-            follow_request = FollowRequest.objects.create(requester=user, to_follow=to_follow)
-            follow_request.save()
+            to_follow = get_alive_user_or_404(id_user)
+            with transaction.atomic():
+                follow_request = FollowRequest.objects.create(requester=user, to_follow=to_follow)
+                follow_request.save()
+                emit(FOLLOW_REQUEST_SENT, **follow_request_payload(follow_request))
             return SendFollowRequest(success=True, message='Request send', follow_request=follow_request)
         except ValidationError as err:
             return SendFollowRequest(success=False, error=err)
@@ -335,21 +611,22 @@ class ResponseFollowRequest(graphene.Mutation):
 
     def mutate(self, info, id_request, response):
         user = info.context.user
-        if user.is_anonymous:
-            raise GraphQLError('You must be logged for this')
         try:
-            list_request = user.follow_recived.all()
+            list_request = user.follow_recived.filter(requester__deleted_at__isnull=True)
             req = get_object_or_404(list_request, pk=id_request)
             req_user = req.requester
             if response:
-                req.status = FollowRequest.ACCEPTED
-                req.save()
-                req_user.following.add(user)
-                req_user.save()
+                with transaction.atomic():
+                    req.status = FollowRequest.ACCEPTED
+                    req.save()
+                    req_user.following.add(user)
+                    emit(FOLLOW_REQUEST_ANSWERED, **follow_request_payload(req))
                 return ResponseFollowRequest(success=True, message='Follow request accepted', follow_request=req)
             else:
-                req.status = FollowRequest.DENIED
-                req.save()
+                with transaction.atomic():
+                    req.status = FollowRequest.DENIED
+                    req.save()
+                    emit(FOLLOW_REQUEST_ANSWERED, **follow_request_payload(req))
                 return ResponseFollowRequest(success=True, message='Follow request denied', follow_request=req)
         except ValidationError as err:
             return ResponseFollowRequest(success=False, error=err)
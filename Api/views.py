@@ -1,3 +1,214 @@
-from django.shortcuts import render
+import csv
 
-# Create your views here.
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.utils.http import parse_etags
+from django.views.decorators.http import etag, require_GET
+from graphene_django.views import GraphQLView as BaseGraphQLView, HttpError
+from graphql import GraphQLError, OperationType, get_operation_ast, parse, validate
+
+from .coalescing import coalesce_setting, request_key, single_flight
+from .introspection import introspection_cache
+from .incremental import execute_incremental, format_payload, uses_incremental_delivery
+from .permissions import get_visibility_scope
+from .renderers import compress_response, get_serializer
+
+
+EXPORT_FIELDS = ('id', 'content', 'visibility', 'pub_date')
+
+MULTIPART_CONTENT_TYPE = 'multipart/mixed; boundary="-"; deferSpec=20220824'
+MULTIPART_PART = '\r\n---\r\nContent-Type: application/json; charset=utf-8\r\n\r\n'
+MULTIPART_END = '\r\n-----\r\n'
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def get_request_user(request):
+    # Importing graphql_jwt loads all of its mutations; the URL checks of every
+    # manage.py command import this module, so it is imported on use.
+    from graphql_jwt.exceptions import JSONWebTokenError
+
+    if request.user.is_authenticated:
+        return request.user
+    try:
+        return authenticate(request=request)
+    except JSONWebTokenError:
+        return None
+
+
+def iter_ideas_ndjson(rows):
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    for row in rows:
+        yield encoder.encode(row) + '\n'
+
+
+def iter_ideas_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow([row[field] for field in EXPORT_FIELDS])
+
+
+@require_GET
+def export_ideas(request):
+    user = get_request_user(request)
+    if user is None:
+        return JsonResponse({'errors': [{'message': 'You must be logged to export your ideas'}]}, status=401)
+
+    rows = (
+        user.idea_user
+        .order_by('-pub_date', '-id')
+        .values(*EXPORT_FIELDS)
+        .iterator(chunk_size=settings.IDEA_EXPORT_CHUNK_SIZE)
+    )
+    if request.GET.get('format') == 'csv':
+        response = StreamingHttpResponse(iter_ideas_csv(rows), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="ideas.csv"'
+    else:
+        response = StreamingHttpResponse(iter_ideas_ndjson(rows), content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="ideas.ndjson"'
+    return response
+
+
+def schema_etag(request):
+    from .schema import build_schema
+
+    return introspection_cache.prepare(build_schema().graphql_schema).etag
+
+
+# The printed schema, for codegen and schema registries.
+@require_GET
+@etag(schema_etag)
+def schema_sdl(request):
+    return HttpResponse(introspection_cache.sdl, content_type='text/plain; charset=utf-8')
+
+
+class GraphQLView(BaseGraphQLView):
+    def dispatch(self, request, *args, **kwargs):
+        response = self.get_incremental_response(request)
+        if response is None:
+            response = self.get_introspection_response(request)
+        if response is None:
+            response = super().dispatch(request, *args, **kwargs)
+        return compress_response(request, response)
+
+    # Parameters of a single operation sent to the API (not a batch, not a
+    # GraphiQL page load), or None.
+    def get_operation_params(self, request):
+        try:
+            data = self.parse_body(request)
+            if self.batch or (self.graphiql and self.can_display_graphiql(request, data)):
+                return None
+            query, variables, operation_name, _ = self.get_graphql_params(request, data)
+        except HttpError:
+            return None
+        return (query, variables, operation_name) if query else None
+
+    # Introspection queries are answered from Api.introspection without
+    # executing, and with a 304 when the client already has the result.
+    def get_introspection_response(self, request):
+        if request.method not in ('GET', 'POST') or not settings.GRAPHENE.get('INTROSPECTION_CACHE', True):
+            return None
+        if self.pretty or request.GET.get('pretty'):
+            return None
+        params = self.get_operation_params(request)
+        if params is None:
+            return None
+        cached = introspection_cache.response(self.schema.graphql_schema, *params)
+        if cached is None:
+            return None
+        content, tag = cached
+        # Weak comparison: a compressed response carried the weak form.
+        if tag in {etag.removeprefix('W/') for etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))}:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = tag
+        return response
+
+    # A query using @defer or @stream from a client accepting multipart/mixed
+    # is answered part by part: the initial result, then every deferred
+    # fragment and batch of streamed items as it completes. Anything else, or
+    # any request that fails before execution, takes the regular path, where
+    # the directives are ignored and the complete result is sent at once.
+    def get_incremental_response(self, request):
+        if request.method not in ('GET', 'POST') or 'multipart/mixed' not in request.META.get('HTTP_ACCEPT', ''):
+            return None
+        params = self.get_operation_params(request)
+        if params is None:
+            return None
+        query, variables, operation_name = params
+        try:
+            document = parse(query)
+        except GraphQLError:
+            return None
+        if not uses_incremental_delivery(document):
+            return None
+        operation = get_operation_ast(document, operation_name)
+        if operation is None or operation.operation != OperationType.QUERY:
+            return None
+        if validate(self.schema.graphql_schema, document):
+            return None
+
+        payloads = execute_incremental(
+            self.schema.graphql_schema,
+            document,
+            root_value=self.get_root_value(request),
+            context_value=self.get_context(request),
+            variable_values=variables,
+            operation_name=operation_name,
+            middleware=self.get_middleware(request),
+        )
+        return StreamingHttpResponse(self.iter_multipart(request, payloads), content_type=MULTIPART_CONTENT_TYPE)
+
+    # Identical concurrent queries with the same visibility scope share one
+    # execution, see Api.coalescing. The viewer is authenticated here so the key
+    # can use their scope; the JWT middleware then finds request.user already
+    # set, and the resolvers reuse the scope.
+    def get_response(self, request, data, show_graphiql=False):
+        key = None
+        if coalesce_setting('COALESCE', False) and not self.batch and not show_graphiql:
+            query, variables, operation_name, _ = self.get_graphql_params(request, data)
+            if query and self.authenticate(request):
+                key = request_key(query, variables, operation_name, get_visibility_scope(request))
+        if key is None:
+            return super().get_response(request, data, show_graphiql)
+        return single_flight.do(key, lambda: super(GraphQLView, self).get_response(request, data, show_graphiql))
+
+    # False when the request carries invalid credentials.
+    def authenticate(self, request):
+        if request.user.is_authenticated or 'HTTP_AUTHORIZATION' not in request.META:
+            return True
+        user = get_request_user(request)
+        if user is None:
+            return False
+        request.user = user
+        return True
+
+    def iter_multipart(self, request, payloads):
+        for payload in payloads:
+            yield MULTIPART_PART + self.json_encode(request, format_payload(payload, self.format_error))
+        yield MULTIPART_END
+
+    def json_encode(self, request, d, pretty=False):
+        if self.pretty or pretty or request.GET.get('pretty'):
+            return super().json_encode(request, d, pretty)
+        return get_serializer()(d)
+
+    # A JSON array body is executed as a batch: every operation shares the
+    # request as context, so the authenticated user and any per-request caches
+    # are reused across the whole batch.
+    def parse_body(self, request):
+        if self.get_content_type(request) == 'application/json' and request.body.lstrip()[:1] == b'[':
+            self.batch = True
+            data = super().parse_body(request)
+            max_batch_size = settings.GRAPHENE.get('MAX_BATCH_SIZE', 10)
+            if len(data) > max_batch_size:
+                raise HttpError(HttpResponseBadRequest(f'Batch requests are limited to {max_batch_size} operations.'))
+            return data
+        return super().parse_body(request)
@@ -51,6 +51,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'Api.profiling.ProfilingMiddleware',
+    'Api.sqllog.SlowQueryMiddleware',
 ]
 
 ROOT_URLCONF = 'projectPrueba.urls'
@@ -88,6 +90,12 @@ DATABASES = {
     }
 }
 
+# Extra databases for the idea shards, e.g. IDEA_SHARD_DATABASES=ideas_1,ideas_2
+for alias in filter(None, os.environ.get('IDEA_SHARD_DATABASES', '').split(',')):
+    DATABASES[alias] = {**DATABASES['default'], 'NAME': alias}
+
+DATABASE_ROUTERS = ['Api.sharding.IdeaShardRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -137,10 +145,91 @@ AUTH_USER_MODEL = 'Api.User'
 GRAPHENE = {
     'SCHEMA': 'Api.schema.schema',
     'MIDDLEWARE': [
+        'Api.sqllog.SqlContextMiddleware',
+        'Api.permissions.PermissionMiddleware',
+        'Api.throttling.RateLimitMiddleware',
         'graphql_jwt.middleware.JSONWebTokenMiddleware',
-    ]
+    ],
+    'MAX_BATCH_SIZE': 10,
+    'JSON_SERIALIZER': None,
+    'COMPRESS_MIN_SIZE': 4096,
+    'STREAM_BATCH_SIZE': 50,
+    'COALESCE': True,
+    'COALESCE_TIMEOUT': 5,
+    'COALESCE_CACHE': None,
+    'COALESCE_RESULT_TTL': 1,
+    'INTROSPECTION_CACHE': True,
+    'RATE_LIMIT_BACKEND': 'Api.throttling.LocMemBackend',
+    'RATE_LIMITS': {
+        'tokenAuth': {'rate': '10/m', 'key': 'ip'},
+        'register': {'rate': '5/m', 'key': 'ip'},
+        'forgottenPassword': {'rate': '5/h', 'key': 'ip'},
+        'searchUsers': {'rate': '60/m', 'key': 'user'},
+    },
 }
 
+IDEA_EXPORT_CHUNK_SIZE = 2000
+
+OUTBOX_MAX_ATTEMPTS = 5
+
+# Written by `manage.py build_introspection`; None disables the file.
+INTROSPECTION_CACHE_FILE = BASE_DIR / 'introspection.json'
+
+SYNC_PAGE_SIZE = 500
+# Sync pages re-read this much behind their cursor for rows that committed late.
+SYNC_OVERLAP_SECONDS = 5
+SYNC_OVERLAP_MAX_ROWS = 1000
+
+FOLLOW_REQUEST_PAGE_SIZE = 50
+
+TRENDING_WINDOW_HOURS = 72
+TRENDING_DECAY_SECONDS = 45000
+TRENDING_PAGE_SIZE = 50
+
+FOLLOW_SUGGESTIONS_LIMIT = 50
+FOLLOW_SUGGESTIONS_FANOUT = 1000
+
+IDEA_ARCHIVE_DIR = BASE_DIR / 'archive'
+
+VISIBILITY_INLINE_FOLLOWING = 1000
+RELATIONSHIP_PREFETCH_LIMIT = 1000
+
+IDEA_SHARDS = ['default']
+# Required with more than one shard, unique per running process (0-1023).
+IDEA_ID_WORKER = int(os.environ['IDEA_ID_WORKER']) if os.environ.get('IDEA_ID_WORKER') else None
+IDEA_ID_EPOCH_MS = 1672531200000
+
+FOLLOW_GRAPH_INDEX = False
+# Required by the index: a cache alias shared by all processes (memcached, redis...).
+FOLLOW_GRAPH_CACHE = None
+FOLLOW_GRAPH_COMPACT_AT = 10000
+
+# A cache alias shared by all processes (memcached, redis...); None disables it.
+ENTITY_CACHE = None
+ENTITY_CACHE_TIMEOUT = 3600
+
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED') == '1'
+PROFILING_PATHS = ['/graphql/']
+PROFILING_SAMPLE_RATE = 0.01
+PROFILING_SLOW_MS = 1000
+PROFILING_INTERVAL_MS = 10
+PROFILING_DIR = BASE_DIR / 'profiles'
+PROFILING_MAX_FILES = 500
+
+SLOW_SQL_MS = 200
+SLOW_SQL_EXPLAIN_RATE = 0.1
+
+ADMIN_ESTIMATED_COUNT_MIN = 100000
+
+PASSWORD_HASHERS = [
+    'Api.hashing.PooledPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+PASSWORD_HASHING_WORKERS = None
+PASSWORD_HASHING_MAX_PENDING = 64
+
 AUTHENTICATION_BACKENDS = [
     'graphql_jwt.backends.JSONWebTokenBackend',
     'django.contrib.auth.backends.ModelBackend',